@@ -1,34 +1,23 @@
 #!/usr/bin/env python3
-import os
-
 import aws_cdk as cdk
 
-from resume_iac.s3_website__stack import S3WebsiteStack
-from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack
+from resume_iac.factory import configure_offline, create_stacks, stack_environment
 
+# domain_name = os.environ["DOMAIN"]
+domain_name = 'sidor.me'
 
 
-app = cdk.App()
+def main():
+    # `cdk synth -c stacks=api` builds only the counter API, and
+    # `-c offline=true` synthesizes without credentials or lookups
+    app = cdk.App()
+    configure_offline(app)
+
+    account, region = stack_environment(app)
+    create_stacks(app, account, region, domain_name)
+
+    app.synth()
 
-# domain_name = os.environ["DOMAIN"]
-domain_name = 'sidor.me'
 
-api_ddb_lambda = ApiDdbLambdaStack(app, "ApiGwDdbStack",
-    env=cdk.Environment(
-        account=os.environ["CDK_DEFAULT_ACCOUNT"],
-        region=os.environ["CDK_DEFAULT_REGION"]
-    ),
-)
-
-S3WebsiteStack(app, "S3WebsiteStack",
-    domain_name=domain_name,
-    env=cdk.Environment(
-        account=os.environ["CDK_DEFAULT_ACCOUNT"], 
-        region=os.environ["CDK_DEFAULT_REGION"]
-    ),
-    rest_api=api_ddb_lambda.rest_api,
-    api_key=api_ddb_lambda.api_key,
-    api_key_value=api_ddb_lambda.api_key_value
-)
-
-app.synth()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Cold-start benchmark for the counter Lambda.
+
+Every sample runs in a fresh interpreter so the import of ``index.py`` is a
+real cold import. Each sample reports:
+
+* ``sdk_import_ms``   - importing boto3 (paid by every cold start)
+* ``init_ms``         - importing ``index.py``, i.e. the module-scope init
+* ``first_invoke_ms`` - the first ``lambda_handler`` call
+* ``warm_invoke_ms``  - the median of the following warm calls
+
+DynamoDB is served by moto, so absolute numbers only make sense relative to
+other runs on the same machine. Use ``--max-init-ms`` to fail the run when
+the median init cost regresses past a budget.
+
+``--bundle`` compares the handler as plain sources, which every cold start
+has to compile, with the slim precompiled package the stack deploys.
+
+Usage:
+    python -m benchmarks.cold_start --samples 5 --warm 50
+    python -m benchmarks.cold_start --bundle
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDLER_DIR = os.path.join(ROOT_DIR, 'lambdas', 'counter_lambda')
+TABLE_NAME = 'benchmark-table'
+
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def run_sample(warm_invocations, package=None):
+    """Measure one cold start. Must run in a fresh interpreter.
+
+    With `package`, the handler is imported as ``index`` from that directory,
+    the way the Lambda runtime loads it from /var/task.
+    """
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+    start = time.perf_counter()
+    import boto3
+    sdk_import_ms = _elapsed_ms(start)
+
+    # moto has to be imported before the handler creates its client so the
+    # client picks up moto's request interception.
+    from moto import mock_dynamodb
+
+    with mock_dynamodb():
+        boto3.resource('dynamodb', region_name=os.environ['AWS_REGION']).create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'N'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        if package:
+            sys.path.insert(0, package)
+            start = time.perf_counter()
+            from index import lambda_handler
+            init_ms = _elapsed_ms(start)
+        else:
+            start = time.perf_counter()
+            from lambdas.counter_lambda.index import lambda_handler
+            init_ms = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        lambda_handler({}, {})
+        first_invoke_ms = _elapsed_ms(start)
+
+        warm = []
+        for _ in range(warm_invocations):
+            start = time.perf_counter()
+            lambda_handler({}, {})
+            warm.append(_elapsed_ms(start))
+
+    return {
+        'sdk_import_ms': sdk_import_ms,
+        'init_ms': init_ms,
+        'first_invoke_ms': first_invoke_ms,
+        'warm_invoke_ms': statistics.median(warm) if warm else None,
+    }
+
+
+def run(samples, warm_invocations, package=None, write_bytecode=True):
+    """Run `samples` cold starts in subprocesses and aggregate the medians."""
+    command = [sys.executable, '-m', 'benchmarks.cold_start',
+               '--child', '--warm', str(warm_invocations)]
+    if package:
+        command += ['--package', package]
+
+    env = dict(os.environ)
+    if not write_bytecode:
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    results = []
+    for _ in range(samples):
+        output = subprocess.run(
+            command, cwd=ROOT_DIR, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        # The handler logs to stdout too; the sample is the last line.
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {'samples': samples, 'warm_invocations': warm_invocations}
+    for key in results[0]:
+        values = [r[key] for r in results if r[key] is not None]
+        summary[key] = round(statistics.median(values), 3) if values else None
+    return summary
+
+
+def compare_bundles(samples, warm_invocations):
+    """Cold starts of the raw handler sources against the bundled package.
+
+    The raw sources run without writing bytecode, like a read-only /var/task
+    without __pycache__, so every sample compiles ``index.py`` again.
+    """
+    from resume_iac.lambda_bundling import copy_sources, directory_size, precompile
+
+    with tempfile.TemporaryDirectory() as raw, tempfile.TemporaryDirectory() as bundled:
+        copy_sources(HANDLER_DIR, raw)
+        copy_sources(HANDLER_DIR, bundled)
+        precompile(bundled)
+
+        return {
+            'raw': dict(run(samples, warm_invocations, raw, write_bytecode=False),
+                        package_bytes=directory_size(raw)),
+            'bundled': dict(run(samples, warm_invocations, bundled, write_bytecode=False),
+                            package_bytes=directory_size(bundled)),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--warm', type=int, default=50)
+    parser.add_argument('--max-init-ms', type=float, default=None,
+                        help='fail when the median init_ms exceeds this budget')
+    parser.add_argument('--bundle', action='store_true',
+                        help='compare the raw handler sources with the bundled package')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--package', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_sample(args.warm, args.package)))
+        return 0
+
+    if args.bundle:
+        print(json.dumps(compare_bundles(args.samples, args.warm), indent=2))
+        return 0
+
+    summary = run(args.samples, args.warm)
+    print(json.dumps(summary, indent=2))
+
+    if args.max_init_ms is not None and summary['init_ms'] > args.max_init_ms:
+        print(f"init_ms {summary['init_ms']} exceeds budget {args.max_init_ms}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
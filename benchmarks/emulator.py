@@ -0,0 +1,686 @@
+"""Local emulator of the deployed request path, for end-to-end load tests.
+
+Synthesizes the stacks offline and serves what they describe on one machine:
+
+* static files from a site directory, as ``site_assets`` would upload them,
+  with the distribution's security headers and custom error pages
+* ``/counter`` routes through the REST API to ``lambda_handler`` as API
+  Gateway proxy events, throttled by the stage and usage plan limits and by
+  the function's reserved concurrency
+* with ``--edge-cache``, CloudFront caching per each behavior's cache policy
+
+DynamoDB is served by moto, or by a DynamoDB-compatible endpoint such as
+DynamoDB Local with ``--endpoint-url``. Any HTTP client can then drive it:
+
+    python -m benchmarks.emulator --site ./site --port 8080 --edge-cache
+    python -m benchmarks.emulator -c performance_profile=low-latency
+
+CloudFront Functions are not run, so preflights and bot filtering reach the
+API, and responses are compressed with gzip only. Counters are printed on
+exit.
+"""
+import argparse
+import asyncio
+import base64
+import fnmatch
+import gzip
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from resume_iac.audit import CACHING_DISABLED, app_functions, distribution_behaviors, resources
+
+TABLE_NAME = 'benchmark-table'
+HISTORY_TABLE_NAME = 'benchmark-history-table'
+
+# Function settings that name a table stand in for these local tables
+LOCAL_TABLE_NAMES = {
+    'COUNTER_TABLE_NAME': TABLE_NAME,
+    'COUNTER_HISTORY_TABLE_NAME': HISTORY_TABLE_NAME,
+}
+
+# Managed CloudFront cache policy for static files
+CACHING_OPTIMIZED = '658327ea-f89d-4fab-a63d-7e88639e58f6'
+
+# CloudFront compresses responses between these sizes only
+COMPRESS_MIN_BYTES = 1000
+COMPRESS_MAX_BYTES = 10_000_000
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml)'
+)
+
+DEFAULT_CONCURRENCY = 16
+
+# Address the edge-optimized API's own distribution sees our CloudFront at
+EDGE_ADDRESS = '130.176.0.1'
+
+
+@dataclass(frozen=True)
+class EdgeCachePolicy:
+    """TTLs and cache key of one CloudFront cache policy."""
+    min_ttl: float
+    default_ttl: float
+    max_ttl: float
+    query_strings: tuple = ()
+    all_query_strings: bool = False
+
+
+MANAGED_CACHE_POLICIES = {
+    CACHING_DISABLED: None,
+    CACHING_OPTIMIZED: EdgeCachePolicy(min_ttl=1, default_ttl=86400, max_ttl=31536000),
+}
+
+
+@dataclass(frozen=True)
+class Behavior:
+    path_pattern: str
+    origin: str  # "bucket" or "api"
+    allowed_methods: tuple
+    compress: bool
+    cache_policy: Optional[EdgeCachePolicy]
+    response_headers: dict = field(default_factory=dict)
+
+    def matches(self, path: str) -> bool:
+        return fnmatch.fnmatchcase(path, self.path_pattern)
+
+
+@dataclass(frozen=True)
+class EmulatorConfig:
+    """What the synthesized templates say about the request path."""
+    behaviors: tuple
+    default_root_object: str
+    # Status -> (response status, page path)
+    error_pages: dict
+    # (resource path, method) of every REST API method
+    routes: frozenset
+    stage_name: str
+    # (rate limit, burst limit), or None where nothing is set
+    stage_throttle: Optional[tuple]
+    plan_throttle: Optional[tuple]
+    # "/counter/GET" -> (rate limit, burst limit)
+    method_throttles: dict
+    lambda_environment: dict
+    reserved_concurrency: Optional[int] = None
+
+    @classmethod
+    def from_templates(cls, templates: dict) -> 'EmulatorConfig':
+        website = api = None
+        for template in templates.values():
+            if resources(template, 'AWS::CloudFront::Distribution'):
+                website = template
+            if resources(template, 'AWS::ApiGateway::RestApi'):
+                api = template
+        if website is None or api is None:
+            # The HTTP API and multi-region setups have no stage or usage plan to emulate
+            raise ValueError('the emulator needs the website and a REST counter API')
+
+        [distribution] = resources(website, 'AWS::CloudFront::Distribution').values()
+        config = distribution['Properties']['DistributionConfig']
+        origins = {
+            origin['Id']: 'bucket' if 'S3OriginConfig' in origin else 'api'
+            for origin in config['Origins']
+        }
+
+        behaviors = []
+        for path, behavior in distribution_behaviors(distribution):
+            behaviors.append(Behavior(path_pattern=path,
+                origin=origins[behavior['TargetOriginId']],
+                allowed_methods=tuple(behavior.get('AllowedMethods', ['GET', 'HEAD'])),
+                compress=bool(behavior.get('Compress')),
+                cache_policy=_cache_policy(website, behavior.get('CachePolicyId')),
+                response_headers=_response_headers(website, behavior.get('ResponseHeadersPolicyId'))
+            ))
+        # CloudFront tries the path patterns in order and the default last
+        behaviors = behaviors[1:] + behaviors[:1]
+
+        error_pages = {
+            response['ErrorCode']: (response.get('ResponseCode', response['ErrorCode']),
+                                    response.get('ResponsePagePath'))
+            for response in config.get('CustomErrorResponses', [])
+        }
+
+        routes = set()
+        api_resources = resources(api, 'AWS::ApiGateway::Resource')
+        for method in resources(api, 'AWS::ApiGateway::Method').values():
+            properties = method['Properties']
+            if properties.get('Integration', {}).get('Type') != 'AWS_PROXY':
+                raise ValueError('the emulator needs the lambda counter integration')
+            path = _resource_path(api_resources, properties['ResourceId'])
+            routes.add((path, properties['HttpMethod']))
+
+        [stage] = resources(api, 'AWS::ApiGateway::Stage').values()
+        stage_throttle = None
+        for setting in stage['Properties'].get('MethodSettings', []):
+            if 'ThrottlingRateLimit' in setting:
+                stage_throttle = (setting['ThrottlingRateLimit'], setting['ThrottlingBurstLimit'])
+
+        plan_throttle, method_throttles = None, {}
+        for plan in resources(api, 'AWS::ApiGateway::UsagePlan').values():
+            throttle = plan['Properties'].get('Throttle')
+            if throttle:
+                plan_throttle = (throttle['RateLimit'], throttle['BurstLimit'])
+            for api_stage in plan['Properties'].get('ApiStages', []):
+                for method, throttle in api_stage.get('Throttle', {}).items():
+                    method_throttles[method] = (throttle['RateLimit'], throttle['BurstLimit'])
+
+        [function] = [function for function in app_functions(api).values()
+                      if function['Properties']['Handler'] == 'index.lambda_handler']
+        variables = function['Properties'].get('Environment', {}).get('Variables', {})
+        lambda_environment = {}
+        for name, value in variables.items():
+            if name in LOCAL_TABLE_NAMES:
+                lambda_environment[name] = LOCAL_TABLE_NAMES[name]
+            elif isinstance(value, str):
+                lambda_environment[name] = value
+
+        return cls(behaviors=tuple(behaviors),
+            default_root_object=config.get('DefaultRootObject', ''),
+            error_pages=error_pages,
+            routes=frozenset(routes),
+            stage_name=stage['Properties']['StageName'],
+            stage_throttle=stage_throttle,
+            plan_throttle=plan_throttle,
+            method_throttles=method_throttles,
+            lambda_environment=lambda_environment,
+            reserved_concurrency=function['Properties'].get('ReservedConcurrentExecutions')
+        )
+
+
+def _cache_policy(template, policy_id):
+    if isinstance(policy_id, dict):
+        config = template['Resources'][policy_id['Ref']]['Properties']['CachePolicyConfig']
+        query = config['ParametersInCacheKeyAndForwardedToOrigin']['QueryStringsConfig']
+        return EdgeCachePolicy(min_ttl=config['MinTTL'],
+            default_ttl=config['DefaultTTL'],
+            max_ttl=config['MaxTTL'],
+            query_strings=tuple(query.get('QueryStrings', ())),
+            all_query_strings=query['QueryStringBehavior'] == 'all'
+        )
+    if policy_id not in MANAGED_CACHE_POLICIES:
+        raise ValueError(f'unknown managed cache policy {policy_id}')
+    return MANAGED_CACHE_POLICIES[policy_id]
+
+
+def _response_headers(template, policy_id):
+    """Headers a response headers policy sets, by name."""
+    if not isinstance(policy_id, dict):
+        return {}
+    config = template['Resources'][policy_id['Ref']]['Properties']['ResponseHeadersPolicyConfig']
+    security = config.get('SecurityHeadersConfig', {})
+    headers = {}
+
+    if 'ContentSecurityPolicy' in security:
+        headers['Content-Security-Policy'] = security['ContentSecurityPolicy']['ContentSecurityPolicy']
+    if 'ContentTypeOptions' in security:
+        headers['X-Content-Type-Options'] = 'nosniff'
+    if 'FrameOptions' in security:
+        headers['X-Frame-Options'] = security['FrameOptions']['FrameOption']
+    if 'ReferrerPolicy' in security:
+        headers['Referrer-Policy'] = security['ReferrerPolicy']['ReferrerPolicy']
+    if 'StrictTransportSecurity' in security:
+        hsts = security['StrictTransportSecurity']
+        value = f"max-age={hsts['AccessControlMaxAgeSec']}"
+        if hsts.get('IncludeSubdomains'):
+            value += '; includeSubDomains'
+        if hsts.get('Preload'):
+            value += '; preload'
+        headers['Strict-Transport-Security'] = value
+    if 'XSSProtection' in security:
+        xss = security['XSSProtection']
+        value = '1' if xss.get('Protection') else '0'
+        if xss.get('ModeBlock'):
+            value += '; mode=block'
+        if xss.get('ReportUri'):
+            value += f"; report={xss['ReportUri']}"
+        headers['X-XSS-Protection'] = value
+
+    for header in config.get('CustomHeadersConfig', {}).get('Items', []):
+        headers[header['Header']] = header['Value']
+    return headers
+
+
+def _resource_path(api_resources, resource_id):
+    """"/counter/hit" for the Ref of the hit resource."""
+    if 'Ref' not in resource_id:
+        return '/'
+    resource = api_resources[resource_id['Ref']]['Properties']
+    parent = _resource_path(api_resources, resource['ParentId'])
+    return parent.rstrip('/') + '/' + resource['PathPart']
+
+
+class TokenBucket:
+    """API Gateway's throttle: `rate` requests/s, up to `burst` at once."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def allow(self):
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes = b''
+
+
+def json_response(status, message):
+    return Response(status, {'Content-Type': 'application/json'},
+                    json.dumps({'message': message}).encode('utf-8'))
+
+
+class LambdaContext:
+    function_name = 'CounterLambda'
+    memory_limit_in_mb = 128
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self):
+        return 3000
+
+
+def proxy_event(stage_name, resource, method, path, query, headers, body, client_ip):
+    """A REST API Lambda proxy integration event."""
+    query_params = {}
+    multi_query = {}
+    for name, value in query:
+        query_params[name] = value
+        multi_query.setdefault(name, []).append(value)
+
+    return {
+        'resource': resource,
+        'path': path,
+        'httpMethod': method,
+        'headers': dict(headers),
+        'multiValueHeaders': {name: [value] for name, value in headers.items()},
+        'queryStringParameters': query_params or None,
+        'multiValueQueryStringParameters': multi_query or None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': resource,
+            'httpMethod': method,
+            'path': f'/{stage_name}{path}',
+            'stage': stage_name,
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': client_ip, 'userAgent': headers.get('user-agent')},
+            'apiId': 'local',
+            'protocol': 'HTTP/1.1',
+        },
+        'body': body.decode('utf-8') if body else None,
+        'isBase64Encoded': False,
+    }
+
+
+def cache_ttl(policy, headers):
+    """Seconds CloudFront keeps a response, from the policy and Cache-Control."""
+    cache_control = {name.lower(): value for name, value in headers.items()}.get('cache-control', '')
+    directives = dict(
+        (part.strip().split('=', 1) + [''])[:2] for part in cache_control.split(',') if part.strip()
+    )
+    if {'no-store', 'no-cache', 'private'} & set(directives):
+        return policy.min_ttl
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            return min(max(int(directives[name]), policy.min_ttl), policy.max_ttl)
+    return policy.default_ttl
+
+
+class Emulator:
+    """CloudFront, the bucket, the REST API and the counter Lambda in one process.
+
+    `assets` are what `site_assets.build_site` would upload, by key, and
+    `handler` is the counter Lambda's handler. Requests to the handler run on
+    at most `concurrency` threads, the function's reserved concurrency by
+    default. Like Lambda once that concurrency is used up, requests over it
+    are throttled rather than queued.
+    """
+
+    def __init__(self, config: EmulatorConfig, assets: dict, handler,
+                 edge_cache: bool = False, concurrency: int = None,
+                 clock=time.monotonic):
+        self._config = config
+        self._assets = assets
+        self._handler = handler
+        self._edge_cache = edge_cache
+        self._clock = clock
+        self._cache = {}
+        concurrency = concurrency or config.reserved_concurrency or DEFAULT_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._invocation_slots = threading.BoundedSemaphore(concurrency)
+        self._stage_buckets = {}
+        self._plan_bucket = (TokenBucket(*config.plan_throttle, clock=clock)
+                             if config.plan_throttle else None)
+        self._method_buckets = {
+            method: TokenBucket(*throttle, clock=clock)
+            for method, throttle in config.method_throttles.items()
+        }
+        self.stats = Counter()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def behavior(self, path: str) -> Behavior:
+        for behavior in self._config.behaviors:
+            if behavior.matches(path):
+                return behavior
+        raise LookupError(path)
+
+    async def handle_request(self, method, target, headers, body=b'', client_ip='127.0.0.1') -> Response:
+        """One viewer request, through CloudFront to the bucket or the API."""
+        self.stats['requests'] += 1
+        headers = {name.lower(): value for name, value in headers.items()}
+        url = urlsplit(target)
+        path = url.path or '/'
+        query = parse_qsl(url.query, keep_blank_values=True)
+        behavior = self.behavior(path)
+
+        if method not in behavior.allowed_methods:
+            self.stats['method_not_allowed'] += 1
+            return Response(403, {'Content-Type': 'text/plain'},
+                            b'This distribution is not configured to allow the HTTP request method')
+
+        policy = behavior.cache_policy if self._edge_cache else None
+        cache_key = None
+        if policy is not None and method in ('GET', 'HEAD'):
+            cache_key = self._cache_key(behavior, policy, path, query, headers)
+            cached = self._cache.get(cache_key)
+            if cached is not None and cached[0] > self._clock():
+                self.stats['cache_hits'] += 1
+                expires_at, stored_at, response = cached
+                return self._viewer_response(behavior, method, response, headers, 'Hit',
+                                             age=int(self._clock() - stored_at))
+
+        if behavior.origin == 'bucket':
+            response = self._bucket(path)
+        else:
+            response = await self._api(method, path, query, headers, body, client_ip)
+
+        if cache_key is not None:
+            self.stats['cache_misses'] += 1
+            ttl = cache_ttl(policy, response.headers)
+            if response.status < 400 and ttl > 0:
+                now = self._clock()
+                self._cache[cache_key] = (now + ttl, now, response)
+
+        return self._viewer_response(behavior, method, response, headers, 'Miss')
+
+    def _cache_key(self, behavior, policy, path, query, headers):
+        if policy.all_query_strings:
+            key_query = sorted(query)
+        else:
+            key_query = sorted((name, value) for name, value in query if name in policy.query_strings)
+        # The policy's Accept-Encoding normalization: gzip or nothing
+        gzip_ok = 'gzip' in headers.get('accept-encoding', '')
+        return (behavior.path_pattern, path, tuple(key_query), gzip_ok)
+
+    def _viewer_response(self, behavior, method, response, headers, cache_result, age=None):
+        response_headers = dict(response.headers)
+        body = response.body
+
+        content_type = response_headers.get('Content-Type', '')
+        if (behavior.compress
+                and 'gzip' in headers.get('accept-encoding', '')
+                and 'Content-Encoding' not in response_headers
+                and COMPRESSIBLE_TYPES.match(content_type)
+                and COMPRESS_MIN_BYTES <= len(body) <= COMPRESS_MAX_BYTES):
+            body = gzip.compress(body)
+            response_headers['Content-Encoding'] = 'gzip'
+            response_headers['Vary'] = 'Accept-Encoding'
+
+        # The response headers policy overrides what the origin sent
+        response_headers.update(behavior.response_headers)
+        response_headers['X-Cache'] = f'{cache_result} from cloudfront'
+        if age is not None:
+            response_headers['Age'] = str(age)
+
+        if method == 'HEAD':
+            response_headers['Content-Length'] = str(len(body))
+            body = b''
+        return Response(response.status, response_headers, body)
+
+    def _bucket(self, path):
+        key = path.lstrip('/') or self._config.default_root_object
+        asset = self._assets.get(key)
+        if asset is not None:
+            self.stats['bucket'] += 1
+            return Response(200, self._asset_headers(asset), asset.body)
+
+        # Without s3:ListBucket, a missing object is a 403
+        self.stats['bucket_missing'] += 1
+        status, page = self._config.error_pages.get(403, (403, None))
+        page_asset = self._assets.get((page or '').lstrip('/'))
+        if page_asset is None:
+            return Response(status, {'Content-Type': 'application/xml'}, b'<Error><Code>AccessDenied</Code></Error>')
+        return Response(status, self._asset_headers(page_asset), page_asset.body)
+
+    @staticmethod
+    def _asset_headers(asset):
+        headers = {'Content-Type': asset.content_type, 'Cache-Control': asset.cache_control}
+        if asset.content_encoding:
+            headers['Content-Encoding'] = asset.content_encoding
+        return headers
+
+    def _throttled(self, path, method):
+        route = f'{path}/{method}'
+        if self._config.stage_throttle:
+            # The stage's default limits apply to every method on its own
+            if route not in self._stage_buckets:
+                self._stage_buckets[route] = TokenBucket(*self._config.stage_throttle, clock=self._clock)
+            if not self._stage_buckets[route].allow():
+                return True
+        if self._plan_bucket is not None and not self._plan_bucket.allow():
+            return True
+        bucket = self._method_buckets.get(route)
+        return bucket is not None and not bucket.allow()
+
+    async def _api(self, method, path, query, headers, body, client_ip):
+        if (path, method) not in self._config.routes:
+            self.stats['api_missing_route'] += 1
+            return json_response(403, 'Missing Authentication Token')
+
+        if self._throttled(path, method):
+            self.stats['throttled'] += 1
+            return json_response(429, 'Too Many Requests')
+
+        forwarded = {name: value for name, value in headers.items()
+                     if name.lower() not in ('host', 'x-forwarded-for')}
+        # CloudFront appends the viewer to what the viewer sent, and the
+        # API's edge distribution appends CloudFront
+        claimed = [value for name, value in headers.items() if name.lower() == 'x-forwarded-for']
+        forwarded['x-forwarded-for'] = ', '.join(claimed + [client_ip, EDGE_ADDRESS])
+        forwarded['via'] = '2.0 local.cloudfront.net (CloudFront)'
+        event = proxy_event(self._config.stage_name, path, method, path, query, forwarded, body, client_ip)
+
+        if not self._invocation_slots.acquire(blocking=False):
+            # Every environment the function may run is busy
+            self.stats['lambda_throttled'] += 1
+            return json_response(429, 'Too Many Requests')
+
+        self.stats['invocations'] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, self._handler, event, LambdaContext())
+            status = int(result['statusCode'])
+        except Exception:
+            self.stats['lambda_errors'] += 1
+            return json_response(502, 'Internal server error')
+        finally:
+            self._invocation_slots.release()
+
+        response_body = result.get('body') or ''
+        if result.get('isBase64Encoded'):
+            response_body = base64.b64decode(response_body)
+        else:
+            response_body = response_body.encode('utf-8')
+        response_headers = {'Content-Type': 'application/json'}
+        response_headers.update(result.get('headers') or {})
+        return Response(status, response_headers, response_body)
+
+    async def _serve(self, reader, writer):
+        client_ip = (writer.get_extra_info('peername') or ('127.0.0.1',))[0]
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                response = await self.handle_request(method, target, headers, body, client_ip)
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(encode_response(response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8080):
+        return await asyncio.start_server(self._serve, host, port)
+
+
+def encode_response(response, keep_alive):
+    headers = dict(response.headers)
+    headers.setdefault('Content-Length', str(len(response.body)))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+    reason = HTTPStatus(response.status).phrase
+    head = f'HTTP/1.1 {response.status} {reason}\r\n'
+    head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    return head.encode('latin-1') + b'\r\n' + response.body
+
+
+def create_history_table(table_name):
+    import boto3
+
+    resource = boto3.resource('dynamodb', region_name=os.environ['AWS_REGION'])
+    table = resource.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {'AttributeName': 'series', 'KeyType': 'HASH'},
+            {'AttributeName': 'bucket', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'series', 'AttributeType': 'S'},
+            {'AttributeName': 'bucket', 'AttributeType': 'S'},
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.wait_until_exists()
+    return table
+
+
+async def serve(emulator, host, port):
+    """Serve until SIGINT or SIGTERM, so a load test script can stop it."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    server = await emulator.start(host, port)
+    sockets = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+    print(f'Serving on {sockets}', file=sys.stderr)
+    async with server:
+        await stop.wait()
+
+
+def main(argv=None):
+    from benchmarks.load_test import configure_environment, create_table
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', help='website directory to serve; none serves only the API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--edge-cache', action='store_true',
+                        help='cache responses as the distribution\'s cache policies would')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='most handler invocations at once, more are throttled; '
+                             'the reserved concurrency by default')
+    parser.add_argument('--endpoint-url', default=None,
+                        help='DynamoDB-compatible endpoint to use instead of moto')
+    parser.add_argument('--metrics', action='store_true',
+                        help='keep the handler EMF output on stdout')
+    parser.add_argument('-c', '--context', action='append', default=[], metavar='KEY=VALUE',
+                        help='CDK context, as cdk synth -c would pass it')
+    args = parser.parse_args(argv)
+
+    from resume_iac.audit import synthesize_templates
+    from resume_iac.site_assets import build_site
+
+    context = dict(item.split('=', 1) for item in args.context)
+    config = EmulatorConfig.from_templates(synthesize_templates(context))
+
+    assets = {}
+    if args.site:
+        assets = {asset.key: asset for asset in build_site(args.site, encodings=())}
+
+    # The handler reads its settings once, at import time
+    configure_environment(args.endpoint_url)
+    os.environ.update(config.lambda_environment)
+    os.environ['COUNTER_METRICS'] = str(args.metrics).lower()
+
+    def run():
+        from lambdas.counter_lambda import index
+
+        create_table(TABLE_NAME)
+        if 'COUNTER_HISTORY_TABLE_NAME' in config.lambda_environment:
+            create_history_table(HISTORY_TABLE_NAME)
+
+        emulator = Emulator(config, assets, index.lambda_handler,
+            edge_cache=args.edge_cache,
+            concurrency=args.concurrency
+        )
+        try:
+            asyncio.run(serve(emulator, args.host, args.port))
+        finally:
+            emulator.close()
+            print(json.dumps(dict(emulator.stats), indent=2))
+
+    if args.endpoint_url:
+        run()
+        return 0
+
+    # moto has to be imported before the handler creates its client
+    from moto import mock_dynamodb
+
+    with mock_dynamodb():
+        run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
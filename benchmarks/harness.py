@@ -0,0 +1,106 @@
+"""Helpers shared by the counter Lambda benchmarks and concurrency tests."""
+import contextlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from botocore.client import BaseClient
+
+READ_OPERATIONS = {'GetItem', 'BatchGetItem', 'TransactGetItems', 'Query', 'Scan'}
+
+
+@contextlib.contextmanager
+def count_dynamodb_calls(before_call=None, serialize=False):
+    """Count DynamoDB API calls made by any client while the block runs.
+
+    Yields a Counter of operation names. `before_call(operation_name,
+    api_params)` is invoked ahead of every DynamoDB call, which lets a
+    benchmark model service-side behaviour such as partition limits. With
+    `serialize`, DynamoDB calls are made one at a time: moto's item updates
+    aren't atomic across threads, as DynamoDB's are.
+    """
+    calls = Counter()
+    lock = threading.Lock()
+    backend_lock = threading.Lock() if serialize else contextlib.nullcontext()
+    make_api_call = BaseClient._make_api_call
+
+    def counting_api_call(client, operation_name, api_params):
+        if client.meta.service_model.service_name == 'dynamodb':
+            with lock:
+                calls[operation_name] += 1
+            if before_call is not None:
+                before_call(operation_name, api_params)
+            with backend_lock:
+                return make_api_call(client, operation_name, api_params)
+        return make_api_call(client, operation_name, api_params)
+
+    with mock.patch.object(BaseClient, '_make_api_call', counting_api_call):
+        yield calls
+
+
+def invoke_concurrently(handler, invocations, workers, event=None):
+    """Fire `invocations` threaded handler calls on `workers` threads.
+
+    Returns the handler responses and a Counter of DynamoDB operation names.
+    The handlers run concurrently, but moto serves one DynamoDB call at a
+    time, so every single call is atomic as it is in DynamoDB; a handler that
+    reads and then writes can still lose updates.
+    """
+    event = event if event is not None else {}
+
+    with count_dynamodb_calls(serialize=True) as calls:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            responses = list(executor.map(
+                lambda _: handler(event, {}), range(invocations)
+            ))
+
+    return responses, calls
+
+
+def request_units(operation_name, api_params):
+    """Estimate the DynamoDB request units a call consumes.
+
+    The counter items are far below the 1 KB write and 4 KB read units, so
+    each item costs one write unit, or half a read unit for an eventually
+    consistent read. Transactions cost double.
+    """
+    read_unit = 1.0 if api_params.get('ConsistentRead') else 0.5
+
+    if operation_name in ('UpdateItem', 'PutItem', 'DeleteItem'):
+        return 1.0
+    if operation_name == 'GetItem':
+        return read_unit
+    if operation_name == 'BatchGetItem':
+        keys = sum(len(request['Keys']) for request in api_params['RequestItems'].values())
+        return keys * read_unit
+    if operation_name == 'BatchWriteItem':
+        return float(sum(len(requests) for requests in api_params['RequestItems'].values()))
+    if operation_name == 'TransactWriteItems':
+        return 2.0 * len(api_params['TransactItems'])
+    if operation_name == 'TransactGetItems':
+        return 2.0 * len(api_params['TransactItems'])
+    if operation_name in ('Query', 'Scan'):
+        # A page of counter items stays within one 4 KB read unit
+        return read_unit
+    return 0.0
+
+
+@contextlib.contextmanager
+def measure_request_units():
+    """Estimate the request units of every DynamoDB call made in the block.
+
+    Yields a dict with 'read' and 'write' totals and the call Counter.
+    """
+    units = {'read': 0.0, 'write': 0.0}
+    lock = threading.Lock()
+
+    def add_units(operation_name, api_params):
+        kind = 'read' if operation_name in READ_OPERATIONS else 'write'
+        with lock:
+            units[kind] += request_units(operation_name, api_params)
+
+    with count_dynamodb_calls(before_call=add_units) as calls:
+        units['calls'] = calls
+        yield units
+
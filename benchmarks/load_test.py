@@ -0,0 +1,224 @@
+"""Load test for the counter Lambda handler.
+
+Drives ``lambda_handler`` from a thread pool against moto, or against a
+DynamoDB-compatible endpoint such as DynamoDB Local with ``--endpoint-url``,
+and reports latency percentiles, throughput, error rate and estimated
+DynamoDB request units per request. Results are JSON so runs with different
+handler modes can be compared:
+
+    python -m benchmarks.load_test --requests 2000 --output baseline.json
+    python -m benchmarks.load_test --shards 8 --compare baseline.json
+
+The handler mode is set through the same settings the stack passes as
+environment variables: ``--shards`` (COUNTER_SHARDS) and ``--read-ratio``
+(the share of GET /counter reads, which turns on COUNTER_SPLIT_ENDPOINTS).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TABLE_NAME = 'benchmark-table'
+
+HIT_EVENT = {'httpMethod': 'POST', 'resource': '/counter/hit', 'headers': {}}
+READ_EVENT = {'httpMethod': 'GET', 'resource': '/counter', 'headers': {}}
+LEGACY_EVENT = {}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values`."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def configure_environment(endpoint_url=None):
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ.setdefault('COUNTER_TABLE_NAME', TABLE_NAME)
+    if endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = endpoint_url
+
+
+def create_table(table_name):
+    import boto3
+
+    resource = boto3.resource('dynamodb', region_name=os.environ['AWS_REGION'])
+    table = resource.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'N'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.wait_until_exists()
+    return table
+
+
+def drive(index, requests, concurrency, read_ratio, seed):
+    """Send `requests` events to the handler and collect per-request results."""
+    from benchmarks.harness import measure_request_units
+
+    chooser = random.Random(seed)
+    if read_ratio > 0:
+        events = [READ_EVENT if chooser.random() < read_ratio else HIT_EVENT
+                  for _ in range(requests)]
+    else:
+        events = [LEGACY_EVENT] * requests
+
+    def invoke(event):
+        start = time.perf_counter()
+        try:
+            response = index.lambda_handler(dict(event), {})
+            ok = response['statusCode'] in (200, 202, 304)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    with measure_request_units() as units:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(invoke, events))
+        elapsed = time.perf_counter() - start
+
+    return results, elapsed, units
+
+
+def summarize(results, elapsed, units):
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, ok in results if not ok)
+    requests = len(results)
+
+    return {
+        'requests': requests,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'error_rate': round(errors / requests, 4),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'mean': round(statistics.fmean(latencies), 3),
+            'max': round(max(latencies), 3),
+        },
+        'dynamodb': {
+            'calls_per_request': round(sum(units['calls'].values()) / requests, 3),
+            'read_units_per_request': round(units['read'] / requests, 3),
+            'write_units_per_request': round(units['write'] / requests, 3),
+            'calls': dict(units['calls']),
+        },
+    }
+
+
+def run(requests=1000, concurrency=16, shards=1, read_ratio=0.0,
+        endpoint_url=None, seed=0, metrics=False):
+    """Run one load test and return its configuration and results."""
+    configure_environment(endpoint_url)
+
+    config = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'shards': shards,
+        'read_ratio': read_ratio,
+        'backend': endpoint_url or 'moto',
+    }
+
+    def run_against_table():
+        from lambdas.counter_lambda import index
+
+        settings = {
+            'COUNTER_SHARDS': shards,
+            'SPLIT_ENDPOINTS': read_ratio > 0,
+            'METRICS_ENABLED': metrics,
+        }
+        saved = {name: getattr(index, name) for name in settings}
+
+        # The handler reads its table name once, at import time
+        table = create_table(index.TABLE_NAME)
+        try:
+            for name, value in settings.items():
+                setattr(index, name, value)
+            index._shard_total_cache.clear()
+
+            results, elapsed, units = drive(index, requests, concurrency, read_ratio, seed)
+        finally:
+            for name, value in saved.items():
+                setattr(index, name, value)
+            table.delete()
+        return summarize(results, elapsed, units)
+
+    if endpoint_url:
+        return {'config': config, 'results': run_against_table()}
+
+    # moto has to be imported before the handler creates its client
+    from moto import mock_dynamodb
+
+    with mock_dynamodb():
+        return {'config': config, 'results': run_against_table()}
+
+
+def compare(baseline, current):
+    """Relative change of the headline numbers between two runs."""
+    def change(before, after):
+        if not before:
+            return None
+        return round((after - before) / before, 4)
+
+    base, cur = baseline['results'], current['results']
+    return {
+        'throughput_rps': change(base['throughput_rps'], cur['throughput_rps']),
+        'p50': change(base['latency_ms']['p50'], cur['latency_ms']['p50']),
+        'p95': change(base['latency_ms']['p95'], cur['latency_ms']['p95']),
+        'p99': change(base['latency_ms']['p99'], cur['latency_ms']['p99']),
+        'calls_per_request': change(base['dynamodb']['calls_per_request'],
+                                    cur['dynamodb']['calls_per_request']),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--read-ratio', type=float, default=0.0,
+                        help='share of GET /counter reads; above 0 splits the endpoints')
+    parser.add_argument('--endpoint-url', default=None,
+                        help='DynamoDB-compatible endpoint to use instead of moto')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--metrics', action='store_true',
+                        help='keep the handler EMF output on stdout')
+    parser.add_argument('--output', help='write the JSON result to this file')
+    parser.add_argument('--compare', help='JSON result of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    result = run(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        shards=args.shards,
+        read_ratio=args.read_ratio,
+        endpoint_url=args.endpoint_url,
+        seed=args.seed,
+        metrics=args.metrics,
+    )
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            result['change'] = compare(json.load(f), result)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
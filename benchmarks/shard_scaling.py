@@ -0,0 +1,96 @@
+"""Throughput of the counter Lambda as the number of shards grows.
+
+moto has no notion of partitions, so the benchmark models one: writes to
+the same item key are serialised and each holds its key for
+1 / --partition-wcu seconds. That is the hot-key ceiling sharding is meant
+to lift. The default ceiling is scaled down from DynamoDB's 1000 WCU per
+partition so moto's own per-call overhead doesn't hide the effect.
+
+Usage:
+    python -m benchmarks.shard_scaling --shards 1 2 4 8 16 --invocations 400
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TABLE_NAME = 'benchmark-table'
+
+
+def run(shard_counts, invocations, workers, partition_wcu):
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+    # The handler's EMF lines would otherwise interleave with the JSON report.
+    os.environ['COUNTER_METRICS'] = 'false'
+
+    import boto3
+    from moto import mock_dynamodb
+
+    from benchmarks.harness import count_dynamodb_calls
+
+    key_locks = collections.defaultdict(threading.Lock)
+    write_seconds = 1 / partition_wcu
+
+    def hot_key_limit(operation_name, api_params):
+        if operation_name == 'UpdateItem':
+            with key_locks[repr(api_params['Key'])]:
+                time.sleep(write_seconds)
+
+    results = []
+    with mock_dynamodb():
+        from lambdas.counter_lambda import index
+        index.METRICS_ENABLED = False
+
+        for shards in shard_counts:
+            table = boto3.resource('dynamodb', region_name=os.environ['AWS_REGION']).create_table(
+                TableName=TABLE_NAME,
+                KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'N'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            index.COUNTER_SHARDS = shards
+            index._shard_total_cache.clear()
+
+            with count_dynamodb_calls(before_call=hot_key_limit) as calls:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(lambda _: index.lambda_handler({}, {}),
+                                      range(invocations)))
+                elapsed = time.perf_counter() - start
+
+            total = index.read_sharded_total(index.COUNTER_ID, shards)
+            results.append({
+                'shards': shards,
+                'invocations': invocations,
+                'seconds': round(elapsed, 3),
+                'hits_per_second': round(invocations / elapsed, 1),
+                'total_exact': total == invocations,
+                'dynamodb_calls': dict(calls),
+            })
+            table.delete()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--invocations', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--partition-wcu', type=float, default=100,
+                        help='modelled writes per second a single item key can take')
+    args = parser.parse_args(argv)
+
+    results = run(args.shards, args.invocations, args.workers, args.partition_wcu)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
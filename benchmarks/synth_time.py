@@ -0,0 +1,164 @@
+"""Synthesis benchmark for the CDK app.
+
+Builds each stack group of ``resume_iac.factory`` in a fresh app, offline, and
+reports for each:
+
+* ``construct_ms``   - creating the stacks, including asset bundling
+* ``synth_ms``       - ``app.synth()`` into a temporary cloud assembly
+* ``python_peak_kib`` - peak Python allocations while doing both (tracemalloc)
+* ``template_bytes`` - size of every synthesized template, by stack
+
+plus ``node_peak_kib``, the high-water mark of the jsii node process the
+constructs live in, when ``/proc`` shows it. That one only grows, so it is
+reported once for the whole run.
+
+The first app built pays for loading the jsii runtime and is left out of the
+timings. Timings are medians over ``--repeat`` runs:
+
+    python -m benchmarks.synth_time --repeat 5 --output baseline.json
+    python -m benchmarks.synth_time --compare baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DOMAIN_NAME = 'example.com'
+
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def node_peak_kib():
+    """VmHWM of the jsii node child process, or None where /proc can't tell."""
+    peaks = []
+    for children in glob.glob(f'/proc/{os.getpid()}/task/*/children'):
+        try:
+            with open(children, encoding='utf-8') as f:
+                pids = f.read().split()
+        except OSError:
+            continue
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/comm', encoding='utf-8') as f:
+                    if f.read().strip() != 'node':
+                        continue
+                with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            peaks.append(int(line.split()[1]))
+            except OSError:
+                continue
+    return max(peaks) if peaks else None
+
+
+def synth_group(group, context=None, trace_memory=False):
+    """Build and synthesize one stack group in a fresh app."""
+    from resume_iac.factory import create_app, create_stacks, stack_environment
+
+    with tempfile.TemporaryDirectory() as outdir:
+        if trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        app = create_app(context=context, offline=True, outdir=outdir)
+        create_stacks(app, *stack_environment(app), DOMAIN_NAME, stacks=[group])
+        construct_ms = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        assembly = app.synth()
+        synth_ms = _elapsed_ms(start)
+
+        sample = {'construct_ms': construct_ms, 'synth_ms': synth_ms}
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sample['python_peak_kib'] = round(peak / 1024)
+
+        sample['template_bytes'] = {
+            stack.stack_name: os.path.getsize(os.path.join(outdir, stack.template_file))
+            for stack in assembly.stacks
+        }
+    return sample
+
+
+def run(repeat=3, groups=None, context=None):
+    from resume_iac.factory import STACK_GROUPS
+
+    groups = list(groups or STACK_GROUPS)
+
+    # Starts the jsii runtime, which every later app reuses
+    synth_group(groups[0], context)
+
+    results = {}
+    for group in groups:
+        samples = [synth_group(group, context) for _ in range(repeat)]
+        # tracemalloc slows allocation down, so memory has a run of its own
+        memory = synth_group(group, context, trace_memory=True)
+        results[group] = {
+            'construct_ms': round(statistics.median(s['construct_ms'] for s in samples), 1),
+            'synth_ms': round(statistics.median(s['synth_ms'] for s in samples), 1),
+            'python_peak_kib': memory['python_peak_kib'],
+            'template_bytes': samples[-1]['template_bytes'],
+        }
+
+    return {
+        'config': {'repeat': repeat, 'groups': groups, 'context': context or {}},
+        'results': results,
+        'node_peak_kib': node_peak_kib(),
+    }
+
+
+def compare(baseline, current):
+    """Relative change of construct and synth time, by stack group."""
+    def change(before, after):
+        if not before:
+            return None
+        return round((after - before) / before, 4)
+
+    return {
+        group: {
+            'construct_ms': change(baseline['results'][group]['construct_ms'], cur['construct_ms']),
+            'synth_ms': change(baseline['results'][group]['synth_ms'], cur['synth_ms']),
+        }
+        for group, cur in current['results'].items()
+        if group in baseline['results']
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stacks', default=None,
+                        help='comma separated stack groups; all of them by default')
+    parser.add_argument('--context', action='append', default=[], metavar='KEY=VALUE',
+                        help='CDK context, as cdk synth -c would pass it')
+    parser.add_argument('--output', help='write the JSON result to this file')
+    parser.add_argument('--compare', help='JSON result of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    context = dict(item.split('=', 1) for item in args.context)
+    groups = args.stacks.split(',') if args.stacks else None
+
+    result = run(repeat=args.repeat, groups=groups, context=context)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            result['change'] = compare(json.load(f), result)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+// Viewer request function for the /counter behaviors. It answers what must
+// never reach the counter API at the edge and normalizes the cache key of
+// counter reads. S3WebsiteStack fills in SPLIT_ENDPOINTS: true when
+// POST /counter/hit counts and GET /counter only reads, false when every
+// GET /counter counts a page view.
+var SPLIT_ENDPOINTS = {{split_endpoints}};
+
+// Crawlers, link previews and scripted clients
+var BOT_PATTERN = /bot|crawl|spider|slurp|facebookexternalhit|preview|headless|lighthouse|curl|wget|python-requests|go-http-client/i;
+
+// Speculative loads the browser may throw away unseen
+var PREFETCH_HEADERS = ['purpose', 'sec-purpose', 'x-purpose', 'x-moz'];
+
+function header(request, name) {
+    var value = request.headers[name];
+    return value ? value.value : '';
+}
+
+function respond(statusCode, statusDescription, headers) {
+    var response = {
+        statusCode: statusCode,
+        statusDescription: statusDescription,
+        headers: {'cache-control': {value: 'no-store'}}
+    };
+    for (var name in headers) {
+        response.headers[name] = {value: headers[name]};
+    }
+    return response;
+}
+
+function isPrefetch(request) {
+    for (var i = 0; i < PREFETCH_HEADERS.length; i++) {
+        if (/prefetch|preview|prerender/i.test(header(request, PREFETCH_HEADERS[i]))) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// "?ids=3,1,3&utm_source=x" and "?ids=1,3" read the same counters, so both
+// become "?ids=1,3" and share one cache entry
+function normalizeQuerystring(request) {
+    var ids = request.querystring.ids;
+    var normalized = {};
+
+    if (ids && ids.value) {
+        var seen = {};
+        var values = [];
+        var parts = ids.value.split(',');
+        for (var i = 0; i < parts.length; i++) {
+            var part = parts[i].trim();
+            if (part && !seen[part]) {
+                seen[part] = true;
+                values.push(part);
+            }
+        }
+        values.sort(function (a, b) {
+            var difference = Number(a) - Number(b);
+            return isNaN(difference) ? (a < b ? -1 : a > b ? 1 : 0) : difference;
+        });
+        normalized.ids = {value: values.join(',')};
+    }
+
+    request.querystring = normalized;
+}
+
+function handler(event) {
+    var request = event.request;
+    var method = request.method;
+    var isHit = request.uri === '/counter/hit';
+    var allowed = isHit ? 'POST' : 'GET';
+
+    if (method === 'OPTIONS') {
+        // The page and the API share an origin, so a preflight is never
+        // needed and gets no CORS headers
+        return respond(204, 'No Content', {allow: allowed + ', OPTIONS'});
+    }
+
+    if (method !== allowed) {
+        return respond(405, 'Method Not Allowed', {allow: allowed + ', OPTIONS'});
+    }
+
+    var counts = isHit || !SPLIT_ENDPOINTS;
+
+    if (counts && (BOT_PATTERN.test(header(request, 'user-agent')) || isPrefetch(request))) {
+        // Not a page view: don't count it and don't wake the origin
+        return respond(204, 'No Content', {});
+    }
+
+    if (!counts) {
+        normalizeQuerystring(request);
+    }
+
+    return request;
+}
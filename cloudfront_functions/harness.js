@@ -0,0 +1,37 @@
+// Runs a CloudFront Function on this machine, for tests and for trying
+// requests out by hand:
+//
+//   node cloudfront_functions/harness.js <function.js> < events.json
+//
+// events.json holds an array of CloudFront Function events; the handler's
+// results are printed as a JSON array in the same order. Each run gets a
+// fresh context without Node's globals, close to the functions runtime.
+'use strict';
+
+const fs = require('fs');
+const vm = require('vm');
+
+function loadHandler(path) {
+    const context = vm.createContext({});
+    vm.runInContext(fs.readFileSync(path, 'utf8'), context, {filename: path});
+    if (typeof context.handler !== 'function') {
+        throw new Error(`${path} does not define handler(event)`);
+    }
+    return context.handler;
+}
+
+function main(argv) {
+    if (argv.length !== 1) {
+        process.stderr.write('usage: node harness.js <function.js> < events.json\n');
+        return 2;
+    }
+
+    const handler = loadHandler(argv[0]);
+    const events = JSON.parse(fs.readFileSync(0, 'utf8'));
+    const results = events.map((event) => handler(event));
+
+    process.stdout.write(JSON.stringify(results) + '\n');
+    return 0;
+}
+
+process.exitCode = main(process.argv.slice(2));
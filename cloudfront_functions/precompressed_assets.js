@@ -0,0 +1,22 @@
+// Viewer request function for the website bucket. The site asset pipeline
+// (resume_iac/site_assets.py) stores a brotli .br and a gzip .gz copy next to
+// every text file; browsers that accept one are sent to it, so CloudFront
+// never compresses on the fly and brotli is always at its highest level.
+var COMPRESSIBLE = /\.(html?|css|m?js|json|svg|txt|xml|map)$/;
+
+function handler(event) {
+    var request = event.request;
+    if (!COMPRESSIBLE.test(request.uri)) {
+        return request;
+    }
+
+    var header = request.headers['accept-encoding'];
+    var accepted = header ? header.value : '';
+
+    if (/\bbr\b/.test(accepted)) {
+        request.uri += '.br';
+    } else if (/\bgzip\b/.test(accepted)) {
+        request.uri += '.gz';
+    }
+    return request;
+}
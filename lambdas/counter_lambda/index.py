@@ -1,53 +1,1191 @@
+import base64
 import boto3
+import hashlib
+import hmac
 import json
+import logging
 import os
+import random
+import threading
+import time
 
+from collections import Counter, OrderedDict
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
 
+TABLE_NAME = os.environ['COUNTER_TABLE_NAME']
+# Lambda sets AWS_REGION, so each regional function uses its local replica
+REGION = os.environ.get('AWS_REGION', 'us-east-1')
 
-def lambda_handler(event, context):
+COUNTER_ID = 1
+
+# Number of items the counter is spread over. With more than one shard each
+# increment goes to a random shard item, so writes are no longer capped by
+# the throughput of a single partition key.
+COUNTER_SHARDS = int(os.environ.get('COUNTER_SHARDS', '1'))
+
+# The shards this function adds hits to: COUNTER_WRITE_SHARDS of them from
+# COUNTER_SHARD_OFFSET on. Global table replicas resolve concurrent writes
+# to an item by keeping the last one, so each region writes only its own
+# range of shards, while reads sum all COUNTER_SHARDS. Unset, every shard is
+# written.
+WRITE_SHARDS = int(os.environ.get('COUNTER_WRITE_SHARDS', '0'))
+SHARD_OFFSET = int(os.environ.get('COUNTER_SHARD_OFFSET', '0'))
+
+# How long an aggregated shard total is served before the shards are read
+# again. Only used when the counter is sharded. A cached total misses hits
+# other environments counted since it was read, but never this environment's
+# own: each hit it counts is added to the cached total.
+SHARD_CACHE_SECONDS = float(os.environ.get('COUNTER_SHARD_CACHE_SECONDS', '1'))
+
+# When the endpoints are split, GET /counter only reads the value and can be
+# cached for COUNTER_READ_MAX_AGE seconds, while POST /counter/hit counts a
+# page view. Otherwise every request to the function counts a page view.
+SPLIT_ENDPOINTS = os.environ.get('COUNTER_SPLIT_ENDPOINTS', 'false').lower() == 'true'
+READ_MAX_AGE = int(os.environ.get('COUNTER_READ_MAX_AGE', '5'))
+
+# LOG_LEVEL=DEBUG logs every request. At INFO only a LOG_SAMPLE_RATE fraction
+# of requests is logged, so the hot path doesn't pay for a log line on every
+# hit. Errors are always logged.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+# Per-invocation metrics are written to stdout in CloudWatch Embedded Metric
+# Format, which CloudWatch Logs turns into metrics without any API calls.
+METRICS_ENABLED = os.environ.get('COUNTER_METRICS', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('COUNTER_METRICS_NAMESPACE', 'ResumeCounter')
+
+# In unique-visitor mode a hit is counted once per visitor and UTC day. The
+# visitor is a hash of the client address, user agent and day, claimed with a
+# conditional put of a dedup item that DynamoDB's TTL removes after
+# COUNTER_VISITOR_TTL_SECONDS. Repeat visits only read the counter.
+UNIQUE_VISITORS = os.environ.get('COUNTER_UNIQUE_VISITORS', 'false').lower() == 'true'
+VISITOR_TTL_SECONDS = int(os.environ.get('COUNTER_VISITOR_TTL_SECONDS', str(2 * 24 * 3600)))
+
+# Visitors this execution environment has already seen, so a repeat visit to
+# the same warm environment doesn't even cost a conditional put.
+VISITOR_CACHE_SIZE = 10_000
+
+# Dedup items live in the counter table, above every counter and shard key.
+VISITOR_KEY_OFFSET = 10 ** 30
+
+# When COUNTER_HISTORY_TABLE_NAME is set, every hit also adds to an hourly and
+# a daily bucket item in that table, in the same transaction as the running
+# total. Buckets are keyed by series ("<counter id>#hour") and bucket start
+# ("2024-05-01T13"), so GET /counter/history reads a time range with a Query.
+HISTORY_TABLE_NAME = os.environ.get('COUNTER_HISTORY_TABLE_NAME')
+HISTORY_MAX_AGE = int(os.environ.get('COUNTER_HISTORY_MAX_AGE', '60'))
+
+# Bucket format and default range length, in buckets, per granularity
+HISTORY_GRANULARITIES = {
+    'hour': ('%Y-%m-%dT%H', 3600, 24),
+    'day': ('%Y-%m-%d', 24 * 3600, 30),
+}
+HISTORY_MAX_PAGE_SIZE = 500
+
+# Fail fast when DynamoDB throttles or slows down: a small budget of adaptive
+# retries, which also rate limit the client while it is being throttled, and
+# timeouts derived from COUNTER_FUNCTION_TIMEOUT. A throttled attempt n backs
+# off for up to 2 ** (n - 1) seconds, so with the default two attempts the
+# worst case is two connect and read timeouts plus one second of backoff,
+# and the timeouts are sized to leave FUNCTION_TIMEOUT_HEADROOM seconds of
+# that to spare: 2 * (0.25 + 0.25) + 1 = 2 seconds of a 3 second timeout.
+FUNCTION_TIMEOUT = float(os.environ.get('COUNTER_FUNCTION_TIMEOUT', '3'))
+FUNCTION_TIMEOUT_HEADROOM = 1.0
+DYNAMODB_MAX_ATTEMPTS = int(os.environ.get('COUNTER_DYNAMODB_MAX_ATTEMPTS', '2'))
+DYNAMODB_MAX_BACKOFF = sum(min(2 ** n, 20) for n in range(DYNAMODB_MAX_ATTEMPTS - 1))
+DYNAMODB_ATTEMPT_TIMEOUT = max(
+    (FUNCTION_TIMEOUT - FUNCTION_TIMEOUT_HEADROOM - DYNAMODB_MAX_BACKOFF) / (2 * DYNAMODB_MAX_ATTEMPTS),
+    0.1)
+DYNAMODB_CONNECT_TIMEOUT = float(os.environ.get('COUNTER_DYNAMODB_CONNECT_TIMEOUT',
+                                                str(DYNAMODB_ATTEMPT_TIMEOUT)))
+DYNAMODB_READ_TIMEOUT = float(os.environ.get('COUNTER_DYNAMODB_READ_TIMEOUT',
+                                             str(DYNAMODB_ATTEMPT_TIMEOUT)))
+
+# When DynamoDB still can't be reached, the last value this environment saw
+# is served, marked stale, for up to COUNTER_STALE_MAX_AGE seconds. After
+# COUNTER_BREAKER_THRESHOLD such failures in a row DynamoDB isn't called at
+# all for COUNTER_BREAKER_COOLDOWN seconds.
+STALE_MAX_AGE = float(os.environ.get('COUNTER_STALE_MAX_AGE', '300'))
+BREAKER_THRESHOLD = int(os.environ.get('COUNTER_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get('COUNTER_BREAKER_COOLDOWN', '10'))
+LAST_KNOWN_CACHE_SIZE = 10_000
+
+# Warm environments serve counter reads from memory for COUNTER_CACHE_TTL
+# seconds (0 turns the cache off), for at most COUNTER_CACHE_SIZE counters.
+CACHE_TTL = float(os.environ.get('COUNTER_CACHE_TTL', '0'))
+CACHE_SIZE = int(os.environ.get('COUNTER_CACHE_SIZE', '1000'))
+
+# With COUNTER_BUFFER_HITS, hits are added up in memory and written with one
+# ADD once COUNTER_FLUSH_THRESHOLD of them are pending or the oldest is
+# COUNTER_CACHE_TTL seconds old. Hits still pending when the environment is
+# shut down are lost, so this trades exactness for far fewer writes.
+BUFFER_HITS = os.environ.get('COUNTER_BUFFER_HITS', 'false').lower() == 'true'
+FLUSH_THRESHOLD = int(os.environ.get('COUNTER_FLUSH_THRESHOLD', '50'))
+
+# Behind an HTTP API, or a REST API without an API key, the function checks
+# that requests come from CloudFront: CloudFront sends the value of the
+# COUNTER_ORIGIN_SECRET_ID secret (an ARN or, for a replicated secret, its
+# name) in the x-origin-secret header. The secret is fetched once per
+# environment and kept for as long as it stays warm.
+ORIGIN_SECRET_ID = os.environ.get('COUNTER_ORIGIN_SECRET_ID')
+ORIGIN_SECRET_HEADER = 'x-origin-secret'
+
+TRANSIENT_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable',
+}
+
+# Shard 0 is the original counter item (id = counter id), so a single shard
+# is exactly the unsharded layout and existing totals carry over. The other
+# shards are stored at id = counter id * SHARD_KEY_STRIDE + shard number.
+SHARD_KEY_STRIDE = 1_000_000
+
+# A request with ?ids=1,2,3 reads or counts several counters at once: reads
+# with BatchGetItem, hits with TransactWriteItems. Counter IDs stay below the
+# shard keys, and COUNTER_MAX_BATCH caps how many one request may name.
+MAX_COUNTER_ID = SHARD_KEY_STRIDE - 1
+MAX_BATCH_COUNTERS = int(os.environ.get('COUNTER_MAX_BATCH', '50'))
+
+# DynamoDB's per-request limits
+BATCH_GET_MAX_KEYS = 100
+TRANSACT_MAX_ITEMS = 100
+
+# Set up the DynamoDB client once per execution environment. Warm invocations
+# reuse the session, the resolved endpoint and the pooled keep-alive
+# connections instead of rebuilding them on every request.
+dynamodb = boto3.resource('dynamodb',
+    region_name=REGION,
+    config=Config(
+        tcp_keepalive=True,
+        connect_timeout=DYNAMODB_CONNECT_TIMEOUT,
+        read_timeout=DYNAMODB_READ_TIMEOUT,
+        retries={'mode': 'adaptive', 'total_max_attempts': DYNAMODB_MAX_ATTEMPTS}
+    )
+)
+table = dynamodb.Table(TABLE_NAME)
+history_table = dynamodb.Table(HISTORY_TABLE_NAME) if HISTORY_TABLE_NAME else None
+
+logger = logging.getLogger()
+logger.setLevel(LOG_LEVEL)
+
+# Aggregated shard totals by counter ID, with the time each stops being
+# served: {counter_id: (value, expires_at)}.
+_shard_total_cache = {}
+
+# Visitor keys claimed or found taken by this environment, oldest first.
+_seen_visitors = OrderedDict()
+_seen_visitors_lock = threading.Lock()
+
+class TTLCache:
+    """Counter values that expire `ttl` seconds after they were stored.
+
+    Holds at most `max_size` values, dropping the least recently stored
+    first. A `ttl` of 0 or less turns the cache off.
+    """
+
+    def __init__(self, ttl, max_size, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or self.clock() >= entry[1]:
+                self._values.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._values[key] = (value, self.clock() + self.ttl)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+_read_cache = TTLCache(CACHE_TTL, CACHE_SIZE)
+
+# Buffered hits per counter ID, as (hits, time of the oldest one)
+_pending_hits = {}
+_pending_lock = threading.Lock()
+
+# The origin secret, once it has been fetched
+_origin_secret = None
+
+# Last value read or written per counter ID, with the time it was seen.
+_last_known_values = OrderedDict()
+_last_known_lock = threading.Lock()
+
+# True until the first invocation of this execution environment has finished.
+_cold_start = True
+
+# Time spent in DynamoDB calls during the current invocation.
+_dynamodb_timing = threading.local()
+
+
+def _start_dynamodb_call(**kwargs):
+    _dynamodb_timing.started = time.perf_counter()
+
+
+def _end_dynamodb_call(**kwargs):
+    started = getattr(_dynamodb_timing, 'started', None)
+    if started is not None:
+        _dynamodb_timing.milliseconds = (getattr(_dynamodb_timing, 'milliseconds', 0.0)
+                                         + (time.perf_counter() - started) * 1000)
+        _dynamodb_timing.calls = getattr(_dynamodb_timing, 'calls', 0) + 1
+        _dynamodb_timing.started = None
+
+
+# Time every DynamoDB call, retries included, through the client's events.
+dynamodb.meta.client.meta.events.register('before-call.dynamodb', _start_dynamodb_call)
+dynamodb.meta.client.meta.events.register('after-call.dynamodb', _end_dynamodb_call)
+dynamodb.meta.client.meta.events.register('after-call-error.dynamodb', _end_dynamodb_call)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling DynamoDB after `threshold` transient failures in a row.
+
+    While open, calls are refused for `cooldown` seconds. Calls are then let
+    through again: a success closes the breaker, a failure reopens it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            return (self.opened_at is None
+                    or time.monotonic() - self.opened_at >= self.cooldown)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+circuit_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+
+
+def is_transient_error(error):
+    if isinstance(error, (CircuitOpenError, ConnectionError, HTTPClientError)):
+        return True
+    return (isinstance(error, ClientError)
+            and error.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES)
+
+
+def guarded(call, *args):
+    """Run a DynamoDB operation through the circuit breaker."""
+    if not circuit_breaker.allow():
+        raise CircuitOpenError('DynamoDB calls are paused after repeated failures')
+
+    try:
+        result = call(*args)
+    except Exception as e:
+        if is_transient_error(e):
+            circuit_breaker.record_failure()
+        raise
+
+    circuit_breaker.record_success()
+    return result
+
+
+def remember_values(values):
+    """Keep the latest value of each counter for the degraded mode."""
+    now = time.monotonic()
+    with _last_known_lock:
+        for counter_id, value in values.items():
+            _last_known_values[counter_id] = (value, now)
+            _last_known_values.move_to_end(counter_id)
+        while len(_last_known_values) > LAST_KNOWN_CACHE_SIZE:
+            _last_known_values.popitem(last=False)
+
+
+def last_known_values(counter_ids):
+    """The remembered values of all `counter_ids`, or None if any is missing or too old."""
+    now = time.monotonic()
+    values = {}
+    for counter_id in counter_ids:
+        known = _last_known_values.get(counter_id)
+        if known is None or now - known[1] > STALE_MAX_AGE:
+            return None
+        values[counter_id] = known[0]
+    return values
 
-    TABLE_NAME = os.environ.get('COUNTER_TABLE_NAME')
-    
-    try:
-        # Read the current value of the 'counter' key from DynamoDB
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-        table = dynamodb.Table(TABLE_NAME)
-    
-        # Read the current item with id = 1 and counter = 0
-        response = table.get_item(Key={'id': 1})
-        # print(response)
-
-        item = response.get('Item')
-        # print(item)
-    
-        # Increment the counter by 1
-        updated_counter = int(item.get('counter', 0)) + 1
-    
-        # Update the item with the incremented counter
-        table.update_item(
-            Key={'id': 1},
-            UpdateExpression='SET #counter = :new_counter',
-            ExpressionAttributeNames={'#counter': 'counter'},
-            ExpressionAttributeValues={':new_counter': updated_counter}
-        )
 
-        print(f'The counter value is now {updated_counter}')
+def should_log_request():
+    if logger.isEnabledFor(logging.DEBUG):
+        return True
+    return logger.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLE_RATE
 
-        # Create a response object
-        response = {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'Success', 'data': f'{updated_counter}'}),
-            'headers': {
-                'Content-Type': 'application/json'
+
+def error_class(error):
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code', 'ClientError')
+    return type(error).__name__
+
+
+def emit_metrics(operation, duration_ms, error=None, context=None, degraded=False):
+    """Write the invocation's metrics as one CloudWatch EMF log line."""
+    global _cold_start
+
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Operation']],
+                'Metrics': [
+                    {'Name': 'HandlerDuration', 'Unit': 'Milliseconds'},
+                    {'Name': 'DynamoDBLatency', 'Unit': 'Milliseconds'},
+                    {'Name': 'DynamoDBCalls', 'Unit': 'Count'},
+                    {'Name': 'ColdStart', 'Unit': 'Count'},
+                    {'Name': 'Errors', 'Unit': 'Count'},
+                    {'Name': 'Degraded', 'Unit': 'Count'},
+                ],
+            }],
+        },
+        'Operation': operation,
+        'HandlerDuration': round(duration_ms, 3),
+        'DynamoDBLatency': round(getattr(_dynamodb_timing, 'milliseconds', 0.0), 3),
+        'DynamoDBCalls': getattr(_dynamodb_timing, 'calls', 0),
+        'ColdStart': 1 if _cold_start else 0,
+        'Errors': 0 if error is None else 1,
+        'Degraded': 1 if degraded else 0,
+    }
+
+    if error is not None:
+        record['ErrorClass'] = error_class(error)
+
+    request_id = getattr(context, 'aws_request_id', None)
+    if request_id:
+        record['RequestId'] = request_id
+
+    _cold_start = False
+
+    if METRICS_ENABLED:
+        print(json.dumps(record))
+
+
+def start_invocation():
+    _dynamodb_timing.started = None
+    _dynamodb_timing.milliseconds = 0.0
+    _dynamodb_timing.calls = 0
+    return time.perf_counter()
+
+
+def shard_key(counter_id, shard):
+    if shard == 0:
+        return counter_id
+    return counter_id * SHARD_KEY_STRIDE + shard
+
+
+def write_shard_key(counter_id):
+    """Key of a random shard among the ones this function writes."""
+    return shard_key(counter_id, SHARD_OFFSET + random.randrange(WRITE_SHARDS or COUNTER_SHARDS))
+
+
+def add_to_counter(key, increment=1):
+    """Atomically add `increment` to the counter item and return the new value.
+
+    ADD creates the item and the attribute when they don't exist yet, and
+    concurrent invocations never overwrite each other's increments.
+    """
+    response = table.update_item(
+        Key={'id': key},
+        UpdateExpression='ADD #counter :increment',
+        ExpressionAttributeNames={'#counter': 'counter'},
+        ExpressionAttributeValues={':increment': increment},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['counter'])
+
+
+def history_buckets(now=None):
+    """The (granularity, bucket) pairs a hit at `now` is rolled up into."""
+    moment = time.gmtime(now)
+    return [(granularity, time.strftime(fmt, moment))
+            for granularity, (fmt, _, _) in HISTORY_GRANULARITIES.items()]
+
+
+def counter_updates(key, counter_id, increment):
+    """TransactWriteItems updates adding `increment` to the counter item at
+    `key` and, when history is on, to the counter's time buckets."""
+    def add(table_name, item_key):
+        return {'Update': {
+            'TableName': table_name,
+            'Key': item_key,
+            'UpdateExpression': 'ADD #counter :increment',
+            'ExpressionAttributeNames': {'#counter': 'counter'},
+            'ExpressionAttributeValues': {':increment': increment},
+        }}
+
+    # The resource's client serializes plain Python values, like the table does
+    items = [add(TABLE_NAME, {'id': key})]
+    if history_table is not None:
+        items += [add(HISTORY_TABLE_NAME, {'series': f'{counter_id}#{granularity}', 'bucket': bucket})
+                  for granularity, bucket in history_buckets()]
+    return items
+
+
+def add_to_counter_and_history(key, counter_id, increment=1):
+    """Add `increment` to the counter item and its time buckets atomically.
+
+    Transactions don't return the updated values, so the total is read back
+    with a strongly consistent read.
+    """
+    dynamodb.meta.client.transact_write_items(
+        TransactItems=counter_updates(key, counter_id, increment)
+    )
+
+    response = table.get_item(
+        Key={'id': key},
+        ProjectionExpression='#counter',
+        ExpressionAttributeNames={'#counter': 'counter'},
+        ConsistentRead=True
+    )
+    return int(response['Item']['counter'])
+
+
+def read_counter_items(keys, consistent=False):
+    """Counter values of the items at `keys`, 0 for missing items.
+
+    Keys are read with BatchGetItem, BATCH_GET_MAX_KEYS at a time.
+    """
+    values = dict.fromkeys(keys, 0)
+
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request_items = {
+            TABLE_NAME: {
+                'Keys': [{'id': key} for key in keys[start:start + BATCH_GET_MAX_KEYS]],
+                'ProjectionExpression': '#id, #counter',
+                'ExpressionAttributeNames': {'#id': 'id', '#counter': 'counter'},
+                'ConsistentRead': consistent,
             }
         }
-        return response
-    
+
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response['Responses'].get(TABLE_NAME, []):
+                values[int(item['id'])] = int(item.get('counter', 0))
+            request_items = response.get('UnprocessedKeys')
+
+    return values
+
+
+def read_sharded_total(counter_id, shards, consistent=False):
+    """Sum all shards of a counter with a single BatchGetItem."""
+    keys = [shard_key(counter_id, s) for s in range(shards)]
+    return sum(read_counter_items(keys, consistent).values())
+
+
+def read_counters(counter_ids, consistent=False):
+    """Values of several counters by counter ID, each summed over its shards.
+
+    Counters in the read cache aren't read again, unless `consistent`.
+    """
+    counters = {}
+    if not consistent:
+        for counter_id in counter_ids:
+            value = _read_cache.get(counter_id)
+            if value is not None:
+                counters[counter_id] = value
+
+    missing = [counter_id for counter_id in counter_ids if counter_id not in counters]
+    if missing:
+        shards = max(COUNTER_SHARDS, 1)
+        values = read_counter_items(
+            [shard_key(counter_id, s) for counter_id in missing for s in range(shards)],
+            consistent
+        )
+        for counter_id in missing:
+            counters[counter_id] = sum(values[shard_key(counter_id, s)] for s in range(shards))
+            _read_cache.put(counter_id, counters[counter_id])
+
+    return {counter_id: counters[counter_id] for counter_id in counter_ids}
+
+
+def cached_sharded_total(counter_id, shards, added=0):
+    """A counter's total over its shards, read at most every SHARD_CACHE_SECONDS.
+
+    `added` is the number of hits the caller has just written. They are added
+    to a cached total, and a total read afresh is read consistently, so the
+    value returned includes them either way.
+    """
+    now = time.monotonic()
+    cached = _shard_total_cache.get(counter_id)
+    if cached is not None and now < cached[1]:
+        value = cached[0] + added
+        _shard_total_cache[counter_id] = (value, cached[1])
+        return value
+
+    # Expired totals of other counters would otherwise pile up
+    for expired in [key for key, (_, expires_at) in _shard_total_cache.items()
+                    if now >= expires_at]:
+        del _shard_total_cache[expired]
+
+    value = read_sharded_total(counter_id, shards, consistent=added > 0)
+    _shard_total_cache[counter_id] = (value, now + SHARD_CACHE_SECONDS)
+    return value
+
+
+def read_counter(counter_id):
+    """Return the counter value without counting a hit.
+
+    Hits this environment has buffered but not written yet are included.
+    """
+    cached = cached_counter(counter_id)
+    if cached is not None:
+        return cached
+    return read_stored_counter(counter_id)
+
+
+def cached_counter(counter_id):
+    """The counter value from this environment's cache, or None."""
+    cached = _read_cache.get(counter_id)
+    if cached is None:
+        return None
+    return cached + pending_hits(counter_id)
+
+
+def read_stored_counter(counter_id):
+    """Read the counter value from the table and cache it."""
+    if COUNTER_SHARDS > 1:
+        value = cached_sharded_total(counter_id, COUNTER_SHARDS)
+    else:
+        response = table.get_item(
+            Key={'id': counter_id},
+            ProjectionExpression='#counter',
+            ExpressionAttributeNames={'#counter': 'counter'}
+        )
+        value = int(response.get('Item', {}).get('counter', 0))
+
+    _read_cache.put(counter_id, value)
+    return value + pending_hits(counter_id)
+
+
+def pending_hits(counter_id):
+    return _pending_hits.get(counter_id, (0, 0.0))[0]
+
+
+def flush_hits(counter_id, visitor=None):
+    """Write a counter's buffered hits with one ADD and return its value.
+
+    If the write fails the hits stay buffered for the next flush, except the
+    hit of the request flushing them when it claimed `visitor`: that hit is
+    dropped and the claim released, as if the visit never happened, so a
+    retry counts it once.
+    """
+    with _pending_lock:
+        hits, since = _pending_hits.pop(counter_id, (0, 0.0))
+
+    try:
+        value = add_hits(counter_id, hits) if hits else None
+    except Exception:
+        kept = hits - 1 if visitor is not None else hits
+        with _pending_lock:
+            pending, _ = _pending_hits.get(counter_id, (0, since))
+            if pending + kept:
+                _pending_hits[counter_id] = (pending + kept, since)
+        if visitor is not None:
+            release_visit(visitor)
+        raise
+
+    if value is None or COUNTER_SHARDS > 1:
+        # A shard's value isn't the counter total, so read the total again
+        _read_cache.invalidate(counter_id)
+        return read_counter(counter_id)
+
+    _read_cache.put(counter_id, value)
+    return value + pending_hits(counter_id)
+
+
+def flush_due_hits_quietly():
+    """Flush due buffered hits without failing the request being served.
+
+    A failed flush, or one the open circuit breaker refuses, leaves the hits
+    buffered for a later request.
+    """
+    try:
+        guarded(flush_due_hits)
+    except Exception as e:
+        logger.warning('Could not flush buffered hits: %s', e)
+
+
+def flush_due_hits():
+    """Flush every counter whose oldest buffered hit is COUNTER_CACHE_TTL old."""
+    now = _read_cache.clock()
+    for counter_id, (_, since) in list(_pending_hits.items()):
+        if now - since >= CACHE_TTL:
+            flush_hits(counter_id)
+
+
+def buffer_hit(counter_id, visitor=None):
+    """Count a hit in memory and flush the counter's hits when they are due.
+
+    Returns the value to display: the cached counter value plus the hits
+    not written yet. `visitor` is the visit the hit claimed, if any.
+    """
+    now = _read_cache.clock()
+    with _pending_lock:
+        hits, since = _pending_hits.get(counter_id, (0, now))
+        _pending_hits[counter_id] = (hits + 1, since)
+
+    cached = _read_cache.get(counter_id)
+    if cached is None or hits + 1 >= FLUSH_THRESHOLD or now - since >= CACHE_TTL:
+        return flush_hits(counter_id, visitor)
+    return cached + hits + 1
+
+
+def add_hits(counter_id, hits=1):
+    """Add `hits` to the counter, or to a random shard of it, with one write."""
+    if history_table is not None:
+        return add_to_counter_and_history(counter_id, counter_id, hits)
+
+    if COUNTER_SHARDS <= 1:
+        return add_to_counter(counter_id, hits)
+
+    return add_to_counter(write_shard_key(counter_id), hits)
+
+
+def write_counter_hits(hits_by_counter, committed=None):
+    """Add hits to several counters with TransactWriteItems.
+
+    A transaction holds at most TRANSACT_MAX_ITEMS updates, so a large set of
+    counters is split over several transactions, each atomic on its own. The
+    IDs of counters whose transaction went through are added to `committed`,
+    so a caller can tell which hits stuck when a later transaction fails.
+    """
+    counter_ids = sorted(hits_by_counter)
+    updates = []
+    for counter_id in counter_ids:
+        key = counter_id
+        if COUNTER_SHARDS > 1:
+            key = write_shard_key(counter_id)
+        updates.append(counter_updates(key, counter_id, hits_by_counter[counter_id]))
+
+    per_transaction = max(1, TRANSACT_MAX_ITEMS // len(updates[0]))
+    for start in range(0, len(updates), per_transaction):
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            item for update in updates[start:start + per_transaction] for item in update
+        ])
+        if committed is not None:
+            committed.update(counter_ids[start:start + per_transaction])
+
+
+def remember_visitor(key):
+    with _seen_visitors_lock:
+        _seen_visitors[key] = True
+        _seen_visitors.move_to_end(key)
+        while len(_seen_visitors) > VISITOR_CACHE_SIZE:
+            _seen_visitors.popitem(last=False)
+
+
+def claim_visit(key):
+    """Record a visitor's first visit. Returns False for a repeat visit."""
+    if key in _seen_visitors:
+        return False
+
+    try:
+        table.put_item(
+            Item={'id': key, 'expires_at': int(time.time()) + VISITOR_TTL_SECONDS},
+            ConditionExpression='attribute_not_exists(id)'
+        )
+        claimed = True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        claimed = False
+
+    remember_visitor(key)
+    return claimed
+
+
+def release_visit(key):
+    """Forget a claimed visit whose hit could not be counted, so a retry counts it."""
+    with _seen_visitors_lock:
+        _seen_visitors.pop(key, None)
+    table.delete_item(Key={'id': key})
+
+
+def increment_counter(counter_id, event=None):
+    """Count one hit and return the counter value to display.
+
+    In unique-visitor mode a repeat visit isn't counted again and only reads
+    the counter.
+    """
+    visitor = None
+    if UNIQUE_VISITORS:
+        visitor = visitor_key(event or {}, counter_id)
+        if not claim_visit(visitor):
+            return read_counter(counter_id)
+
+    if BUFFER_HITS:
+        return buffer_hit(counter_id, visitor)
+
+    try:
+        updated_counter = add_hits(counter_id)
+    except Exception:
+        if visitor is not None:
+            release_visit(visitor)
+        raise
+
+    if COUNTER_SHARDS <= 1:
+        _read_cache.put(counter_id, updated_counter)
+        return updated_counter
+
+    return cached_sharded_total(counter_id, COUNTER_SHARDS, added=1)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def query_parameter(event, name, default=None):
+    return (event.get('queryStringParameters') or {}).get(name) or default
+
+
+def encode_page_token(last_key):
+    return base64.urlsafe_b64encode(json.dumps(last_key).encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(token, series):
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except ValueError:
+        raise BadRequest('Invalid next_token')
+    if not isinstance(last_key, dict) or last_key.get('series') != series:
+        raise BadRequest('Invalid next_token')
+    return {'series': series, 'bucket': str(last_key.get('bucket'))}
+
+
+def read_history(counter_id, event, now=None):
+    """One page of the counter's time buckets in a range, oldest first.
+
+    Query parameters: granularity (hour or day), from and to (bucket starts,
+    inclusive, in the granularity's format), limit and next_token. Only a
+    Query on the series is issued, never a Scan.
+    """
+    granularity = query_parameter(event, 'granularity', 'hour')
+    if granularity not in HISTORY_GRANULARITIES:
+        raise BadRequest(f'granularity must be one of {", ".join(HISTORY_GRANULARITIES)}')
+    fmt, seconds, default_buckets = HISTORY_GRANULARITIES[granularity]
+
+    now = time.time() if now is None else now
+    end = query_parameter(event, 'to', time.strftime(fmt, time.gmtime(now)))
+    start = query_parameter(event, 'from',
+        time.strftime(fmt, time.gmtime(now - (default_buckets - 1) * seconds))
+    )
+    for value in (start, end):
+        # Buckets are compared as strings, so only the zero-padded form matches
+        try:
+            canonical = time.strftime(fmt, time.strptime(value, fmt))
+        except ValueError:
+            canonical = None
+        if canonical != value:
+            raise BadRequest(f'from and to must be formatted as {fmt}')
+    if start > end:
+        raise BadRequest('from must not be after to')
+
+    try:
+        limit = int(query_parameter(event, 'limit', default_buckets))
+    except ValueError:
+        raise BadRequest('limit must be a number')
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise BadRequest(f'limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}')
+
+    series = f'{counter_id}#{granularity}'
+    query = {
+        'KeyConditionExpression': '#series = :series AND #bucket BETWEEN :start AND :end',
+        'ExpressionAttributeNames': {
+            '#series': 'series', '#bucket': 'bucket', '#counter': 'counter',
+        },
+        'ExpressionAttributeValues': {':series': series, ':start': start, ':end': end},
+        'ProjectionExpression': '#bucket, #counter',
+        'Limit': limit,
+    }
+    token = query_parameter(event, 'next_token')
+    if token:
+        query['ExclusiveStartKey'] = decode_page_token(token, series)
+
+    response = history_table.query(**query)
+
+    page = {
+        'granularity': granularity,
+        'from': start,
+        'to': end,
+        'buckets': [{'bucket': item['bucket'], 'hits': int(item['counter'])}
+                    for item in response['Items']],
+        'next_token': None,
+    }
+    if 'LastEvaluatedKey' in response:
+        page['next_token'] = encode_page_token(response['LastEvaluatedKey'])
+    return page
+
+
+def increment_counters(counter_ids, event=None):
+    """Count a hit on each counter and return their values by counter ID."""
+    visitors = {}
+    if UNIQUE_VISITORS:
+        for counter_id in counter_ids:
+            visitor = visitor_key(event or {}, counter_id)
+            if claim_visit(visitor):
+                visitors[counter_id] = visitor
+        counted = list(visitors)
+    else:
+        counted = counter_ids
+
+    if counted:
+        committed = set()
+        try:
+            write_counter_hits(dict.fromkeys(counted, 1), committed)
+        except Exception:
+            # Hits in transactions that went through are counted, so only
+            # the visits to the other counters are released
+            for counter_id, visitor in visitors.items():
+                if counter_id not in committed:
+                    release_visit(visitor)
+            raise
+
+    return read_counters(counter_ids, consistent=bool(counted))
+
+
+def parse_counter_id_list(value):
+    """Sorted, distinct counter IDs from a comma separated list."""
+    if len(value) > MAX_BATCH_COUNTERS * len(str(MAX_COUNTER_ID) + ','):
+        raise BadRequest(f'At most {MAX_BATCH_COUNTERS} counters per request')
+
+    try:
+        counter_ids = sorted({int(part) for part in value.split(',') if part.strip()})
+    except ValueError:
+        raise BadRequest('ids must be a comma separated list of counter IDs')
+
+    if not counter_ids:
+        raise BadRequest('ids must name at least one counter')
+    if len(counter_ids) > MAX_BATCH_COUNTERS:
+        raise BadRequest(f'At most {MAX_BATCH_COUNTERS} counters per request')
+    if counter_ids[0] < 1 or counter_ids[-1] > MAX_COUNTER_ID:
+        raise BadRequest(f'Counter IDs must be between 1 and {MAX_COUNTER_ID}')
+    return counter_ids
+
+
+def parse_counter_ids(event):
+    """Counter IDs named by ?ids=, or None for the single default counter."""
+    value = query_parameter(event, 'ids')
+    if value is None:
+        return None
+    return parse_counter_id_list(value)
+
+
+def counter_values(values):
+    return {str(counter_id): f'{value}' for counter_id, value in values.items()}
+
+
+def request_method(event):
+    """HTTP method of a REST API (payload 1.0) or HTTP API (payload 2.0) event."""
+    if event.get('version') == '2.0':
+        return ((event.get('requestContext') or {}).get('http') or {}).get('method')
+    return event.get('httpMethod')
+
+
+def request_route(event):
+    """Path of the API resource or route the event was sent to."""
+    if event.get('version') == '2.0':
+        return (event.get('routeKey') or '').partition(' ')[2] or event.get('rawPath')
+    return event.get('resource')
+
+
+def is_history_request(event):
+    return (history_table is not None
+            and request_method(event) == 'GET'
+            and request_route(event) == '/counter/history')
+
+
+def is_read_request(event):
+    return (SPLIT_ENDPOINTS
+            and request_method(event) == 'GET'
+            and request_route(event) == '/counter')
+
+
+class Forbidden(Exception):
+    pass
+
+
+def origin_secret():
+    """The shared origin secret, fetched from Secrets Manager on first use."""
+    global _origin_secret
+
+    if _origin_secret is None:
+        try:
+            secrets_manager = boto3.client('secretsmanager', region_name=REGION)
+            _origin_secret = secrets_manager.get_secret_value(
+                SecretId=ORIGIN_SECRET_ID
+            )['SecretString']
+        except Exception as e:
+            # Never let a failed lookup fall through to the degraded mode
+            raise RuntimeError(f'Could not load the origin secret: {e}') from e
+    return _origin_secret
+
+
+def check_origin(event):
+    """Reject requests that didn't come through CloudFront."""
+    if not ORIGIN_SECRET_ID:
+        return
+    presented = request_header(event, ORIGIN_SECRET_HEADER) or ''
+    if not hmac.compare_digest(presented.encode('utf-8'), origin_secret().encode('utf-8')):
+        raise Forbidden('Forbidden')
+
+
+def request_header(event, name):
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def visitor_address(event):
+    # Behind CloudFront the source IP is the edge. CloudFront appends the
+    # viewer's address to X-Forwarded-For, after whatever the viewer sent
+    # itself, so only entries from the right can be trusted. The
+    # edge-optimized REST API's own distribution then appends ours, which
+    # puts the viewer second from the right.
+    forwarded = request_header(event, 'x-forwarded-for')
+    addresses = [address.strip() for address in (forwarded or '').split(',') if address.strip()]
+    if addresses:
+        position = 1 if event.get('version') == '2.0' else 2
+        return addresses[-min(position, len(addresses))]
+    request_context = event.get('requestContext') or {}
+    if event.get('version') == '2.0':
+        return (request_context.get('http') or {}).get('sourceIp') or ''
+    identity = request_context.get('identity') or {}
+    return identity.get('sourceIp') or ''
+
+
+def visitor_key(event, counter_id=COUNTER_ID, now=None):
+    """Numeric dedup key for the visitor behind `event` on a counter on the
+    current UTC day."""
+    day = time.strftime('%Y-%m-%d', time.gmtime(now))
+    visitor = '|'.join((str(counter_id), visitor_address(event),
+                        request_header(event, 'user-agent') or '', day))
+    digest = hashlib.sha256(visitor.encode('utf-8')).hexdigest()
+    # 96 bits of the hash keep the key within DynamoDB's 38 digit numbers
+    return VISITOR_KEY_OFFSET + int(digest[:24], 16)
+
+
+def success_response(data, cache_control, stale=False):
+    # A single counter value is sent as a string, as the page has always read it
+    if not isinstance(data, (dict, list)):
+        data = f'{data}'
+    body = {'message': 'Success', 'data': data}
+    if stale:
+        body['stale'] = True
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body),
+        'headers': {
+            'Content-Type': 'application/json',
+            'Cache-Control': cache_control,
+        }
+    }
+
+
+def cacheable_response(data, event, max_age=None):
+    """Build a read response that CloudFront and browsers may cache and revalidate."""
+    max_age = READ_MAX_AGE if max_age is None else max_age
+    response = success_response(data, f'public, max-age={max_age}')
+    etag = '"' + hashlib.sha1(response['body'].encode('utf-8')).hexdigest()[:16] + '"'
+    response['headers']['ETag'] = etag
+
+    if request_header(event, 'if-none-match') == etag:
+        response['statusCode'] = 304
+        response['body'] = ''
+
+    return response
+
+
+def degraded_response(operation, counter_ids):
+    """Serve the last known values, marked stale, while DynamoDB is unavailable.
+
+    A hit served this way is not counted. Without a recent enough value the
+    response is a 503 asking the client to retry after the breaker cooldown.
+    """
+    values = None
+    if operation != 'history':
+        values = last_known_values(counter_ids or [COUNTER_ID])
+
+    if values is None:
+        return {
+            'statusCode': 503,
+            'headers': {'Retry-After': str(int(BREAKER_COOLDOWN_SECONDS))},
+            'body': json.dumps({'message': 'The counter is temporarily unavailable'})
+        }
+
+    data = counter_values(values) if counter_ids is not None else values[COUNTER_ID]
+    return success_response(data, 'no-store', stale=True)
+
+
+def lambda_handler(event, context):
+
+    started = start_invocation()
+    if is_history_request(event):
+        operation = 'history'
+    elif is_read_request(event):
+        operation = 'read'
+    else:
+        operation = 'hit'
+    failure = None
+    degraded = False
+    counter_ids = None
+
+    try:
+        check_origin(event)
+
+        if _pending_hits:
+            flush_due_hits_quietly()
+
+        if operation == 'history':
+            return cacheable_response(guarded(read_history, COUNTER_ID, event),
+                                      event, HISTORY_MAX_AGE)
+
+        counter_ids = parse_counter_ids(event)
+        if counter_ids is not None:
+            if operation == 'read':
+                values = guarded(read_counters, counter_ids)
+            else:
+                values = guarded(increment_counters, counter_ids, event)
+            remember_values(values)
+
+            if operation == 'read':
+                return cacheable_response(counter_values(values), event)
+            return success_response(counter_values(values), 'no-store')
+
+        if operation == 'read':
+            # A cached value needs no DynamoDB call, even with the breaker open
+            counter = cached_counter(COUNTER_ID)
+            if counter is None:
+                counter = guarded(read_stored_counter, COUNTER_ID)
+            remember_values({COUNTER_ID: counter})
+            return cacheable_response(counter, event)
+
+        updated_counter = guarded(increment_counter, COUNTER_ID, event)
+        remember_values({COUNTER_ID: updated_counter})
+
+        if should_log_request():
+            logger.info('The counter value is now %s', updated_counter)
+
+        return success_response(updated_counter, 'no-store')
+
+    except BadRequest as e:
+
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
+
+    except Forbidden as e:
+
+        failure = e
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'message': str(e)})
+        }
+
     except Exception as e:
-        
-        print(f"Error details: {e}")
+
+        failure = e
+
+        if is_transient_error(e):
+            degraded = True
+            logger.warning('DynamoDB is unavailable, serving the last known value: %s', e)
+            return degraded_response(operation, counter_ids)
+
+        logger.error('Error details: %s', e)
 
         return {
             'statusCode': 500,
             'body': f'Error details: {e}'
         }
+
+    finally:
+        emit_metrics(operation, (time.perf_counter() - started) * 1000, failure, context,
+                     degraded)
+
+
+def queued_counter_ids(record):
+    """Counter IDs a queued hit was sent for, from its `ids` message attribute."""
+    attribute = (record.get('messageAttributes') or {}).get('ids') or {}
+    value = attribute.get('stringValue')
+    return parse_counter_id_list(value) if value else [COUNTER_ID]
+
+
+def queue_handler(event, context):
+    """Count a batch of hits queued by API Gateway with a single ADD.
+
+    Hits queued for several counters are added per counter with
+    TransactWriteItems. Any error fails the whole batch, so SQS redelivers it
+    and no hit is lost.
+    """
+    started = start_invocation()
+    records = event.get('Records', [])
+    hits = len(records)
+    failure = None
+
+    try:
+        hits_by_counter = Counter()
+        for record in records:
+            try:
+                hits_by_counter.update(queued_counter_ids(record))
+            except BadRequest as e:
+                # Redelivering a malformed hit can never succeed
+                logger.warning('Dropping queued hit %s: %s', record.get('messageId'), e)
+
+        if list(hits_by_counter) == [COUNTER_ID]:
+            add_hits(COUNTER_ID, hits_by_counter[COUNTER_ID])
+        elif hits_by_counter:
+            write_counter_hits(hits_by_counter)
+
+        if hits and should_log_request():
+            logger.info('Added %s queued hits to the counter', hits)
+
+    except Exception as e:
+        failure = e
+        raise
+
+    finally:
+        emit_metrics('queue', (time.perf_counter() - started) * 1000, failure, context)
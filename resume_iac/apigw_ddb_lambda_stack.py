@@ -1,14 +1,25 @@
 import hashlib
+import os
 import secrets
 from aws_cdk import (
+    Duration,
     Stack,
     CfnOutput,
     RemovalPolicy,
+    Token,
+    aws_certificatemanager as acm,
     aws_logs as logs,
     aws_apigateway as apigateway,
+    aws_apigatewayv2 as apigatewayv2,
+    aws_apigatewayv2_integrations as apigatewayv2_integrations,
     aws_dynamodb as dynamodb,
     aws_iam as iam,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as event_sources,
+    aws_route53 as route53,
+    aws_route53_targets as targets,
+    aws_secretsmanager as secretsmanager,
+    aws_sqs as sqs,
 )
 from aws_cdk.custom_resources import (
     AwsCustomResource,
@@ -19,16 +30,256 @@ from aws_cdk.custom_resources import (
 from aws_cdk.aws_apigateway import IApiKey
 from constructs import Construct
 
-with open("./templates/get_counter_template.txt", "r", encoding="utf-8") as f:
-    get_counter_template= f.read()
+from resume_iac.lambda_bundling import (
+    check_package_size,
+    dependency_layer,
+    function_code,
+)
+from resume_iac import lookups
+from resume_iac.paths import project_path, read_template
+from resume_iac.profiles import LAMBDA_PROFILES, TABLE_PROFILES
+
+# How the /counter resource reaches the table:
+#   "lambda" - through the counter Lambda (LambdaIntegration)
+#   "direct" - API Gateway calls DynamoDB UpdateItem itself (AwsIntegration),
+#              so no Lambda runs on the request path
+#   "queue"  - API Gateway enqueues hits to SQS and returns right away; a
+#              consumer Lambda adds each batch of hits with a single write
+COUNTER_INTEGRATIONS = ("lambda", "direct", "queue")
+
+# What fronts the counter:
+#   "rest" - edge-optimized REST API; CloudFront sends the usage plan API key
+#   "http" - regional HTTP API with a payload format 2.0 Lambda integration;
+#            CloudFront sends a generated secret the handler checks
+COUNTER_API_TYPES = ("rest", "http")
+
+# How the counter API knows a request came through CloudFront:
+#   "api-key" - the usage plan API key, read back at deploy time by a
+#               custom resource; only the rest api_type has one
+#   "secret"  - a generated Secrets Manager secret the counter Lambda checks
+ORIGIN_AUTH_TYPES = ("api-key", "secret")
+
+# Header CloudFront puts the origin secret in
+ORIGIN_SECRET_HEADER = "x-origin-secret"
+
+# A secret replicated to every counter region has to be found by name
+ORIGIN_SECRET_NAME = "counter-api-origin-secret"
+
+# Steps that hand an existing single-region counter-table over to the global
+# table counter_regions creates, one deployment each:
+#   "retain" - keep the table if it ever leaves the stack
+#   "detach" - remove it from the stack; the functions use it by name
+#   "import" - add it back as the global table, for `cdk import` to adopt
+COUNTER_TABLE_MIGRATIONS = ("retain", "detach", "import")
+
+# counter.<domain> resolves to the closest regional counter API
+COUNTER_SUBDOMAIN = "counter"
+
+COUNTER_LAMBDA_SOURCE = project_path("lambdas", "counter_lambda")
+
+# Third-party packages the counter functions need, if any. They are shipped
+# in a shared layer rather than in each function package.
+COUNTER_LAMBDA_REQUIREMENTS = project_path("lambdas", "counter_lambda", "requirements.txt")
+
+# Stage and usage plan throttle as (rate limit, burst limit) per integration.
+# The queue accepts hits without touching the table, so it can absorb spikes
+# the synchronous integrations would have to reject.
+COUNTER_THROTTLES = {
+    "lambda": (10, 2),
+    "direct": (10, 2),
+    "queue": (100, 200),
+}
+
+# Largest number of queued hits the consumer folds into one write, and how
+# long it waits to fill a batch
+QUEUE_BATCH_SIZE = 100
+QUEUE_BATCH_WINDOW = Duration.seconds(5)
+
+# How long browsers and CloudFront may serve a counter read when the read
+# and increment endpoints are split
+COUNTER_READ_MAX_AGE = Duration.seconds(5)
+
+# Most counters one request may read or count with ?ids=1,2,3
+COUNTER_MAX_BATCH_SIZE = 50
+
+# Most counter values a warm counter Lambda keeps in memory
+COUNTER_CACHE_SIZE = 1000
+
+# How long browsers and CloudFront may serve a page of counter history
+COUNTER_HISTORY_MAX_AGE = Duration.seconds(60)
+
+# Lambda's own timeout for profiles that don't set one
+LAMBDA_DEFAULT_TIMEOUT = Duration.seconds(3)
 
 class ApiDdbLambdaStack(Stack):
 
     def __init__(self, 
                 scope: Construct, id: str, 
+                counter_shards: int = 1,
+                counter_integration: str = "lambda",
+                split_counter_endpoints: bool = False,
+                tracing: bool = False,
+                log_level: str = "INFO",
+                performance_profile: str = None,
+                table_profile: str = None,
+                unique_visitors: bool = False,
+                counter_history: bool = False,
+                lambda_cache_ttl: Duration = None,
+                hit_flush_threshold: int = 0,
+                api_type: str = None,
+                origin_auth: str = None,
+                counter_regions: list = None,
+                counter_table_migration: str = None,
+                domain_name: str = None,
                 **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
+        # The profile can also be picked per deployment with
+        # `cdk deploy -c performance_profile=low-latency`
+        performance_profile = (performance_profile
+            or self.node.try_get_context("performance_profile")
+            or "default")
+
+        if performance_profile not in LAMBDA_PROFILES:
+            raise ValueError(
+                f"performance_profile must be one of {tuple(LAMBDA_PROFILES)}"
+            )
+
+        # And the tables' with `cdk deploy -c table_profile=production`
+        table_profile = (table_profile
+            or self.node.try_get_context("table_profile")
+            or "default")
+
+        if table_profile not in TABLE_PROFILES:
+            raise ValueError(f"table_profile must be one of {tuple(TABLE_PROFILES)}")
+
+        # Or `cdk deploy -c counter_api_type=http`
+        api_type = (api_type
+            or self.node.try_get_context("counter_api_type")
+            or "rest")
+
+        # Or `cdk deploy -c counter_origin_auth=secret`
+        origin_auth = (origin_auth
+            or self.node.try_get_context("counter_origin_auth")
+            or ("secret" if api_type == "http" else "api-key"))
+
+        # Settings shared by every function in the stack
+        self._tracing = tracing
+        self._log_level = log_level
+        self._lambda_profile = LAMBDA_PROFILES[performance_profile]
+        self._table_profile = TABLE_PROFILES[table_profile]
+        self._unique_visitors = unique_visitors
+        self._history_table = None
+        self._lambda_cache_ttl = lambda_cache_ttl
+        self._hit_flush_threshold = hit_flush_threshold
+        self._counter_code = None
+        self._counter_layers = None
+        self._origin_secret = None
+        self._origin_secret_id = None
+        self._origin_auth = origin_auth
+        self._shard_range = None
+        self._counter_regions = list(counter_regions or [])
+        self._domain_name = domain_name
+        self.counter_domain_name = None
+
+        # Set by whichever kind of API is built
+        self.rest_api = self.api_key = self.api_key_value = None
+        self.http_api = self.origin_secret = None
+
+        if counter_shards < 1:
+            raise ValueError("counter_shards must be at least 1")
+
+        if counter_integration not in COUNTER_INTEGRATIONS:
+            raise ValueError(
+                f"counter_integration must be one of {COUNTER_INTEGRATIONS}"
+            )
+
+        if api_type not in COUNTER_API_TYPES:
+            raise ValueError(f"api_type must be one of {COUNTER_API_TYPES}")
+
+        if api_type == "http" and counter_integration != "lambda":
+            # HTTP APIs have no mapping templates for the direct and queue
+            # integrations to build their requests with
+            raise ValueError("the http api_type requires the lambda integration")
+
+        if origin_auth not in ORIGIN_AUTH_TYPES:
+            raise ValueError(f"origin_auth must be one of {ORIGIN_AUTH_TYPES}")
+
+        if api_type == "http" and origin_auth != "secret":
+            raise ValueError("the http api_type requires the secret origin_auth")
+
+        if origin_auth == "secret" and counter_integration != "lambda":
+            # Only the counter Lambda can check the secret; the direct and
+            # queue integrations would let anyone count
+            raise ValueError("the secret origin_auth requires the lambda integration")
+
+        if domain_name and api_type != "http":
+            raise ValueError("domain_name requires the http api_type")
+
+        if self._counter_regions:
+            # Each region is its own stack; the first creates the global table
+            if Token.is_unresolved(self.region):
+                raise ValueError("counter_regions needs a stack env with an explicit region")
+            if self.region not in self._counter_regions:
+                raise ValueError(f"{self.region} is not one of the counter_regions")
+            if api_type != "http" or not domain_name:
+                # Latency routing needs a regional API behind a custom domain
+                raise ValueError("counter_regions requires the http api_type and a domain_name")
+            if counter_history:
+                raise ValueError("counter_history does not support counter_regions")
+
+        if counter_integration == "direct" and counter_shards > 1:
+            raise ValueError("the direct integration does not support sharded counters")
+
+        if counter_integration == "queue" and not split_counter_endpoints:
+            # A queued hit has no value to return, so the page reads it separately
+            raise ValueError("the queue integration requires split_counter_endpoints")
+
+        if unique_visitors and counter_integration != "lambda":
+            # Only the counter Lambda sees who is visiting
+            raise ValueError("unique_visitors requires the lambda integration")
+
+        if hit_flush_threshold < 0:
+            raise ValueError("hit_flush_threshold must not be negative")
+
+        if hit_flush_threshold and lambda_cache_ttl is None:
+            # Buffered hits are flushed at the latest when the cache expires
+            raise ValueError("hit_flush_threshold requires lambda_cache_ttl")
+
+        if hit_flush_threshold and counter_integration != "lambda":
+            raise ValueError("hit_flush_threshold requires the lambda integration")
+
+        # Or `cdk deploy -c counter_table_migration=retain`
+        counter_table_migration = (counter_table_migration
+            or self.node.try_get_context("counter_table_migration"))
+
+        if counter_table_migration is not None:
+            if counter_table_migration not in COUNTER_TABLE_MIGRATIONS:
+                raise ValueError(
+                    f"counter_table_migration must be one of {COUNTER_TABLE_MIGRATIONS}"
+                )
+            if self._counter_regions:
+                # Replicas are added once the table is a single-region global table
+                raise ValueError("counter_table_migration does not support counter_regions")
+
+        if counter_history and counter_integration == "direct":
+            raise ValueError("the direct integration does not support counter_history")
+
+        if counter_history and counter_shards > 1:
+            # Every hit writes the same hour and day buckets, which would
+            # bring back the single hot key sharding spreads out
+            raise ValueError("counter_history does not support sharded counters")
+
+        rate_limit, burst_limit = COUNTER_THROTTLES[counter_integration]
+
+        if self._counter_regions:
+            # Replicas keep the last of two concurrent writes to an item, so
+            # every region adds hits to its own range of shards only and
+            # reads sum the shards of all regions
+            region_index = self._counter_regions.index(self.region)
+            self._shard_range = (counter_shards, region_index * counter_shards)
+            counter_shards *= len(self._counter_regions)
+
         # Create DynamoDB table
 
         part_key = dynamodb.Attribute(
@@ -36,53 +287,172 @@ class ApiDdbLambdaStack(Stack):
             type=dynamodb.AttributeType.NUMBER
         )
 
-        ddb_table = dynamodb.Table(self, "CounterTable",
-            table_name="counter-table",
-            partition_key=part_key,
-            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
-            removal_policy=RemovalPolicy.DESTROY
-        )
+        if counter_table_migration in ("detach", "import"):
+            # Left in place by the retain step
+            ddb_table = dynamodb.TableV2.from_table_name(self, "CounterTable",
+                "counter-table"
+            )
+            if counter_table_migration == "import":
+                # The same resource counter_regions creates, so adding them
+                # later only adds replicas. Nothing refers to it yet: an
+                # import may not change any other resource.
+                self._profiled_global_table("CounterGlobalTable",
+                    table_name="counter-table",
+                    partition_key=part_key,
+                    time_to_live_attribute="expires_at",
+                    removal_policy=RemovalPolicy.RETAIN
+                )
+        elif not self._counter_regions:
+            ddb_table = self._profiled_table("CounterTable",
+                table_name="counter-table",
+                partition_key=part_key,
+                # Unique-visitor dedup items expire on their own
+                time_to_live_attribute="expires_at",
+                removal_policy=(RemovalPolicy.RETAIN if counter_table_migration == "retain"
+                                else None)
+            )
+        elif self.region == self._counter_regions[0]:
+            # A global table with a replica in every other counter region
+            ddb_table = self._profiled_global_table("CounterGlobalTable",
+                table_name="counter-table",
+                partition_key=part_key,
+                time_to_live_attribute="expires_at",
+                replicas=[
+                    dynamodb.ReplicaTableProps(region=region)
+                    for region in self._counter_regions[1:]
+                ]
+            )
+        else:
+            # The replica the first region's stack created here
+            ddb_table = dynamodb.TableV2.from_table_name(self, "CounterTable",
+                "counter-table"
+            )
 
-        lambda_basic_exec_policy = iam.ManagedPolicy.from_aws_managed_policy_name(
-            'service-role/AWSLambdaBasicExecutionRole'
-        )
+        if counter_history:
+            # Hourly and daily rollups of the counter, keyed by series
+            # ("<counter id>#hour") and bucket start, so a time range is a
+            # single Query
+            self._history_table = self._profiled_table("CounterHistoryTable",
+                partition_key=dynamodb.Attribute(
+                    name="series",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="bucket",
+                    type=dynamodb.AttributeType.STRING
+                )
+            )
 
-        lambda_role = iam.Role(self,'CounterLambdaRole',
-            assumed_by=iam.ServicePrincipal('lambda.amazonaws.com'),
-            managed_policies=[lambda_basic_exec_policy]
-        )
+        if api_type == "http":
+            self._http_counter_api(ddb_table,
+                counter_shards,
+                split_counter_endpoints,
+                counter_history,
+                rate_limit,
+                burst_limit
+            )
+        else:
+            self._rest_counter_api(ddb_table,
+                counter_integration,
+                counter_shards,
+                split_counter_endpoints,
+                counter_history,
+                rate_limit,
+                burst_limit
+            )
 
-        # Create a Lambda function to put records in the DynamoDB table
-        counter_lambda = _lambda.Function(self, 'CounterLambda',
-            runtime=_lambda.Runtime.PYTHON_3_9,
-            handler='index.lambda_handler',
-            code=_lambda.Code.from_asset('./lambdas/counter_lambda'),
-            role=lambda_role,
-            # reserved_concurrent_executions=11,
-            environment={
-                'COUNTER_TABLE_NAME': ddb_table.table_name,
-                'LOG_LEVEL': 'INFO'
-            }
-        )
+    def _profiled_table(self, id: str,
+                removal_policy: RemovalPolicy = None,
+                **kwargs) -> dynamodb.Table:
+        """A table with the capacity and protection of the table profile;
+        removal_policy overrides the profile's."""
+        profile = self._table_profile
 
-        # Define the IAM policy statement
-        table_policy_statement = iam.PolicyStatement(
-            actions=['dynamodb:GetItem', 'dynamodb:UpdateItem'],
-            resources=[ddb_table.table_arn],
+        if profile.provisioned:
+            capacity = dict(billing_mode=dynamodb.BillingMode.PROVISIONED,
+                read_capacity=profile.min_read_capacity,
+                write_capacity=profile.min_write_capacity
+            )
+        else:
+            capacity = dict(billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST)
+
+        # Settings the profile leaves off stay out of the template
+        table = dynamodb.Table(self, id,
+            table_class=profile.table_class,
+            contributor_insights_enabled=profile.contributor_insights or None,
+            deletion_protection=profile.deletion_protection or None,
+            point_in_time_recovery=profile.point_in_time_recovery or None,
+            removal_policy=removal_policy or profile.removal_policy,
+            **capacity,
+            **kwargs
         )
-        
-        # Attach the policy statement to the Lambda function's execution role
-        counter_lambda.add_to_role_policy(table_policy_statement)
 
-        logs.LogGroup(self, 'CounterLambdaLogGroup',
-            log_group_name=f'/aws/lambda/{counter_lambda.function_name}',
-            retention=logs.RetentionDays.ONE_DAY
+        if profile.provisioned:
+            table.auto_scale_read_capacity(
+                min_capacity=profile.min_read_capacity,
+                max_capacity=profile.max_read_capacity
+            ).scale_on_utilization(target_utilization_percent=profile.utilization_target)
+
+            table.auto_scale_write_capacity(
+                min_capacity=profile.min_write_capacity,
+                max_capacity=profile.max_write_capacity
+            ).scale_on_utilization(target_utilization_percent=profile.utilization_target)
+
+        return table
+
+    def _profiled_global_table(self, id: str,
+                removal_policy: RemovalPolicy = None,
+                **kwargs) -> dynamodb.TableV2:
+        """A global table with the table profile, in every replica;
+        removal_policy overrides the profile's."""
+        profile = self._table_profile
+
+        billing = dynamodb.Billing.on_demand()
+        if profile.provisioned:
+            # Global tables scale writes in every replica together
+            billing = dynamodb.Billing.provisioned(
+                read_capacity=dynamodb.Capacity.autoscaled(
+                    min_capacity=profile.min_read_capacity,
+                    max_capacity=profile.max_read_capacity,
+                    target_utilization_percent=profile.utilization_target
+                ),
+                write_capacity=dynamodb.Capacity.autoscaled(
+                    min_capacity=profile.min_write_capacity,
+                    max_capacity=profile.max_write_capacity,
+                    target_utilization_percent=profile.utilization_target
+                )
+            )
+
+        return dynamodb.TableV2(self, id,
+            billing=billing,
+            table_class=profile.table_class,
+            contributor_insights=profile.contributor_insights or None,
+            deletion_protection=profile.deletion_protection or None,
+            point_in_time_recovery=profile.point_in_time_recovery or None,
+            removal_policy=removal_policy or profile.removal_policy,
+            **kwargs
         )
 
+    def _rest_counter_api(self,
+                ddb_table: dynamodb.Table,
+                counter_integration: str,
+                counter_shards: int,
+                split_counter_endpoints: bool,
+                counter_history: bool,
+                rate_limit: int,
+                burst_limit: int) -> None:
+        """Edge-optimized REST API, called by CloudFront with a usage plan API key
+        or, with the secret origin_auth, a secret origin header."""
+
+        api_key_required = self._origin_auth == "api-key"
+        if not api_key_required:
+            self._create_origin_secret()
+
         # Create API Gateway REST API
         stage_options = apigateway.StageOptions(
-            throttling_rate_limit=10,
-            throttling_burst_limit=2
+            throttling_rate_limit=rate_limit,
+            throttling_burst_limit=burst_limit,
+            tracing_enabled=self._tracing
         )
 
         self.rest_api = apigateway.RestApi(self, "RestApi",
@@ -92,18 +462,105 @@ class ApiDdbLambdaStack(Stack):
             endpoint_types=[apigateway.EndpointType.EDGE]
         )
 
-        # # Add POST method to the API
-        resource = self.rest_api.root.add_resource("counter")
+        counter_resource = self.rest_api.root.add_resource("counter")
+
+        read_method_responses = hit_method_responses = None
+
+        if counter_integration == "direct":
+            hit_integration = self._direct_counter_integration(ddb_table,
+                action="UpdateItem",
+                request_template=read_template("update_counter_template.txt"),
+                cache_control="no-store"
+            )
+            read_integration = None
+            if split_counter_endpoints:
+                read_integration = self._direct_counter_integration(ddb_table,
+                    action="GetItem",
+                    request_template=read_template("read_counter_template.txt"),
+                    cache_control=f"public, max-age={COUNTER_READ_MAX_AGE.to_seconds()}"
+                )
+            read_method_responses = hit_method_responses = [
+                apigateway.MethodResponse(status_code="200",
+                    response_parameters={"method.response.header.Cache-Control": True}
+                ),
+                apigateway.MethodResponse(status_code="500"),
+            ]
+        elif counter_integration == "queue":
+            counter_lambda = self._counter_lambda(ddb_table,
+                counter_shards,
+                split_counter_endpoints
+            )
+            lambda_integration = read_integration = apigateway.LambdaIntegration(counter_lambda)
+            hit_integration = self._queue_hit_integration(ddb_table, counter_shards)
+            hit_method_responses = [
+                apigateway.MethodResponse(status_code="202"),
+                apigateway.MethodResponse(status_code="500"),
+            ]
+        else:
+            counter_lambda = self._counter_lambda(ddb_table,
+                counter_shards,
+                split_counter_endpoints
+            )
+            lambda_integration = apigateway.LambdaIntegration(counter_lambda)
+            hit_integration = read_integration = lambda_integration
+
+        if split_counter_endpoints:
+            # GET /counter only reads the value and may be cached at the edge,
+            # POST /counter/hit counts the page view
+            read_method = counter_resource.add_method("GET",
+                read_integration,
+                operation_name="GetCounter",
+                api_key_required=api_key_required,
+                method_responses=read_method_responses
+            )
+
+            hit_method = counter_resource.add_resource("hit").add_method("POST",
+                hit_integration,
+                operation_name="HitCounter",
+                api_key_required=api_key_required,
+                method_responses=hit_method_responses
+            )
 
-        get_counter_method = resource.add_method("GET",
-            apigateway.LambdaIntegration(counter_lambda),
-            operation_name="GetCounter",
-            api_key_required=True,
+            counter_methods = [read_method, hit_method]
+            self.counter_read_max_age = COUNTER_READ_MAX_AGE
+        else:
+            get_counter_method = counter_resource.add_method("GET",
+                hit_integration,
+                operation_name="GetCounter",
+                api_key_required=api_key_required,
+                method_responses=hit_method_responses
+            )
+
+            counter_methods = [get_counter_method]
+            self.counter_read_max_age = None
+
+        if counter_history:
+            # GET /counter/history returns a page of hourly or daily rollups
+            history_method = counter_resource.add_resource("history").add_method("GET",
+                lambda_integration,
+                operation_name="GetCounterHistory",
+                api_key_required=api_key_required
+            )
+
+            counter_methods.append(history_method)
+            self.counter_history_max_age = COUNTER_HISTORY_MAX_AGE
+        else:
+            self.counter_history_max_age = None
+
+        # Output the API URL
+        CfnOutput(self, "ApiEndpoint",
+            value=self.rest_api.url,
+            description="API Endpoint"
         )
 
+        if not api_key_required:
+            # The stage throttles every method alike, and without a key no
+            # request is counted against a usage plan
+            return
+
         throttle_options = apigateway.ThrottleSettings(
-            rate_limit=10,
-            burst_limit=2
+            rate_limit=rate_limit,
+            burst_limit=burst_limit
         )
         
         plan = self.rest_api.add_usage_plan("CounterUsagePlan",
@@ -111,14 +568,14 @@ class ApiDdbLambdaStack(Stack):
             throttle=throttle_options
         )
 
-        throttle_method = apigateway.ThrottlingPerMethod(
-            method=get_counter_method,
-            throttle=throttle_options
-        )
+        throttle_methods = [
+            apigateway.ThrottlingPerMethod(method=method, throttle=throttle_options)
+            for method in counter_methods
+        ]
         
         plan.add_api_stage(
             stage=self.rest_api.deployment_stage,
-            throttle=[throttle_method]
+            throttle=throttle_methods
         )
 
         self.api_key = self.rest_api.add_api_key("CounterApiKey",
@@ -154,8 +611,443 @@ class ApiDdbLambdaStack(Stack):
         api_key_cr.node.add_dependency(self.api_key)
         self.api_key_value = api_key_cr.get_response_field("value")
 
-        # Output the API URL
+    def _create_origin_secret(self) -> None:
+        """The origin secret, generated at deploy time. The counter Lambda
+        rejects requests that don't carry it."""
+        if self._counter_regions and self.region != self._counter_regions[0]:
+            # Replicated here by the first region's stack
+            self._origin_secret = secretsmanager.Secret.from_secret_name_v2(self,
+                "OriginSecret",
+                ORIGIN_SECRET_NAME
+            )
+        else:
+            self._origin_secret = secretsmanager.Secret(self, "OriginSecret",
+                description="Header CloudFront sends to the counter API",
+                # Every region checks the one value CloudFront sends
+                secret_name=ORIGIN_SECRET_NAME if self._counter_regions else None,
+                replica_regions=[
+                    secretsmanager.ReplicaRegion(region=region)
+                    for region in self._counter_regions[1:]
+                ] or None,
+                generate_secret_string=secretsmanager.SecretStringGenerator(
+                    exclude_punctuation=True,
+                    password_length=32
+                ),
+                removal_policy=RemovalPolicy.DESTROY
+            )
+
+        self._origin_secret_id = (ORIGIN_SECRET_NAME if self._counter_regions
+                                  else self._origin_secret.secret_arn)
+        self.origin_secret = self._origin_secret
+
+    def _http_counter_api(self,
+                ddb_table: dynamodb.Table,
+                counter_shards: int,
+                split_counter_endpoints: bool,
+                counter_history: bool,
+                rate_limit: int,
+                burst_limit: int) -> None:
+        """Regional HTTP API, called by CloudFront with a secret origin header."""
+
+        self._create_origin_secret()
+
+        counter_lambda = self._counter_lambda(ddb_table,
+            counter_shards,
+            split_counter_endpoints
+        )
+
+        lambda_integration = apigatewayv2_integrations.HttpLambdaIntegration(
+            "CounterIntegration",
+            counter_lambda,
+            payload_format_version=apigatewayv2.PayloadFormatVersion.VERSION_2_0
+        )
+
+        self.http_api = apigatewayv2.HttpApi(self, "HttpApi",
+            api_name="CounterHttpApi",
+            description="HTTP API for Counter Lambda",
+            create_default_stage=False
+        )
+
+        domain_mapping = None
+        if self._domain_name:
+            domain_mapping = apigatewayv2.DomainMappingOptions(
+                domain_name=self._counter_api_domain()
+            )
+
+        self.http_api.add_stage("DefaultStage",
+            stage_name="$default",
+            auto_deploy=True,
+            throttle=apigatewayv2.ThrottleSettings(
+                rate_limit=rate_limit,
+                burst_limit=burst_limit
+            ),
+            domain_mapping=domain_mapping
+        )
+
+        self.http_api.add_routes(
+            path="/counter",
+            methods=[apigatewayv2.HttpMethod.GET],
+            integration=lambda_integration
+        )
+
+        if split_counter_endpoints:
+            self.http_api.add_routes(
+                path="/counter/hit",
+                methods=[apigatewayv2.HttpMethod.POST],
+                integration=lambda_integration
+            )
+            self.counter_read_max_age = COUNTER_READ_MAX_AGE
+        else:
+            self.counter_read_max_age = None
+
+        if counter_history:
+            self.http_api.add_routes(
+                path="/counter/history",
+                methods=[apigatewayv2.HttpMethod.GET],
+                integration=lambda_integration
+            )
+            self.counter_history_max_age = COUNTER_HISTORY_MAX_AGE
+        else:
+            self.counter_history_max_age = None
+
         CfnOutput(self, "ApiEndpoint",
-            value=self.rest_api.url,
+            value=self.http_api.api_endpoint,
             description="API Endpoint"
         )
+
+    def _counter_api_domain(self) -> apigatewayv2.DomainName:
+        """counter.<domain> for this region's HTTP API, in a latency record."""
+        self.counter_domain_name = f"{COUNTER_SUBDOMAIN}.{self._domain_name}"
+
+        hosted_zone = lookups.hosted_zone(self, "HostedZone", self._domain_name)
+
+        certificate = acm.Certificate(self, "CounterCertificate",
+            domain_name=self.counter_domain_name,
+            validation=acm.CertificateValidation.from_dns(hosted_zone=hosted_zone)
+        )
+
+        api_domain = apigatewayv2.DomainName(self, "CounterDomainName",
+            domain_name=self.counter_domain_name,
+            certificate=certificate
+        )
+
+        latency_routing = {}
+        if self._counter_regions:
+            # One record per region; Route 53 answers with the closest one
+            latency_routing = {"region": self.region, "set_identifier": self.region}
+
+        route53.ARecord(self, "CounterRecord",
+            zone=hosted_zone,
+            record_name=self.counter_domain_name,
+            target=route53.RecordTarget.from_alias(targets.ApiGatewayv2DomainProperties(
+                api_domain.regional_domain_name,
+                api_domain.regional_hosted_zone_id
+            )),
+            **latency_routing
+        )
+
+        return api_domain
+
+    def _function_tracing(self) -> _lambda.Tracing:
+        return _lambda.Tracing.ACTIVE if self._tracing else None
+
+    def _counter_lambda_code(self) -> _lambda.Code:
+        # Bundled once and shared by every function built from the source
+        if self._counter_code is None:
+            self._counter_code = function_code(COUNTER_LAMBDA_SOURCE,
+                self._lambda_profile.runtime
+            )
+        return self._counter_code
+
+    def _counter_lambda_layers(self) -> list:
+        if self._counter_layers is None:
+            self._counter_layers = []
+            if os.path.exists(COUNTER_LAMBDA_REQUIREMENTS):
+                self._counter_layers.append(dependency_layer(self,
+                    'CounterDependencies',
+                    requirements_file=COUNTER_LAMBDA_REQUIREMENTS,
+                    runtime=self._lambda_profile.runtime,
+                    architecture=self._lambda_profile.architecture
+                ))
+        return self._counter_layers
+
+    def _counter_environment(self,
+                ddb_table: dynamodb.Table,
+                counter_shards: int,
+                split_counter_endpoints: bool = False) -> dict:
+        environment = {
+            'COUNTER_TABLE_NAME': ddb_table.table_name,
+            # DEBUG logs every request, INFO only a sample of them
+            'LOG_LEVEL': self._log_level,
+            # More than one shard spreads increments over several items
+            # to get past the write throughput of a single partition key
+            'COUNTER_SHARDS': str(counter_shards),
+            # GET /counter only reads when POST /counter/hit counts
+            'COUNTER_SPLIT_ENDPOINTS': str(split_counter_endpoints).lower(),
+            'COUNTER_READ_MAX_AGE': str(COUNTER_READ_MAX_AGE.to_seconds()),
+            # Count each visitor once a day instead of every request
+            'COUNTER_UNIQUE_VISITORS': str(self._unique_visitors).lower(),
+            # Larger ?ids= lists are rejected with a 400
+            'COUNTER_MAX_BATCH': str(COUNTER_MAX_BATCH_SIZE),
+            # DynamoDB retries and timeouts are sized to fit in this
+            'COUNTER_FUNCTION_TIMEOUT': str(
+                (self._lambda_profile.timeout or LAMBDA_DEFAULT_TIMEOUT).to_seconds()),
+        }
+
+        if self._lambda_cache_ttl is not None:
+            # Warm environments serve reads from memory for this long
+            environment['COUNTER_CACHE_TTL'] = str(self._lambda_cache_ttl.to_seconds())
+            environment['COUNTER_CACHE_SIZE'] = str(COUNTER_CACHE_SIZE)
+
+        if self._hit_flush_threshold:
+            # Hits are added up in memory and written in one ADD
+            environment['COUNTER_BUFFER_HITS'] = 'true'
+            environment['COUNTER_FLUSH_THRESHOLD'] = str(self._hit_flush_threshold)
+
+        if self._shard_range is not None:
+            # This region's own range of the counter's shards
+            write_shards, shard_offset = self._shard_range
+            environment['COUNTER_WRITE_SHARDS'] = str(write_shards)
+            environment['COUNTER_SHARD_OFFSET'] = str(shard_offset)
+
+        if self._origin_secret_id is not None:
+            # Requests without the secret CloudFront sends are rejected
+            environment['COUNTER_ORIGIN_SECRET_ID'] = self._origin_secret_id
+
+        if self._history_table is not None:
+            # Hits also roll up into hourly and daily buckets
+            environment['COUNTER_HISTORY_TABLE_NAME'] = self._history_table.table_name
+            environment['COUNTER_HISTORY_MAX_AGE'] = str(COUNTER_HISTORY_MAX_AGE.to_seconds())
+
+        return environment
+
+    def _counter_lambda(self,
+                ddb_table: dynamodb.Table,
+                counter_shards: int,
+                split_counter_endpoints: bool) -> _lambda.IFunction:
+        profile = self._lambda_profile
+
+        lambda_basic_exec_policy = iam.ManagedPolicy.from_aws_managed_policy_name(
+            'service-role/AWSLambdaBasicExecutionRole'
+        )
+
+        lambda_role = iam.Role(self,'CounterLambdaRole',
+            assumed_by=iam.ServicePrincipal('lambda.amazonaws.com'),
+            managed_policies=[lambda_basic_exec_policy]
+        )
+
+        # Create a Lambda function to put records in the DynamoDB table
+        counter_lambda = _lambda.Function(self, 'CounterLambda',
+            runtime=profile.runtime,
+            architecture=profile.architecture,
+            memory_size=profile.memory_size,
+            timeout=profile.timeout,
+            handler='index.lambda_handler',
+            code=self._counter_lambda_code(),
+            layers=self._counter_lambda_layers(),
+            role=lambda_role,
+            tracing=self._function_tracing(),
+            reserved_concurrent_executions=profile.reserved_concurrency,
+            environment=self._counter_environment(ddb_table,
+                counter_shards,
+                split_counter_endpoints
+            )
+        )
+
+        check_package_size(counter_lambda)
+
+        # Define the IAM policy statement. Multi-counter reads use BatchGetItem,
+        # and TransactWriteItems is authorized by the UpdateItem it contains.
+        table_actions = ['dynamodb:GetItem', 'dynamodb:UpdateItem', 'dynamodb:BatchGetItem']
+        if self._unique_visitors:
+            # Claiming a visit puts a dedup item, and a failed hit deletes it
+            table_actions += ['dynamodb:PutItem', 'dynamodb:DeleteItem']
+
+        table_policy_statement = iam.PolicyStatement(
+            actions=table_actions,
+            resources=[ddb_table.table_arn],
+        )
+        
+        # Attach the policy statement to the Lambda function's execution role
+        counter_lambda.add_to_role_policy(table_policy_statement)
+
+        if self._history_table is not None:
+            # Hits update the buckets in a transaction, history pages query them
+            counter_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=['dynamodb:UpdateItem', 'dynamodb:Query'],
+                resources=[self._history_table.table_arn],
+            ))
+
+        if self._origin_secret is not None:
+            self._origin_secret.grant_read(counter_lambda)
+
+        logs.LogGroup(self, 'CounterLambdaLogGroup',
+            log_group_name=f'/aws/lambda/{counter_lambda.function_name}',
+            retention=logs.RetentionDays.ONE_DAY
+        )
+
+        if not profile.provisioned_concurrency:
+            return counter_lambda
+
+        # Keep initialised environments ready on an alias and let API Gateway
+        # invoke the alias, so requests don't wait for cold starts
+        live_alias = counter_lambda.add_alias("live",
+            provisioned_concurrent_executions=profile.provisioned_concurrency
+        )
+
+        live_alias.add_auto_scaling(
+            min_capacity=profile.provisioned_concurrency,
+            max_capacity=max(profile.max_provisioned_concurrency,
+                             profile.provisioned_concurrency)
+        ).scale_on_utilization(
+            utilization_target=profile.provisioned_utilization_target
+        )
+
+        return live_alias
+
+    def _queue_hit_integration(self,
+                ddb_table: dynamodb.Table,
+                counter_shards: int) -> apigateway.AwsIntegration:
+        """Enqueue hits to SQS and count them in batches with a consumer Lambda."""
+
+        dead_letter_queue = sqs.Queue(self, 'CounterHitDeadLetterQueue',
+            retention_period=Duration.days(14)
+        )
+
+        hit_queue = sqs.Queue(self, 'CounterHitQueue',
+            visibility_timeout=Duration.seconds(30),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=5,
+                queue=dead_letter_queue
+            )
+        )
+
+        consumer_lambda = _lambda.Function(self, 'CounterQueueConsumer',
+            runtime=self._lambda_profile.runtime,
+            architecture=self._lambda_profile.architecture,
+            memory_size=self._lambda_profile.memory_size,
+            timeout=self._lambda_profile.timeout,
+            handler='index.queue_handler',
+            code=self._counter_lambda_code(),
+            layers=self._counter_lambda_layers(),
+            tracing=self._function_tracing(),
+            environment=self._counter_environment(ddb_table, counter_shards)
+        )
+
+        check_package_size(consumer_lambda)
+
+        consumer_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=['dynamodb:UpdateItem'],
+            resources=[ddb_table.table_arn],
+        ))
+
+        if self._history_table is not None:
+            # The batch is added to the buckets in the same transaction, and
+            # the total is read back afterwards
+            consumer_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=['dynamodb:GetItem'],
+                resources=[ddb_table.table_arn],
+            ))
+            consumer_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=['dynamodb:UpdateItem'],
+                resources=[self._history_table.table_arn],
+            ))
+
+        # Each batch of queued hits becomes a single ADD of the batch size
+        consumer_lambda.add_event_source(event_sources.SqsEventSource(hit_queue,
+            batch_size=QUEUE_BATCH_SIZE,
+            max_batching_window=QUEUE_BATCH_WINDOW
+        ))
+
+        logs.LogGroup(self, 'CounterQueueConsumerLogGroup',
+            log_group_name=f'/aws/lambda/{consumer_lambda.function_name}',
+            retention=logs.RetentionDays.ONE_DAY
+        )
+
+        api_role = iam.Role(self, 'CounterApiQueueRole',
+            assumed_by=iam.ServicePrincipal('apigateway.amazonaws.com')
+        )
+        hit_queue.grant_send_messages(api_role)
+
+        return apigateway.AwsIntegration(
+            service="sqs",
+            path=f"{self.account}/{hit_queue.queue_name}",
+            integration_http_method="POST",
+            options=apigateway.IntegrationOptions(
+                credentials_role=api_role,
+                passthrough_behavior=apigateway.PassthroughBehavior.NEVER,
+                request_parameters={
+                    "integration.request.header.Content-Type": "'application/x-www-form-urlencoded'"
+                },
+                request_templates={
+                    "application/json": read_template("enqueue_hit_template.txt")
+                },
+                integration_responses=[
+                    apigateway.IntegrationResponse(
+                        status_code="202",
+                        response_templates={
+                            "application/json": '{"message": "Accepted"}'
+                        }
+                    ),
+                    apigateway.IntegrationResponse(
+                        status_code="500",
+                        selection_pattern="[45]\\d{2}",
+                        response_templates={
+                            "application/json": '{"message": "Error"}'
+                        }
+                    ),
+                ]
+            )
+        )
+
+    def _direct_counter_integration(self,
+                ddb_table: dynamodb.Table,
+                action: str,
+                request_template: str,
+                cache_control: str) -> apigateway.AwsIntegration:
+        """Call DynamoDB `action` on the counter item directly from API Gateway."""
+
+        api_role = self.node.try_find_child('CounterApiGatewayRole')
+        if api_role is None:
+            api_role = iam.Role(self, 'CounterApiGatewayRole',
+                assumed_by=iam.ServicePrincipal('apigateway.amazonaws.com')
+            )
+
+        api_role.add_to_policy(iam.PolicyStatement(
+            actions=[f'dynamodb:{action}'],
+            resources=[ddb_table.table_arn],
+        ))
+
+        error_response = apigateway.IntegrationResponse(
+            status_code="500",
+            selection_pattern="[45]\\d{2}",
+            response_templates={
+                "application/json": '{"message": "Error"}'
+            }
+        )
+
+        success_response = apigateway.IntegrationResponse(
+            status_code="200",
+            response_parameters={
+                "method.response.header.Cache-Control": f"'{cache_control}'"
+            },
+            response_templates={
+                "application/json": read_template("get_counter_template.txt")
+            }
+        )
+
+        return apigateway.AwsIntegration(
+            service="dynamodb",
+            action=action,
+            integration_http_method="POST",
+            options=apigateway.IntegrationOptions(
+                credentials_role=api_role,
+                passthrough_behavior=apigateway.PassthroughBehavior.NEVER,
+                request_templates={
+                    "application/json": request_template.replace(
+                        "{{table_name}}", ddb_table.table_name
+                    )
+                },
+                integration_responses=[success_response, error_response]
+            )
+        )
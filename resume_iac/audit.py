@@ -0,0 +1,453 @@
+"""Performance audit of the synthesized stacks.
+
+Synthesizes the app offline, as `resume_iac.factory` builds it, and checks
+the CloudFormation templates for settings that cost latency or money:
+
+    python -m resume_iac.audit --expected-rps 50 --output audit.json
+    python -m resume_iac.audit -c performance_profile=low-latency --fail-on warning
+
+Every finding names its rule, stack and resource. The command exits with 1
+when a finding is at least as severe as --fail-on, so CI can run it.
+"""
+import argparse
+import json
+import math
+import sys
+from dataclasses import asdict, dataclass
+
+SEVERITIES = ("info", "warning", "error")
+
+# Managed CloudFront cache policy that caches nothing
+CACHING_DISABLED = "4135ea2d-6df8-44a3-9df3-4b5a84be39ad"
+
+# Functions CDK adds for its own custom resources; they run at deploy time
+CDK_PROVIDER_PREFIXES = (
+    "AWS679f53fac002430cb0da5b7982bd2287",
+    "LogRetentionaae0aa3c5b4d4f87b02d85b201efdd8a",
+    "CustomS3AutoDeleteObjectsCustomResourceProvider",
+    "CustomCDKBucketDeployment",
+)
+
+# Lambda's default when MemorySize is left out
+DEFAULT_LAMBDA_MEMORY = 128
+
+# Writes per second one DynamoDB partition, and so one item, can take
+PARTITION_WRITE_UNITS = 1000
+
+# Share of PARTITION_WRITE_UNITS a single key may use before it is flagged
+HOT_KEY_WARNING_SHARE = 0.5
+
+# Any domain will do: offline, the hosted zone is never looked up
+AUDIT_DOMAIN_NAME = "example.com"
+
+DEFAULT_EXPECTED_RPS = 5
+DEFAULT_EXPECTED_LATENCY_MS = 100
+DEFAULT_MAX_LOG_RETENTION_DAYS = 30
+
+
+@dataclass(frozen=True)
+class AuditOptions:
+    """What the stacks are expected to handle.
+
+    `expected_rps` is the peak rate of counter requests, one per page view.
+    `expected_latency_ms` is how long the counter Lambda takes per request,
+    which with the rate gives the concurrency it needs.
+    """
+    expected_rps: float = DEFAULT_EXPECTED_RPS
+    expected_latency_ms: float = DEFAULT_EXPECTED_LATENCY_MS
+    max_log_retention_days: int = DEFAULT_MAX_LOG_RETENTION_DAYS
+
+
+@dataclass(frozen=True)
+class Finding:
+    rule: str
+    severity: str
+    stack: str
+    resource: str
+    message: str
+
+
+def resources(template: dict, *types: str) -> dict:
+    """Logical id -> resource, for the resources of `types`."""
+    return {
+        logical_id: resource
+        for logical_id, resource in template.get("Resources", {}).items()
+        if resource["Type"] in types
+    }
+
+
+def references(value) -> set:
+    """Logical ids `value` points at with Ref or Fn::GetAtt."""
+    found = set()
+    if isinstance(value, dict):
+        if "Ref" in value:
+            found.add(value["Ref"])
+        if "Fn::GetAtt" in value:
+            found.add(value["Fn::GetAtt"][0])
+        for item in value.values():
+            found |= references(item)
+    elif isinstance(value, list):
+        for item in value:
+            found |= references(item)
+    return found
+
+
+def app_functions(template: dict) -> dict:
+    """The stack's own Lambda functions, without CDK's providers."""
+    return {
+        logical_id: function
+        for logical_id, function in resources(template, "AWS::Lambda::Function").items()
+        if not logical_id.startswith(CDK_PROVIDER_PREFIXES)
+    }
+
+
+def distribution_behaviors(distribution: dict) -> list:
+    """(path pattern, behavior) of every behavior, the default one as "*"."""
+    config = distribution["Properties"]["DistributionConfig"]
+    behaviors = [("*", config["DefaultCacheBehavior"])]
+    behaviors += [(behavior["PathPattern"], behavior)
+                  for behavior in config.get("CacheBehaviors", [])]
+    return behaviors
+
+
+def invoking_methods(template: dict) -> dict:
+    """Function logical id -> HTTP methods the stack's APIs invoke it with."""
+    methods = {}
+    for method in resources(template, "AWS::ApiGateway::Method").values():
+        properties = method["Properties"]
+        for logical_id in references(properties.get("Integration", {})):
+            methods.setdefault(logical_id, set()).add(properties["HttpMethod"])
+
+    integrations = resources(template, "AWS::ApiGatewayV2::Integration")
+    for route in resources(template, "AWS::ApiGatewayV2::Route").values():
+        properties = route["Properties"]
+        http_method = properties["RouteKey"].split(" ")[0]
+        for integration_id in references(properties.get("Target")) & set(integrations):
+            for logical_id in references(integrations[integration_id]["Properties"]):
+                methods.setdefault(logical_id, set()).add(http_method)
+    return methods
+
+
+def counts_hits(logical_id: str, function: dict, methods: dict) -> bool:
+    """Whether the counter function writes a hit for the requests it gets."""
+    variables = function["Properties"].get("Environment", {}).get("Variables", {})
+    if function["Properties"]["Handler"] == "index.queue_handler":
+        return True
+    if variables.get("COUNTER_SPLIT_ENDPOINTS") == "true":
+        # GET /counter only reads; hits are POSTed to /counter/hit
+        return "POST" in methods.get(logical_id, set())
+    return True
+
+
+def cache_policy(template: dict, behavior: dict):
+    """The behavior's cache policy: a managed policy id, a resource, or None."""
+    policy_id = behavior.get("CachePolicyId")
+    if isinstance(policy_id, dict) and "Ref" in policy_id:
+        return template["Resources"][policy_id["Ref"]]
+    return policy_id
+
+
+def check_caching(stack: str, template: dict, options: AuditOptions) -> list:
+    """Static files and counter reads are served from CloudFront's cache."""
+    findings = []
+    for logical_id, distribution in resources(template, "AWS::CloudFront::Distribution").items():
+        behaviors = distribution_behaviors(distribution)
+        split = any(path == "/counter/hit" for path, _ in behaviors)
+
+        for path, behavior in behaviors:
+            policy = cache_policy(template, behavior)
+            if policy is None:
+                findings.append(Finding("caching", "warning", stack, logical_id,
+                    f"behavior {path} has no cache policy; legacy ForwardedValues "
+                    "caching puts every forwarded value in the cache key"))
+                continue
+
+            if policy == CACHING_DISABLED:
+                if path == "*":
+                    findings.append(Finding("caching", "error", stack, logical_id,
+                        "the default behavior disables caching, so every static "
+                        "file is fetched from the bucket"))
+                elif path == "/counter" and split:
+                    findings.append(Finding("caching", "error", stack, logical_id,
+                        "/counter only reads the counter but disables caching, "
+                        "so every read reaches the API"))
+                elif path == "/counter":
+                    findings.append(Finding("caching", "info", stack, logical_id,
+                        "every GET /counter counts a view and reaches the API; "
+                        "split_counter_endpoints lets CloudFront cache the reads"))
+                continue
+
+            if not isinstance(policy, dict):
+                continue
+
+            config = policy["Properties"]["CachePolicyConfig"]
+            if config.get("MaxTTL") == 0:
+                findings.append(Finding("caching", "error", stack, logical_id,
+                    f"behavior {path} has a cache policy with a MaxTTL of 0"))
+
+            key = config["ParametersInCacheKeyAndForwardedToOrigin"]
+            wide_keys = {
+                "every query string": key["QueryStringsConfig"]["QueryStringBehavior"] in ("all", "allExcept"),
+                "cookies": key["CookiesConfig"]["CookieBehavior"] != "none",
+                "headers": key["HeadersConfig"]["HeaderBehavior"] != "none",
+            }
+            for part, wide in wide_keys.items():
+                if wide:
+                    findings.append(Finding("caching", "warning", stack, logical_id,
+                        f"behavior {path} keys its cache on {part}, which "
+                        "splits it into rarely reused entries"))
+    return findings
+
+
+def check_compression(stack: str, template: dict, options: AuditOptions) -> list:
+    """CloudFront compresses responses and caches the compressed copies."""
+    findings = []
+    for logical_id, distribution in resources(template, "AWS::CloudFront::Distribution").items():
+        for path, behavior in distribution_behaviors(distribution):
+            if not behavior.get("Compress"):
+                findings.append(Finding("compression", "warning", stack, logical_id,
+                    f"behavior {path} does not compress responses"))
+
+            policy = cache_policy(template, behavior)
+            if not isinstance(policy, dict):
+                continue
+            key = policy["Properties"]["CachePolicyConfig"]["ParametersInCacheKeyAndForwardedToOrigin"]
+            missing = [encoding for encoding, setting in (("gzip", "EnableAcceptEncodingGzip"),
+                                                          ("brotli", "EnableAcceptEncodingBrotli"))
+                       if not key.get(setting)]
+            if missing:
+                findings.append(Finding("compression", "warning", stack, logical_id,
+                    f"behavior {path} has a cache policy without "
+                    f"{' and '.join(missing)}, so those encodings aren't served from cache"))
+    return findings
+
+
+def check_lambda_compute(stack: str, template: dict, options: AuditOptions) -> list:
+    """The counter functions set their memory and run on Graviton."""
+    findings = []
+    for logical_id, function in app_functions(template).items():
+        properties = function["Properties"]
+
+        memory = properties.get("MemorySize")
+        if memory is None:
+            findings.append(Finding("lambda-compute", "warning", stack, logical_id,
+                f"no MemorySize, so the function gets the default {DEFAULT_LAMBDA_MEMORY} MB "
+                "and the CPU share that comes with it"))
+        elif memory <= DEFAULT_LAMBDA_MEMORY:
+            findings.append(Finding("lambda-compute", "warning", stack, logical_id,
+                f"{memory} MB leaves boto3 little CPU to initialize with"))
+
+        if properties.get("Architectures", ["x86_64"]) != ["arm64"]:
+            findings.append(Finding("lambda-compute", "info", stack, logical_id,
+                "runs on x86_64; arm64 costs about 20% less per GB-second"))
+    return findings
+
+
+def check_throttling(stack: str, template: dict, options: AuditOptions) -> list:
+    """API and Lambda limits leave room for the expected request rate."""
+    findings = []
+
+    def check(logical_id, where, rate_limit, burst_limit):
+        if rate_limit is not None and rate_limit < options.expected_rps:
+            findings.append(Finding("throttling", "error", stack, logical_id,
+                f"{where} allows {rate_limit} requests/s, below the expected "
+                f"{options.expected_rps}; the rest get 429s"))
+        if burst_limit is not None and burst_limit < options.expected_rps:
+            findings.append(Finding("throttling", "warning", stack, logical_id,
+                f"{where} bursts to {burst_limit} requests, so more than that "
+                "arriving together get 429s even below the rate limit"))
+
+    for logical_id, stage in resources(template, "AWS::ApiGateway::Stage").items():
+        for setting in stage["Properties"].get("MethodSettings", []):
+            check(logical_id, f"stage {setting.get('ResourcePath', '/*')}",
+                  setting.get("ThrottlingRateLimit"), setting.get("ThrottlingBurstLimit"))
+
+    for logical_id, plan in resources(template, "AWS::ApiGateway::UsagePlan").items():
+        throttle = plan["Properties"].get("Throttle", {})
+        check(logical_id, "usage plan", throttle.get("RateLimit"), throttle.get("BurstLimit"))
+        for api_stage in plan["Properties"].get("ApiStages", []):
+            for method, throttle in api_stage.get("Throttle", {}).items():
+                check(logical_id, f"usage plan {method}",
+                      throttle.get("RateLimit"), throttle.get("BurstLimit"))
+
+    for logical_id, stage in resources(template, "AWS::ApiGatewayV2::Stage").items():
+        settings = stage["Properties"].get("DefaultRouteSettings", {})
+        check(logical_id, f"stage {stage['Properties']['StageName']}",
+              settings.get("ThrottlingRateLimit"), settings.get("ThrottlingBurstLimit"))
+
+    # Little's law: requests in flight = rate x time per request
+    needed = math.ceil(options.expected_rps * options.expected_latency_ms / 1000)
+    for logical_id, function in app_functions(template).items():
+        reserved = function["Properties"].get("ReservedConcurrentExecutions")
+        if reserved is not None and reserved < needed:
+            findings.append(Finding("throttling", "error", stack, logical_id,
+                f"reserved concurrency of {reserved} is below the {needed} environments "
+                f"{options.expected_rps} requests/s at {options.expected_latency_ms} ms need"))
+    return findings
+
+
+def check_hot_keys(stack: str, template: dict, options: AuditOptions) -> list:
+    """No single table item takes more writes than a partition can."""
+    findings = []
+    functions = app_functions(template)
+    methods = invoking_methods(template)
+
+    for logical_id, table in resources(template, "AWS::DynamoDB::Table",
+                                       "AWS::DynamoDB::GlobalTable").items():
+        properties = table["Properties"]
+
+        # Writes/s to the hottest item, as each function that counts hits
+        # in the table sees them. Every hit takes one of the paths.
+        writer_key_writes = []
+        for function_id, function in functions.items():
+            variables = function["Properties"].get("Environment", {}).get("Variables", {})
+            writes_table = [name for name, value in variables.items()
+                            if logical_id in references(value)]
+            if not writes_table or not counts_hits(function_id, function, methods):
+                continue
+            if (function["Properties"]["Handler"] == "index.queue_handler"
+                    or variables.get("COUNTER_BUFFER_HITS") == "true"):
+                # Hits are folded into one write per batch
+                writer_key_writes.append(0)
+            elif "COUNTER_TABLE_NAME" in writes_table:
+                # Every counted view writes the table once, to one of the shards
+                shards = int(variables.get("COUNTER_WRITE_SHARDS")
+                             or variables.get("COUNTER_SHARDS") or 1)
+                writer_key_writes.append(options.expected_rps / shards)
+            else:
+                # History buckets take every hit of their hour or day
+                writer_key_writes.append(options.expected_rps)
+
+        if not writer_key_writes:
+            # Nothing in the stack writes it
+            continue
+        key_writes = max(writer_key_writes)
+
+        if key_writes > PARTITION_WRITE_UNITS:
+            findings.append(Finding("hot-keys", "error", stack, logical_id,
+                f"about {key_writes:g} writes/s go to one item, above the "
+                f"{PARTITION_WRITE_UNITS} a partition takes; shard the counter"))
+        elif key_writes > PARTITION_WRITE_UNITS * HOT_KEY_WARNING_SHARE:
+            findings.append(Finding("hot-keys", "warning", stack, logical_id,
+                f"about {key_writes:g} writes/s go to one item, over half of "
+                f"the {PARTITION_WRITE_UNITS} a partition takes"))
+
+        throughput = properties.get("ProvisionedThroughput")
+        if throughput and throughput["WriteCapacityUnits"] < options.expected_rps:
+            findings.append(Finding("hot-keys", "error", stack, logical_id,
+                f"{throughput['WriteCapacityUnits']} provisioned write units are below "
+                f"the expected {options.expected_rps} writes/s"))
+    return findings
+
+
+def check_logging(stack: str, template: dict, options: AuditOptions) -> list:
+    """Logs expire, and nothing logs more than it needs to."""
+    findings = []
+    log_groups = resources(template, "AWS::Logs::LogGroup", "Custom::LogRetention")
+
+    for logical_id, log_group in log_groups.items():
+        retention = log_group["Properties"].get("RetentionInDays")
+        if retention is None:
+            findings.append(Finding("logging", "warning", stack, logical_id,
+                "log group never expires, so its storage grows for good"))
+        elif retention > options.max_log_retention_days:
+            findings.append(Finding("logging", "info", stack, logical_id,
+                f"logs are kept {retention} days, longer than "
+                f"{options.max_log_retention_days}"))
+
+    for logical_id, function in app_functions(template).items():
+        logging_config = function["Properties"].get("LoggingConfig", {})
+        has_log_group = bool(references(logging_config.get("LogGroup"))) or any(
+            logical_id in references(log_group["Properties"].get("LogGroupName"))
+            for log_group in log_groups.values()
+        )
+        if not has_log_group:
+            findings.append(Finding("logging", "warning", stack, logical_id,
+                "the function's log group is created on first run and never expires"))
+
+    for logical_id, stage in resources(template, "AWS::ApiGateway::Stage").items():
+        for setting in stage["Properties"].get("MethodSettings", []):
+            if setting.get("DataTraceEnabled"):
+                findings.append(Finding("logging", "warning", stack, logical_id,
+                    "data trace logs every request and response body"))
+    return findings
+
+
+RULES = {
+    "caching": check_caching,
+    "compression": check_compression,
+    "lambda-compute": check_lambda_compute,
+    "throttling": check_throttling,
+    "hot-keys": check_hot_keys,
+    "logging": check_logging,
+}
+
+
+def audit_templates(templates: dict, options: AuditOptions = AuditOptions(),
+                    rules=None) -> list:
+    """Findings for stack name -> CloudFormation template, most severe first."""
+    findings = []
+    for stack, template in templates.items():
+        for name in rules or RULES:
+            findings += RULES[name](stack, template, options)
+    return sorted(findings, key=lambda finding: -SEVERITIES.index(finding.severity))
+
+
+def synthesize_templates(context: dict = None) -> dict:
+    """Stack name -> template, of the app the factory builds, offline."""
+    from resume_iac.factory import create_app, create_stacks, stack_environment
+
+    app = create_app(context=context, offline=True)
+    create_stacks(app, *stack_environment(app), AUDIT_DOMAIN_NAME)
+    assembly = app.synth()
+    return {stack.stack_name: stack.template for stack in assembly.stacks}
+
+
+def report(findings: list, templates: dict, options: AuditOptions) -> dict:
+    return {
+        "options": asdict(options),
+        "stacks": sorted(templates),
+        "summary": {severity: sum(finding.severity == severity for finding in findings)
+                    for severity in SEVERITIES},
+        "findings": [asdict(finding) for finding in findings],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expected-rps", type=float, default=DEFAULT_EXPECTED_RPS,
+                        help="peak counter requests per second")
+    parser.add_argument("--expected-latency-ms", type=float, default=DEFAULT_EXPECTED_LATENCY_MS,
+                        help="counter Lambda duration per request")
+    parser.add_argument("--max-log-retention-days", type=int, default=DEFAULT_MAX_LOG_RETENTION_DAYS)
+    parser.add_argument("-c", "--context", action="append", default=[], metavar="KEY=VALUE",
+                        help="CDK context, as cdk synth -c would pass it")
+    parser.add_argument("--rule", action="append", choices=sorted(RULES),
+                        help="run only this rule; may be repeated")
+    parser.add_argument("--fail-on", choices=SEVERITIES, default="error",
+                        help="exit with 1 on a finding this severe or worse")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    options = AuditOptions(expected_rps=args.expected_rps,
+        expected_latency_ms=args.expected_latency_ms,
+        max_log_retention_days=args.max_log_retention_days
+    )
+    context = dict(item.split("=", 1) for item in args.context)
+
+    templates = synthesize_templates(context)
+    findings = audit_templates(templates, options, args.rule)
+    result = report(findings, templates, options)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+    threshold = SEVERITIES.index(args.fail_on)
+    return int(any(SEVERITIES.index(finding.severity) >= threshold for finding in findings))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Builds the CDK app: which stacks, in which environment, with what context.
+
+`app.py` is a thin wrapper around this, so tests and benchmarks can build
+exactly the stacks they need without credentials, lookups or a cwd:
+
+    app = create_app(offline=True)
+    stacks = create_stacks(app, *stack_environment(app), "example.com", stacks=["api"])
+"""
+import json
+import os
+
+import aws_cdk as cdk
+
+from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack
+from resume_iac.s3_website__stack import S3WebsiteStack
+
+# "website" includes the API stacks it reads its counter origin from
+STACK_GROUPS = ("api", "website")
+
+# Stand-ins for what an offline synth can't look up
+OFFLINE_ACCOUNT = "123456789012"
+OFFLINE_REGION = "us-east-1"
+OFFLINE_HOSTED_ZONE_ID = "Z00000000000000OFFLINE"
+
+
+def context_list(app: cdk.App, key: str) -> list:
+    """A list from context, given as a JSON list or a comma separated -c value."""
+    value = app.node.try_get_context(key) or []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item.strip()]
+
+
+def context_flag(app: cdk.App, key: str) -> bool:
+    return str(app.node.try_get_context(key)).lower() in ("true", "1", "yes")
+
+
+def create_app(context: dict = None,
+               context_file: str = None,
+               offline: bool = False,
+               outdir: str = None) -> cdk.App:
+    """A CDK app with `context` on top of the lookups cached in `context_file`.
+
+    `context_file` is a cdk.context.json, as the CDK CLI would have loaded
+    it. Offline, the hosted zone is imported instead of looked up.
+    """
+    merged = {}
+    if context_file:
+        with open(context_file, encoding="utf-8") as f:
+            merged.update(json.load(f))
+    merged.update(context or {})
+    if offline:
+        merged["offline"] = True
+
+    app = cdk.App(context=merged, outdir=outdir)
+    configure_offline(app)
+    return app
+
+
+def configure_offline(app: cdk.App) -> None:
+    """With `-c offline=true`, import the hosted zone instead of looking it up."""
+    if context_flag(app, "offline") and not app.node.try_get_context("hosted_zone_id"):
+        app.node.set_context("hosted_zone_id", OFFLINE_HOSTED_ZONE_ID)
+
+
+def stack_environment(app: cdk.App) -> tuple:
+    """(account, region) from the CDK CLI, or placeholders when offline."""
+    account = os.environ.get("CDK_DEFAULT_ACCOUNT")
+    region = os.environ.get("CDK_DEFAULT_REGION")
+
+    if context_flag(app, "offline"):
+        return account or OFFLINE_ACCOUNT, region or OFFLINE_REGION
+
+    if not account or not region:
+        raise ValueError(
+            "CDK_DEFAULT_ACCOUNT and CDK_DEFAULT_REGION are not set; run through "
+            "the CDK CLI or synthesize with -c offline=true"
+        )
+    return account, region
+
+
+def create_stacks(app: cdk.App, account: str, region: str, domain_name: str,
+                  stacks: list = None) -> dict:
+    """Add the counter API and website stacks to `app`.
+
+    `stacks` (or `-c stacks=api`) picks the STACK_GROUPS to build; by default
+    all of them. `-c counter_replica_regions=eu-west-1,ap-southeast-2` deploys
+    the counter to those regions as well, on a global table, behind latency
+    routing.
+    """
+    selected = list(stacks or context_list(app, "stacks") or STACK_GROUPS)
+    unknown = set(selected) - set(STACK_GROUPS)
+    if unknown:
+        raise ValueError(f"stacks must be among {STACK_GROUPS}")
+
+    replica_regions = context_list(app, "counter_replica_regions")
+
+    if not replica_regions:
+        api_ddb_lambda = ApiDdbLambdaStack(app, "ApiGwDdbStack",
+            env=cdk.Environment(account=account, region=region),
+        )
+        regional_stacks = [api_ddb_lambda]
+        counter_domain_name = None
+    else:
+        counter_regions = [region] + [r for r in replica_regions if r != region]
+
+        # The stack in the website's region creates the global table and the
+        # secret, and replicates them to the others
+        api_ddb_lambda = ApiDdbLambdaStack(app, "ApiGwDdbStack",
+            env=cdk.Environment(account=account, region=region),
+            api_type="http",
+            counter_regions=counter_regions,
+            domain_name=domain_name,
+        )
+        regional_stacks = [api_ddb_lambda]
+
+        for replica_region in counter_regions[1:]:
+            regional_stack = ApiDdbLambdaStack(app, f"ApiGwDdbStack-{replica_region}",
+                env=cdk.Environment(account=account, region=replica_region),
+                api_type="http",
+                counter_regions=counter_regions,
+                domain_name=domain_name,
+            )
+            regional_stack.add_dependency(api_ddb_lambda)
+            regional_stacks.append(regional_stack)
+
+        counter_domain_name = api_ddb_lambda.counter_domain_name
+
+    if "website" not in selected:
+        return {"api": regional_stacks, "website": None}
+
+    website = S3WebsiteStack(app, "S3WebsiteStack",
+        domain_name=domain_name,
+        env=cdk.Environment(account=account, region=region),
+        rest_api=api_ddb_lambda.rest_api,
+        api_key=api_ddb_lambda.api_key,
+        api_key_value=api_ddb_lambda.api_key_value,
+        http_api=api_ddb_lambda.http_api,
+        origin_secret=api_ddb_lambda.origin_secret,
+        counter_domain_name=counter_domain_name,
+        counter_cache_ttl=api_ddb_lambda.counter_read_max_age,
+        counter_history_ttl=api_ddb_lambda.counter_history_max_age
+    )
+
+    for regional_stack in regional_stacks[1:]:
+        # Every regional API has to be up before CloudFront is sent to it
+        website.add_dependency(regional_stack)
+
+    return {"api": regional_stacks, "website": website}
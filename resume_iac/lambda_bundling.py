@@ -0,0 +1,211 @@
+import compileall
+import fnmatch
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+
+import jsii
+from aws_cdk import (
+    Annotations,
+    BundlingOptions,
+    ILocalBundling,
+    aws_lambda as _lambda,
+)
+from constructs import Construct
+
+# Never shipped with a function: tests, caches, local tooling and the AWS SDK,
+# which every Python runtime already provides.
+EXCLUDED_PATTERNS = (
+    "tests",
+    "test_*.py",
+    "*_test.py",
+    "__pycache__",
+    "*.pyc",
+    ".pytest_cache",
+    "requirements*.txt",
+    "*.dist-info",
+    "boto3",
+    "botocore",
+    "s3transfer",
+)
+
+# The AWS SDK the runtime provides, removed from dependency layers too
+RUNTIME_PROVIDED = ("boto3", "botocore", "s3transfer")
+
+# Budget for the unzipped size of a bundled counter function. The function
+# itself is a few kilobytes, so anything near this was packaged by mistake.
+DEFAULT_MAX_PACKAGE_BYTES = 256 * 1024
+
+
+def runtime_python_version(runtime: _lambda.Runtime) -> str:
+    """"python3.12" -> "3.12"."""
+    return runtime.name.replace("python", "")
+
+
+def _excluded(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in EXCLUDED_PATTERNS)
+
+
+def copy_sources(source_dir: str, output_dir: str) -> None:
+    """Copy `source_dir` to `output_dir` without the excluded files."""
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if not _excluded(d)]
+        relative = os.path.relpath(root, source_dir)
+        target = os.path.join(output_dir, relative)
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            if not _excluded(name):
+                shutil.copy2(os.path.join(root, name), os.path.join(target, name))
+
+
+def precompile(output_dir: str) -> bool:
+    """Write __pycache__ bytecode for the running interpreter.
+
+    The bytecode uses unchecked hashes, so it stays valid whatever mtimes the
+    deployment zip ends up with and the read-only /var/task never has to be
+    recompiled on a cold start.
+    """
+    return compileall.compile_dir(output_dir,
+        quiet=1,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+@jsii.implements(ILocalBundling)
+class LocalPythonBundling:
+    """Bundle a Python function on the host instead of in Docker.
+
+    Bytecode only loads on the interpreter version that wrote it, so sources
+    are precompiled only when the host Python matches the runtime. Otherwise
+    Docker bundling takes over, or, without Docker, the sources are shipped
+    without bytecode.
+    """
+
+    def __init__(self, source_dir: str, runtime: _lambda.Runtime) -> None:
+        self.source_dir = source_dir
+        self.runtime = runtime
+        self.precompiled = False
+
+    def try_bundle(self, output_dir: str, options: BundlingOptions) -> bool:
+        host_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+        matches_runtime = host_version == runtime_python_version(self.runtime)
+
+        if not matches_runtime and shutil.which("docker"):
+            return False
+
+        copy_sources(self.source_dir, output_dir)
+        if matches_runtime:
+            self.precompiled = precompile(output_dir)
+        return True
+
+
+def function_code(source_dir: str, runtime: _lambda.Runtime) -> _lambda.Code:
+    """Slim, precompiled asset for a Python function in `source_dir`."""
+    excluded = " -o ".join(f"-name '{pattern}'" for pattern in EXCLUDED_PATTERNS)
+
+    return _lambda.Code.from_asset(source_dir,
+        bundling=BundlingOptions(
+            image=runtime.bundling_image,
+            command=[
+                "bash", "-c",
+                "cp -r /asset-input/. /asset-output/ && "
+                f"find /asset-output -mindepth 1 \\( {excluded} \\) -prune -exec rm -rf {{}} + && "
+                "python -m compileall -q --invalidation-mode unchecked-hash /asset-output"
+            ],
+            local=LocalPythonBundling(source_dir, runtime)
+        )
+    )
+
+
+def remove_runtime_provided(site_dir: str) -> None:
+    for name in os.listdir(site_dir):
+        package = name.split("-")[0].lower()
+        if package in RUNTIME_PROVIDED:
+            shutil.rmtree(os.path.join(site_dir, name), ignore_errors=True)
+
+
+@jsii.implements(ILocalBundling)
+class LocalLayerBundling:
+    """pip install a requirements file into a layer on the host.
+
+    pip fetches wheels for the layer's runtime and architecture, so the host
+    Python version doesn't matter.
+    """
+
+    def __init__(self, requirements_file: str,
+                runtime: _lambda.Runtime,
+                architecture: _lambda.Architecture) -> None:
+        self.requirements_file = requirements_file
+        self.runtime = runtime
+        self.architecture = architecture
+
+    def try_bundle(self, output_dir: str, options: BundlingOptions) -> bool:
+        platform = ("manylinux2014_aarch64"
+                    if self.architecture == _lambda.Architecture.ARM_64
+                    else "manylinux2014_x86_64")
+        site_dir = os.path.join(output_dir, "python")
+
+        subprocess.run([sys.executable, "-m", "pip", "install",
+            "--quiet",
+            "--requirement", self.requirements_file,
+            "--target", site_dir,
+            "--platform", platform,
+            "--implementation", "cp",
+            "--python-version", runtime_python_version(self.runtime),
+            "--only-binary=:all:"], check=True)
+
+        os.makedirs(site_dir, exist_ok=True)
+        remove_runtime_provided(site_dir)
+        return True
+
+
+def dependency_layer(scope: Construct, id: str,
+                requirements_file: str,
+                runtime: _lambda.Runtime,
+                architecture: _lambda.Architecture) -> _lambda.LayerVersion:
+    """Layer with the packages in `requirements_file`, minus the AWS SDK."""
+    requirements_file = os.path.abspath(requirements_file)
+    removals = " ".join(f"/asset-output/python/{name}*" for name in RUNTIME_PROVIDED)
+
+    return _lambda.LayerVersion(scope, id,
+        code=_lambda.Code.from_asset(os.path.dirname(requirements_file),
+            bundling=BundlingOptions(
+                image=runtime.bundling_image,
+                platform=architecture.docker_platform,
+                command=[
+                    "bash", "-c",
+                    f"pip install --quiet -r {os.path.basename(requirements_file)} "
+                    f"-t /asset-output/python && rm -rf {removals}"
+                ],
+                local=LocalLayerBundling(requirements_file, runtime, architecture)
+            )
+        ),
+        compatible_runtimes=[runtime],
+        compatible_architectures=[architecture]
+    )
+
+
+def check_package_size(function: _lambda.Function,
+                max_bytes: int = DEFAULT_MAX_PACKAGE_BYTES) -> int:
+    """Fail synthesis when the function's bundled code outgrows `max_bytes`."""
+    code = function.node.try_find_child("Code")
+    stage = code.node.try_find_child("Stage") if code is not None else None
+    if stage is None:
+        return 0
+
+    size = directory_size(stage.absolute_staged_path)
+    if size > max_bytes:
+        Annotations.of(function).add_error(
+            f"Deployment package is {size} bytes, over the {max_bytes} byte budget"
+        )
+    return size
@@ -0,0 +1,17 @@
+from aws_cdk import aws_route53 as route53
+from constructs import Construct
+
+
+def hosted_zone(scope: Construct, id: str, domain_name: str) -> route53.IHostedZone:
+    """The hosted zone of `domain_name`.
+
+    With `-c hosted_zone_id=Z...` the zone is imported as is, so synthesis
+    needs no Route 53 lookup, credentials or cdk.context.json entry.
+    """
+    hosted_zone_id = scope.node.try_get_context("hosted_zone_id")
+    if hosted_zone_id:
+        return route53.HostedZone.from_hosted_zone_attributes(scope, id,
+            hosted_zone_id=hosted_zone_id,
+            zone_name=domain_name
+        )
+    return route53.HostedZone.from_lookup(scope, id, domain_name=domain_name)
@@ -0,0 +1,17 @@
+"""Files the stacks read, found relative to the project instead of the cwd."""
+import functools
+import os
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(PROJECT_DIR, "templates")
+
+
+def project_path(*parts: str) -> str:
+    return os.path.join(PROJECT_DIR, *parts)
+
+
+@functools.lru_cache(maxsize=None)
+def read_template(name: str) -> str:
+    """Contents of templates/`name`, read on first use."""
+    with open(os.path.join(TEMPLATES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from aws_cdk import (
+    Duration,
+    RemovalPolicy,
+    aws_cloudfront as cloudfront,
+    aws_dynamodb as dynamodb,
+    aws_lambda as _lambda,
+)
+
+
+@dataclass(frozen=True)
+class LambdaProfile:
+    """Compute settings for the counter functions.
+
+    `provisioned_concurrency` above zero publishes a "live" alias with that
+    many pre-initialised environments, scaled on utilization up to
+    `max_provisioned_concurrency`. API Gateway then invokes the alias.
+    """
+    runtime: _lambda.Runtime
+    architecture: _lambda.Architecture
+    memory_size: Optional[int] = None
+    timeout: Optional[Duration] = None
+    reserved_concurrency: Optional[int] = None
+    provisioned_concurrency: int = 0
+    max_provisioned_concurrency: int = 0
+    provisioned_utilization_target: float = 0.7
+
+
+LAMBDA_PROFILES = {
+    # CDK defaults, as the stack has always been deployed
+    "default": LambdaProfile(
+        runtime=_lambda.Runtime.PYTHON_3_9,
+        architecture=_lambda.Architecture.X86_64,
+    ),
+    # Cheapest per hit: Graviton and just enough memory for boto3
+    "low-cost": LambdaProfile(
+        runtime=_lambda.Runtime.PYTHON_3_12,
+        architecture=_lambda.Architecture.ARM_64,
+        memory_size=256,
+        timeout=Duration.seconds(5),
+        reserved_concurrency=10,
+    ),
+    # More memory buys more CPU for init and request handling
+    "balanced": LambdaProfile(
+        runtime=_lambda.Runtime.PYTHON_3_12,
+        architecture=_lambda.Architecture.ARM_64,
+        memory_size=512,
+        timeout=Duration.seconds(5),
+        reserved_concurrency=20,
+    ),
+    # No cold starts on the request path
+    "low-latency": LambdaProfile(
+        runtime=_lambda.Runtime.PYTHON_3_12,
+        architecture=_lambda.Architecture.ARM_64,
+        memory_size=1024,
+        timeout=Duration.seconds(5),
+        reserved_concurrency=50,
+        provisioned_concurrency=2,
+        max_provisioned_concurrency=10,
+    ),
+}
+
+
+@dataclass(frozen=True)
+class CloudFrontProfile:
+    """Delivery settings for the website distribution.
+
+    `static_*_ttl` replace CACHING_OPTIMIZED with a cache policy of these
+    TTLs for the bucket; the cache key stays path plus normalized
+    Accept-Encoding. `origin_shield` puts a shield in front of the bucket in
+    the stack's region, so edge misses are collapsed into one origin fetch.
+    """
+    price_class: cloudfront.PriceClass
+    http_version: cloudfront.HttpVersion
+    compress: bool = True
+    origin_shield: bool = False
+    static_default_ttl: Optional[Duration] = None
+    static_max_ttl: Optional[Duration] = None
+    static_min_ttl: Optional[Duration] = None
+    error_caching_ttl: Duration = Duration.seconds(10)
+
+
+# Named like LAMBDA_PROFILES, so `-c performance_profile=...` tunes both stacks
+CLOUDFRONT_PROFILES = {
+    # As the distribution has always been deployed
+    "default": CloudFrontProfile(
+        price_class=cloudfront.PriceClass.PRICE_CLASS_100,
+        http_version=cloudfront.HttpVersion.HTTP2,
+    ),
+    # Fewest edge locations, but long caching so the bucket is rarely read
+    "low-cost": CloudFrontProfile(
+        price_class=cloudfront.PriceClass.PRICE_CLASS_100,
+        http_version=cloudfront.HttpVersion.HTTP2_AND_3,
+        static_default_ttl=Duration.days(1),
+        static_max_ttl=Duration.days(365),
+        static_min_ttl=Duration.seconds(0),
+        error_caching_ttl=Duration.minutes(5),
+    ),
+    "balanced": CloudFrontProfile(
+        price_class=cloudfront.PriceClass.PRICE_CLASS_200,
+        http_version=cloudfront.HttpVersion.HTTP2_AND_3,
+        static_default_ttl=Duration.days(1),
+        static_max_ttl=Duration.days(365),
+        static_min_ttl=Duration.seconds(0),
+        error_caching_ttl=Duration.minutes(1),
+    ),
+    # Every edge location, QUIC, and a shield in front of the bucket
+    "low-latency": CloudFrontProfile(
+        price_class=cloudfront.PriceClass.PRICE_CLASS_ALL,
+        http_version=cloudfront.HttpVersion.HTTP2_AND_3,
+        origin_shield=True,
+        static_default_ttl=Duration.days(1),
+        static_max_ttl=Duration.days(365),
+        static_min_ttl=Duration.seconds(0),
+        error_caching_ttl=Duration.minutes(1),
+    ),
+}
+
+
+@dataclass(frozen=True)
+class TableProfile:
+    """Capacity and protection of the counter tables.
+
+    With `provisioned`, each table starts at the minimum read and write
+    capacity and target tracking scales it up to the maximum, keeping
+    consumption near `utilization_target` percent. Contributor insights
+    report the most accessed and most throttled keys, which is where a hot
+    counter shows up.
+    """
+    provisioned: bool = False
+    min_read_capacity: int = 1
+    max_read_capacity: int = 1
+    min_write_capacity: int = 1
+    max_write_capacity: int = 1
+    utilization_target: int = 70
+    table_class: Optional[dynamodb.TableClass] = None
+    contributor_insights: bool = False
+    deletion_protection: bool = False
+    point_in_time_recovery: bool = False
+    removal_policy: RemovalPolicy = RemovalPolicy.DESTROY
+
+
+# Picked with `-c table_profile=...`, separately from performance_profile
+TABLE_PROFILES = {
+    # On demand, as the tables have always been deployed
+    "default": TableProfile(),
+    # Cheaper than on demand for steady traffic; counter reads are mostly
+    # answered by caches, so writes get the larger range
+    "provisioned": TableProfile(
+        provisioned=True,
+        min_read_capacity=5,
+        max_read_capacity=100,
+        min_write_capacity=5,
+        max_write_capacity=500,
+        contributor_insights=True,
+    ),
+    # The count can't be rebuilt, so it is kept safe from deletes and
+    # restorable to any second of the last 35 days
+    "production": TableProfile(
+        contributor_insights=True,
+        deletion_protection=True,
+        point_in_time_recovery=True,
+        removal_policy=RemovalPolicy.RETAIN,
+    ),
+}
@@ -1,8 +1,11 @@
+import os
+
 from aws_cdk import (
     Arn,
     ArnComponents,
     ArnFormat,
     Duration,
+    Fn,
     Stack,
     CfnOutput,
     RemovalPolicy,
@@ -13,11 +16,17 @@ from aws_cdk import (
     aws_route53_targets as targets,
     aws_s3 as s3,
     aws_iam as iam,
-    aws_apigateway as apigateway
+    aws_apigateway as apigateway,
+    aws_apigatewayv2 as apigatewayv2,
+    aws_secretsmanager as secretsmanager,
 )
 
 from constructs import Construct
 
+from resume_iac import lookups
+from resume_iac.paths import TEMPLATES_DIR, project_path
+from resume_iac.profiles import CLOUDFRONT_PROFILES
+
 def read_csp(file_path):
     try:
         with open(file_path, 'r') as file:
@@ -29,7 +38,20 @@ def read_csp(file_path):
         print(f"Error: Unable to read the file '{file_path}'.")
 
 
-csp = read_csp('templates/csp.txt')
+# Sends browsers to the .br and .gz copies resume_iac/site_assets.py uploads
+PRECOMPRESSED_ASSETS_FUNCTION = project_path('cloudfront_functions', 'precompressed_assets.js')
+
+# Answers bots, prefetches and wrong methods on /counter at the edge
+COUNTER_REQUEST_FUNCTION = project_path('cloudfront_functions', 'counter_request.js')
+
+
+def render_function(file_path, **values):
+    """CloudFront Function source with its {{name}} placeholders filled in."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        code = file.read()
+    for name, value in values.items():
+        code = code.replace('{{' + name + '}}', value)
+    return code
 
 
 class S3WebsiteStack(Stack):
@@ -38,12 +60,34 @@ class S3WebsiteStack(Stack):
                 scope: Construct, 
                 id: str, 
                 domain_name: str, 
-                rest_api: apigateway.RestApi,
-                api_key: apigateway.ApiKey,
-                api_key_value: str, 
+                rest_api: apigateway.RestApi = None,
+                api_key: apigateway.ApiKey = None,
+                api_key_value: str = None,
+                http_api: apigatewayv2.HttpApi = None,
+                origin_secret: secretsmanager.ISecret = None,
+                counter_domain_name: str = None,
+                counter_cache_ttl: Duration = None,
+                counter_history_ttl: Duration = None,
+                precompressed_assets: bool = False,
+                performance_profile: str = None,
+                origin_shield_region: str = None,
+                counter_request_function: bool = True,
                 **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
+        # Same context key as ApiDdbLambdaStack, so
+        # `cdk deploy -c performance_profile=low-latency` tunes both
+        performance_profile = (performance_profile
+            or self.node.try_get_context("performance_profile")
+            or "default")
+
+        if performance_profile not in CLOUDFRONT_PROFILES:
+            raise ValueError(
+                f"performance_profile must be one of {tuple(CLOUDFRONT_PROFILES)}"
+            )
+
+        profile = CLOUDFRONT_PROFILES[performance_profile]
+
         # Create the S3 bucket
         bucket = s3.Bucket(self, "WebsiteBucket",
             public_read_access=False,
@@ -54,9 +98,7 @@ class S3WebsiteStack(Stack):
         )
 
         # Import the existing Route 53 hosted zone for the custom domain
-        hosted_zone = route53.HostedZone.from_lookup(self,"HostedZone", 
-            domain_name=domain_name
-        )
+        hosted_zone = lookups.hosted_zone(self, "HostedZone", domain_name)
 
         # Create an ACM certificate for the custom domain
         certificate_validation = acm.CertificateValidation.from_dns(
@@ -81,6 +123,8 @@ class S3WebsiteStack(Stack):
             origin_access_control_config=oac_config
         )
 
+        csp = read_csp(os.path.join(TEMPLATES_DIR, 'csp.txt'))
+
         cs_policy = cloudfront.ResponseHeadersContentSecurityPolicy(
             content_security_policy=f"{csp}", 
             override=True
@@ -124,31 +168,73 @@ class S3WebsiteStack(Stack):
             security_headers_behavior=security_headers
         )
 
+        function_associations = None
+        if precompressed_assets:
+            # Both bucket cache policies key on the normalized
+            # Accept-Encoding, so each variant is cached separately
+            precompressed_function = cloudfront.Function(self, "PrecompressedAssetsFunction",
+                code=cloudfront.FunctionCode.from_file(
+                    file_path=PRECOMPRESSED_ASSETS_FUNCTION
+                ),
+                runtime=cloudfront.FunctionRuntime.JS_2_0,
+                comment="Serve precompressed site assets"
+            )
+            function_associations = [
+                cloudfront.FunctionAssociation(
+                    function=precompressed_function,
+                    event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+                )
+            ]
+
+        if profile.static_default_ttl is not None:
+            # Only path and encoding make a different object, so nothing
+            # else splits the cache
+            static_cache_policy = cloudfront.CachePolicy(self, "StaticCachePolicy",
+                comment="Cache for the website bucket",
+                default_ttl=profile.static_default_ttl,
+                max_ttl=profile.static_max_ttl,
+                min_ttl=profile.static_min_ttl,
+                query_string_behavior=cloudfront.CacheQueryStringBehavior.none(),
+                header_behavior=cloudfront.CacheHeaderBehavior.none(),
+                cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+                enable_accept_encoding_gzip=True,
+                enable_accept_encoding_brotli=True
+            )
+        else:
+            static_cache_policy = cloudfront.CachePolicy.CACHING_OPTIMIZED
+
+        bucket_origin_shield = None
+        if profile.origin_shield:
+            bucket_origin_shield = origin_shield_region or self.region
+
         default_behave = cloudfront.BehaviorOptions(
-            origin=origins.S3Origin(bucket),
+            origin=origins.S3Origin(bucket, origin_shield_region=bucket_origin_shield),
             viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
             allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
             response_headers_policy=response_headers_policy,
-            cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
+            cache_policy=static_cache_policy,
+            compress=profile.compress,
+            function_associations=function_associations,
         )
 
         not_found_res = cloudfront.ErrorResponse(
             http_status=404,
             response_http_status=404,
             response_page_path="/error.html",
-            ttl=Duration.seconds(10)
+            ttl=profile.error_caching_ttl
         )
 
         not_auth_res = cloudfront.ErrorResponse(
             http_status=403,
             response_http_status=403,
             response_page_path="/error.html",
-            ttl=Duration.seconds(10)
+            ttl=profile.error_caching_ttl
         )
 
         distribution = cloudfront.Distribution(self, "CloudFrontDistribution",
             default_behavior=default_behave,
-            price_class=cloudfront.PriceClass.PRICE_CLASS_100,
+            price_class=profile.price_class,
+            http_version=profile.http_version,
             certificate=certificate,
             domain_names=[f"www.{domain_name}",f"{domain_name}"],
             comment="CloudFront Distribution for the S3 Website",
@@ -156,22 +242,134 @@ class S3WebsiteStack(Stack):
             error_responses=[not_found_res, not_auth_res]
         )
 
-        rest_api_origin = origins.RestApiOrigin(
-            rest_api=rest_api,
-            origin_path="/prod",
-            custom_headers={
-                "old-api-key": f"Just a place holder for {api_key.key_id}. Can't be deleted.",
-                "x-api-key": f"{api_key_value}"
-            }
-        )
-
-        distribution.add_behavior(
-            path_pattern="/counter",
-            origin = rest_api_origin,
-            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-            cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
-            origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER
-        )
+        if counter_domain_name is not None:
+            # Route 53 latency records send each edge location to the closest
+            # regional HTTP API
+            counter_origin = origins.HttpOrigin(counter_domain_name,
+                custom_headers={
+                    "x-origin-secret": origin_secret.secret_value.unsafe_unwrap()
+                }
+            )
+        elif http_api is not None:
+            # The regional HTTP API checks the secret header itself.
+            # api_endpoint is https://<id>.execute-api.<region>.amazonaws.com
+            counter_origin = origins.HttpOrigin(
+                Fn.select(2, Fn.split("/", http_api.api_endpoint)),
+                custom_headers={
+                    "x-origin-secret": origin_secret.secret_value.unsafe_unwrap()
+                }
+            )
+        elif origin_secret is not None:
+            # The REST API needs no key; the counter Lambda checks the secret
+            counter_origin = origins.RestApiOrigin(
+                rest_api=rest_api,
+                origin_path="/prod",
+                custom_headers={
+                    "x-origin-secret": origin_secret.secret_value.unsafe_unwrap()
+                }
+            )
+        else:
+            counter_origin = origins.RestApiOrigin(
+                rest_api=rest_api,
+                origin_path="/prod",
+                custom_headers={
+                    "old-api-key": f"Just a place holder for {api_key.key_id}. Can't be deleted.",
+                    "x-api-key": f"{api_key_value}"
+                }
+            )
+
+        counter_function_associations = None
+        counter_read_methods = cloudfront.AllowedMethods.ALLOW_GET_HEAD
+        if counter_request_function:
+            # Preflights have to get past CloudFront to be answered
+            counter_read_methods = cloudfront.AllowedMethods.ALLOW_GET_HEAD_OPTIONS
+            counter_function = cloudfront.Function(self, "CounterRequestFunction",
+                code=cloudfront.FunctionCode.from_inline(render_function(
+                    COUNTER_REQUEST_FUNCTION,
+                    split_endpoints=str(counter_cache_ttl is not None).lower()
+                )),
+                runtime=cloudfront.FunctionRuntime.JS_2_0,
+                comment="Filter counter requests at the edge"
+            )
+            counter_function_associations = [
+                cloudfront.FunctionAssociation(
+                    function=counter_function,
+                    event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+                )
+            ]
+
+        if counter_cache_ttl is None:
+            # Every GET /counter counts a page view, so nothing may be cached
+            distribution.add_behavior(
+                path_pattern="/counter",
+                origin = counter_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                compress=profile.compress,
+                allowed_methods=counter_read_methods,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                function_associations=counter_function_associations
+            )
+        else:
+            # POST /counter/hit counts a page view and is never cached
+            distribution.add_behavior(
+                path_pattern="/counter/hit",
+                origin = counter_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                compress=profile.compress,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                function_associations=counter_function_associations
+            )
+
+            # GET /counter only reads the value, so repeat views and bots are
+            # answered from the edge for up to counter_cache_ttl. Multi-counter
+            # reads are cached per ?ids= list.
+            counter_cache_policy = cloudfront.CachePolicy(self, "CounterCachePolicy",
+                comment="Short-lived cache for counter reads",
+                default_ttl=counter_cache_ttl,
+                max_ttl=counter_cache_ttl,
+                min_ttl=Duration.seconds(0),
+                query_string_behavior=cloudfront.CacheQueryStringBehavior.allow_list("ids"),
+                enable_accept_encoding_gzip=True,
+                enable_accept_encoding_brotli=True
+            )
+
+            distribution.add_behavior(
+                path_pattern="/counter",
+                origin = counter_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                compress=profile.compress,
+                allowed_methods=counter_read_methods,
+                cache_policy=counter_cache_policy,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                function_associations=counter_function_associations
+            )
+
+        if counter_history_ttl is not None:
+            # Pages of counter history, cached per time range and page
+            history_cache_policy = cloudfront.CachePolicy(self, "CounterHistoryCachePolicy",
+                comment="Cache for counter history pages",
+                default_ttl=counter_history_ttl,
+                max_ttl=counter_history_ttl,
+                min_ttl=Duration.seconds(0),
+                query_string_behavior=cloudfront.CacheQueryStringBehavior.allow_list(
+                    "granularity", "from", "to", "limit", "next_token"
+                ),
+                enable_accept_encoding_gzip=True,
+                enable_accept_encoding_brotli=True
+            )
+
+            distribution.add_behavior(
+                path_pattern="/counter/history",
+                origin = counter_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                compress=profile.compress,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+                cache_policy=history_cache_policy,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER
+            )
         
         arn_components = ArnComponents(
             service="cloudfront",
@@ -266,6 +464,12 @@ class S3WebsiteStack(Stack):
             description="Custom Domain Name"
         )
 
+        # Where `python -m resume_iac.site_assets` uploads the site
+        CfnOutput(self, "WebsiteBucketName",
+            value=bucket.bucket_name,
+            description="Website Bucket Name"
+        )
+
         # output the distribution id
         CfnOutput(self, "DistributionId",
             value=distribution.distribution_id,
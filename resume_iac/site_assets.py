@@ -0,0 +1,370 @@
+"""Build and upload the static website to the S3WebsiteStack bucket.
+
+Every asset except HTML gets its content hash in the file name and an
+immutable, year-long Cache-Control, and the references to it in HTML and CSS
+are rewritten: src, href, srcset and imagesrcset attributes, CSS url() and
+@import. Stylesheets are fingerprinted after the stylesheets they import.
+Scripts are not rewritten, so a path built or written inside JavaScript
+would point at a name that is never uploaded; reference such files from
+HTML or CSS, or list them in UNHASHED_NAMES. HTML keeps its name and a short
+Cache-Control, so a deploy is live within a minute while everything it links
+to stays cached. Text files also get brotli (.br) and gzip (.gz) variants,
+which the distribution's precompressed-assets function serves to browsers
+that accept them.
+
+    python -m resume_iac.site_assets ./site --bucket <WebsiteBucketName>
+
+Only objects whose content changed are uploaded, a few at a time.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # only needed for .br variants
+    brotli = None
+
+HASHED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UNHASHED_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+# Variants written next to every compressible file, by Content-Encoding
+ENCODINGS = ("br", "gzip")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Kept under their own names: pages are what visitors and links point at
+HTML_EXTENSIONS = (".html", ".htm")
+
+# Names browsers and crawlers ask for directly, so they can't be fingerprinted
+UNHASHED_NAMES = ("robots.txt", "favicon.ico", "sitemap.xml")
+
+# Text types worth compressing. The precompressed-assets function rewrites
+# requests for these extensions only, so every one of them gets both variants.
+COMPRESSIBLE_EXTENSIONS = (".html", ".htm", ".css", ".js", ".mjs", ".json",
+                           ".svg", ".txt", ".xml", ".map")
+
+# Files whose references to other assets are rewritten. They are fingerprinted
+# after the assets they link to, so their own hash covers the rewritten links.
+REWRITTEN_EXTENSIONS = HTML_EXTENSIONS + (".css",)
+
+HASH_LENGTH = 10
+
+DEFAULT_MAX_WORKERS = 8
+
+# src="...", href="...", CSS url(...) and @import "..."
+REFERENCE_PATTERN = re.compile(
+    r"""(?P<prefix>(?:src|href)\s*=\s*["']|url\(\s*["']?|@import\s+["'])(?P<path>[^"')\s]+)"""
+)
+
+# srcset="a.png 1x, b.png 2x" and the preload link's imagesrcset
+SRCSET_PATTERN = re.compile(
+    r"""(?P<prefix>\b(?:srcset|imagesrcset)\s*=\s*(?P<quote>["']))(?P<candidates>.*?)(?P=quote)""",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+@dataclass(frozen=True)
+class SiteAsset:
+    """One object to put in the bucket."""
+    key: str
+    body: bytes
+    content_type: str
+    cache_control: str
+    content_encoding: Optional[str] = None
+
+    @property
+    def md5(self) -> str:
+        # S3 reports the MD5 as the ETag of objects uploaded in one part
+        return hashlib.md5(self.body).hexdigest()
+
+
+def content_type(path: str) -> str:
+    guessed, _ = mimetypes.guess_type(path)
+    guessed = guessed or "application/octet-stream"
+    if guessed.startswith("text/") or guessed in ("application/javascript", "application/json"):
+        guessed += "; charset=utf-8"
+    return guessed
+
+
+def fingerprint(path: str, body: bytes) -> str:
+    """"css/site.css" -> "css/site.<hash>.css"."""
+    root, extension = posixpath.splitext(path)
+    digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+    return f"{root}.{digest}{extension}"
+
+
+def is_hashed(path: str) -> bool:
+    return (not path.endswith(HTML_EXTENSIONS)
+            and posixpath.basename(path) not in UNHASHED_NAMES)
+
+
+def is_page(asset: SiteAsset) -> bool:
+    # Compressed variants end in .br or .gz after the page's own extension
+    key = asset.key
+    if asset.content_encoding:
+        key = key[:-len(ENCODING_SUFFIXES[asset.content_encoding])]
+    return key.endswith(HTML_EXTENSIONS)
+
+
+def resolve_reference(reference: str, directory: str) -> Optional[str]:
+    """The key a relative or root-relative link points at, None for others."""
+    if re.match(r"^(?:[a-z][a-z0-9+.-]*:|//|#)", reference, re.IGNORECASE):
+        return None
+
+    target = re.match(r"[^?#]*", reference).group()
+    if target.startswith("/"):
+        return posixpath.normpath(target.lstrip("/"))
+    return posixpath.normpath(posixpath.join(directory, target))
+
+
+def rewrite_reference(reference: str, directory: str, renamed: dict) -> str:
+    """The fingerprinted name of one relative or root-relative link."""
+    resolved = resolve_reference(reference, directory)
+    if resolved not in renamed:
+        return reference
+
+    target, separator, suffix = re.match(r"([^?#]*)([?#]?)(.*)", reference).groups()
+
+    if target.startswith("/"):
+        new_target = "/" + renamed[resolved]
+    else:
+        new_target = posixpath.relpath(renamed[resolved], directory or ".")
+    return f"{new_target}{separator}{suffix}"
+
+
+def rewrite_references(path: str, text: str, renamed: dict) -> str:
+    """Point relative and root-relative links in `text` at fingerprinted names."""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        return match.group("prefix") + rewrite_reference(match.group("path"), directory, renamed)
+
+    def replace_srcset(match):
+        # Comma-separated candidates, each a URL and an optional descriptor
+        candidates = []
+        for candidate in match.group("candidates").split(","):
+            url, *descriptor = candidate.split()
+            candidates.append(" ".join([rewrite_reference(url, directory, renamed), *descriptor])
+                              if url else candidate)
+        return f"{match.group('prefix')}{', '.join(candidates)}{match.group('quote')}"
+
+    text = SRCSET_PATTERN.sub(replace_srcset, text)
+    return REFERENCE_PATTERN.sub(replace, text)
+
+
+def linked_paths(path: str, text: str) -> set:
+    """Keys of the files `text` links to with a rewritable reference."""
+    directory = posixpath.dirname(path)
+    references = [match.group("path") for match in REFERENCE_PATTERN.finditer(text)]
+    for match in SRCSET_PATTERN.finditer(text):
+        references += [candidate.split()[0] for candidate in match.group("candidates").split(",")
+                       if candidate.strip()]
+    return {resolve_reference(reference, directory) for reference in references} - {None}
+
+
+def stylesheet_order(files: dict) -> list:
+    """The stylesheets in `files`, each after the stylesheets it links to.
+
+    A stylesheet's fingerprint covers the rewritten names of its imports, so
+    imports that form a cycle can't all be fingerprinted and are an error.
+    """
+    stylesheets = sorted(key for key in files if key.endswith(".css"))
+    ordered = []
+    visiting = []
+
+    def visit(path):
+        if path in ordered:
+            return
+        if path in visiting:
+            cycle = visiting[visiting.index(path):] + [path]
+            raise ValueError(f"stylesheets link to each other in a cycle: {' -> '.join(cycle)}")
+        visiting.append(path)
+        linked = linked_paths(path, files[path].decode("utf-8"))
+        for dependency in sorted(linked & set(stylesheets)):
+            visit(dependency)
+        visiting.pop()
+        ordered.append(path)
+
+    for path in stylesheets:
+        visit(path)
+    return ordered
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    # mtime=0 keeps the output, and so the ETag, stable between builds
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def compressed_variants(asset: SiteAsset, encodings=ENCODINGS) -> list:
+    """Compressed copies of a text asset, stored next to it."""
+    return [
+        SiteAsset(key=asset.key + ENCODING_SUFFIXES[encoding],
+            body=compress(asset.body, encoding),
+            content_type=asset.content_type,
+            cache_control=asset.cache_control,
+            content_encoding=encoding
+        )
+        for encoding in encodings
+    ]
+
+
+def read_site(source_dir: str) -> dict:
+    """Bucket key -> file content for everything under `source_dir`."""
+    files = {}
+    for root, dirs, names in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                files[key] = f.read()
+    return files
+
+
+def build_site(source_dir: str, encodings=ENCODINGS) -> list:
+    """Fingerprint, rewrite and compress the site in `source_dir`.
+
+    The precompressed-assets function sends browsers to the .br and .gz
+    variants without checking they exist, so a deployed site needs both.
+    """
+    unknown = set(encodings) - set(ENCODINGS)
+    if unknown:
+        raise ValueError(f"encodings must be among {ENCODINGS}")
+    if "br" in encodings and brotli is None:
+        raise RuntimeError("brotli variants need the brotli package (pip install -r requirements-dev.txt)")
+
+    files = read_site(source_dir)
+
+    # Assets that link to others go last, so the names they link to are known
+    ordered = (sorted(key for key in files if not key.endswith(REWRITTEN_EXTENSIONS))
+               + stylesheet_order(files)
+               + sorted(key for key in files if key.endswith(HTML_EXTENSIONS)))
+    renamed = {}
+    assets = []
+
+    for path in ordered:
+        body = files[path]
+        if path.endswith(REWRITTEN_EXTENSIONS):
+            text = body.decode("utf-8")
+            body = rewrite_references(path, text, renamed).encode("utf-8")
+
+        if is_hashed(path):
+            key = renamed[path] = fingerprint(path, body)
+            cache_control = HASHED_CACHE_CONTROL
+        else:
+            key = path
+            cache_control = UNHASHED_CACHE_CONTROL
+
+        asset = SiteAsset(key=key,
+            body=body,
+            content_type=content_type(path),
+            cache_control=cache_control
+        )
+        assets.append(asset)
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            assets.extend(compressed_variants(asset, encodings))
+
+    return assets
+
+
+def uploaded_etags(s3_client, bucket: str) -> dict:
+    """Key -> ETag of every object in the bucket, from one listing."""
+    etags = {}
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket):
+        for item in page.get("Contents", []):
+            etags[item["Key"]] = item["ETag"].strip('"')
+    return etags
+
+
+def changed_assets(s3_client, bucket: str, assets: list) -> list:
+    """The assets whose content differs from what is in the bucket.
+
+    Compares MD5s with the listed ETags, which holds for objects put in a
+    single part with SSE-S3, as the website bucket stores them.
+    """
+    etags = uploaded_etags(s3_client, bucket)
+    return [asset for asset in assets if etags.get(asset.key) != asset.md5]
+
+
+def upload_asset(s3_client, bucket: str, asset: SiteAsset) -> str:
+    extra = {}
+    if asset.content_encoding:
+        extra["ContentEncoding"] = asset.content_encoding
+    s3_client.put_object(Bucket=bucket,
+        Key=asset.key,
+        Body=asset.body,
+        ContentType=asset.content_type,
+        CacheControl=asset.cache_control,
+        **extra
+    )
+    return asset.key
+
+
+def upload_assets(s3_client, bucket: str, assets: list,
+                max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """Put `assets` in the bucket, at most `max_workers` at a time.
+
+    Pages go up after everything else, so no page is live before the assets
+    it links to.
+    """
+    pages = [asset for asset in assets if is_page(asset)]
+    others = [asset for asset in assets if not is_page(asset)]
+
+    uploaded = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in (others, pages):
+            uploaded += executor.map(lambda asset: upload_asset(s3_client, bucket, asset), batch)
+    return uploaded
+
+
+def deploy_site(source_dir: str, bucket: str, s3_client=None,
+                max_workers: int = DEFAULT_MAX_WORKERS,
+                encodings=ENCODINGS) -> dict:
+    """Build the site and upload what changed. Returns the keys by outcome."""
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+
+    assets = build_site(source_dir, encodings)
+    changed = changed_assets(s3_client, bucket, assets)
+    uploaded = upload_assets(s3_client, bucket, changed, max_workers=max_workers)
+    changed_keys = set(uploaded)
+
+    return {
+        "uploaded": sorted(uploaded),
+        "unchanged": sorted(asset.key for asset in assets if asset.key not in changed_keys),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source_dir", help="directory with the built website")
+    parser.add_argument("--bucket", required=True, help="WebsiteBucketName output of S3WebsiteStack")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="most uploads in flight at once")
+    args = parser.parse_args(argv)
+
+    result = deploy_site(args.source_dir, args.bucket, max_workers=args.max_workers)
+    print(json.dumps({
+        "uploaded": len(result["uploaded"]),
+        "unchanged": len(result["unchanged"]),
+        "keys": result["uploaded"],
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+from moto import mock_dynamodb
+import boto3
+
+TABLE_NAME = 'test-table'
+
+# The counter Lambda builds its DynamoDB client at import time, so the
+# environment it reads has to be in place before any test module imports it.
+os.environ.setdefault('COUNTER_TABLE_NAME', TABLE_NAME)
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+@pytest.fixture
+def counter_table():
+    with mock_dynamodb():
+        resource = boto3.resource('dynamodb', region_name='us-east-1')
+        test_table =resource.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {
+                    'AttributeName': 'id', 
+                    'KeyType': 'HASH'
+                }
+            ],
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'id', 
+                    'AttributeType': 'N'
+                }
+            ],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+
+        # test_table.put_item(Item={'id': 1, 'counter': 0})
+        yield test_table
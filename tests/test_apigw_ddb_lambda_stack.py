@@ -10,9 +10,11 @@ from aws_cdk import (
 )
 
 import aws_cdk as cdk
+import pytest
 from aws_cdk.assertions import Capture, Template, Match
 
-from app import ApiDdbLambdaStack
+from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack
+from resume_iac.profiles import LAMBDA_PROFILES, TABLE_PROFILES
 
 def test_synthesizes_properly():
     app = cdk.App()
@@ -31,3 +33,789 @@ def test_synthesizes_properly():
             "Runtime": "python3.9"
         }
     )
+
+def test_counter_shards_environment():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", counter_shards=10)
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Environment": {
+                "Variables": Match.object_like({"COUNTER_SHARDS": "10"})
+            }
+        }
+    )
+
+def test_counter_batch_limit_environment():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Environment": {
+                "Variables": Match.object_like({"COUNTER_MAX_BATCH": "50"})
+            }
+        }
+    )
+
+def test_direct_integration():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", counter_integration="direct")
+
+    template = Template.from_stack(backend_stack)
+
+    # No counter Lambda on the request path
+    assert template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"Handler": "index.lambda_handler"}
+    }) == {}
+
+    role = Capture()
+    request_template = Capture()
+    response_template = Capture()
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "GET",
+            "ApiKeyRequired": True,
+            "Integration": {
+                "Type": "AWS",
+                "IntegrationHttpMethod": "POST",
+                "PassthroughBehavior": "NEVER",
+                "Credentials": {"Fn::GetAtt": [role, "Arn"]},
+                "Uri": {"Fn::Join": ["", Match.array_with([
+                    Match.string_like_regexp(":dynamodb:action/UpdateItem")
+                ])]},
+                "RequestTemplates": {"application/json": request_template},
+                "IntegrationResponses": Match.array_with([Match.object_like({
+                    "StatusCode": "200",
+                    "ResponseTemplates": {"application/json": response_template},
+                })]),
+            }
+        }
+    )
+
+    assert "ADD #counter :increment" in str(request_template.as_object())
+    assert "UPDATED_NEW" in str(request_template.as_object())
+    assert "$inputRoot.Attributes.counter.N" in response_template.as_string()
+
+    template.has_resource_properties("AWS::IAM::Role", {
+            "AssumeRolePolicyDocument": {
+                "Statement": [Match.object_like({
+                    "Principal": {"Service": "apigateway.amazonaws.com"}
+                })]
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": [Match.object_like({"Action": "dynamodb:UpdateItem"})]
+            },
+            "Roles": [{"Ref": role.as_string()}]
+        }
+    )
+
+
+def test_direct_integration_rejects_shards():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", counter_integration="direct", counter_shards=4)
+
+def test_split_counter_endpoints():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", split_counter_endpoints=True)
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::ApiGateway::Resource", {"PathPart": "hit"})
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "GET",
+            "OperationName": "GetCounter",
+            "Integration": {"Type": "AWS_PROXY"}
+        }
+    )
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "POST",
+            "OperationName": "HitCounter",
+            "ApiKeyRequired": True,
+            "Integration": {"Type": "AWS_PROXY"}
+        }
+    )
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_SPLIT_ENDPOINTS": "true",
+                    "COUNTER_READ_MAX_AGE": "5",
+                })
+            }
+        }
+    )
+
+    assert backend_stack.counter_read_max_age.to_seconds() == 5
+
+
+def test_split_counter_endpoints_direct():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        counter_integration="direct",
+        split_counter_endpoints=True
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "GET",
+            "Integration": {
+                "Uri": {"Fn::Join": ["", Match.array_with([
+                    Match.string_like_regexp(":dynamodb:action/GetItem")
+                ])]},
+                "IntegrationResponses": Match.array_with([Match.object_like({
+                    "StatusCode": "200",
+                    "ResponseParameters": {
+                        "method.response.header.Cache-Control": "'public, max-age=5'"
+                    },
+                })]),
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "POST",
+            "Integration": {
+                "Uri": {"Fn::Join": ["", Match.array_with([
+                    Match.string_like_regexp(":dynamodb:action/UpdateItem")
+                ])]},
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([
+                    Match.object_like({"Action": "dynamodb:UpdateItem"}),
+                    Match.object_like({"Action": "dynamodb:GetItem"}),
+                ])
+            }
+        }
+    )
+
+def test_queue_integration():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        counter_integration="queue",
+        split_counter_endpoints=True
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::SQS::Queue", 2)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.queue_handler",
+        }
+    )
+
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+            "BatchSize": 100,
+            "MaximumBatchingWindowInSeconds": 5,
+        }
+    )
+
+    role = Capture()
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "POST",
+            "OperationName": "HitCounter",
+            "Integration": {
+                "Type": "AWS",
+                "Credentials": {"Fn::GetAtt": [role, "Arn"]},
+                "Uri": {"Fn::Join": ["", Match.array_with([
+                    Match.string_like_regexp(":sqs:path/")
+                ])]},
+                "RequestTemplates": {
+                    "application/json": Match.string_like_regexp("Action=SendMessage")
+                },
+                "IntegrationResponses": Match.array_with([Match.object_like({
+                    "StatusCode": "202",
+                })]),
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": [Match.object_like({
+                    "Action": Match.array_with(["sqs:SendMessage"])
+                })]
+            },
+            "Roles": [{"Ref": role.as_string()}]
+        }
+    )
+
+    # Reads still go through the counter Lambda
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "GET",
+            "Integration": {"Type": "AWS_PROXY"}
+        }
+    )
+
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+            "MethodSettings": Match.array_with([Match.object_like({
+                "ThrottlingRateLimit": 100,
+                "ThrottlingBurstLimit": 200,
+            })])
+        }
+    )
+
+
+def test_queue_integration_requires_split_endpoints():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", counter_integration="queue")
+
+def test_tracing_and_log_level():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", tracing=True, log_level="DEBUG")
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "TracingConfig": {"Mode": "Active"},
+            "Environment": {
+                "Variables": Match.object_like({"LOG_LEVEL": "DEBUG"})
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+            "TracingEnabled": True
+        }
+    )
+
+
+def test_tracing_disabled_by_default():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "TracingConfig": Match.absent(),
+        }
+    )
+
+@pytest.mark.parametrize("profile_name", sorted(LAMBDA_PROFILES))
+def test_performance_profile(profile_name):
+    profile = LAMBDA_PROFILES[profile_name]
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", performance_profile=profile_name)
+
+    template = Template.from_stack(backend_stack)
+
+    def or_absent(value):
+        return Match.absent() if value is None else value
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Runtime": profile.runtime.name,
+            "Architectures": [profile.architecture.name],
+            "MemorySize": or_absent(profile.memory_size),
+            "Timeout": or_absent(profile.timeout and profile.timeout.to_seconds()),
+            "ReservedConcurrentExecutions": or_absent(profile.reserved_concurrency),
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_FUNCTION_TIMEOUT": str(profile.timeout.to_seconds() if profile.timeout else 3)
+                })
+            },
+        }
+    )
+
+    if profile.provisioned_concurrency:
+        template.has_resource_properties("AWS::Lambda::Alias", {
+                "Name": "live",
+                "ProvisionedConcurrencyConfig": {
+                    "ProvisionedConcurrentExecutions": profile.provisioned_concurrency
+                }
+            }
+        )
+
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+                "MinCapacity": profile.provisioned_concurrency,
+                "MaxCapacity": profile.max_provisioned_concurrency,
+                "ScalableDimension": "lambda:function:ProvisionedConcurrency",
+            }
+        )
+
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+                "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+                    "TargetValue": profile.provisioned_utilization_target
+                })
+            }
+        )
+
+        # API Gateway invokes the alias, not the unqualified function
+        template.has_resource_properties("AWS::ApiGateway::Method", {
+                "HttpMethod": "GET",
+                "Integration": {
+                    "Uri": {"Fn::Join": ["", Match.array_with([
+                        {"Ref": Match.string_like_regexp("CounterLambdaAlias")}
+                    ])]}
+                }
+            }
+        )
+    else:
+        template.resource_count_is("AWS::Lambda::Alias", 0)
+        template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 0)
+
+
+def test_performance_profile_from_context():
+    app = cdk.App(context={"performance_profile": "low-cost"})
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Architectures": ["arm64"],
+            "MemorySize": 256,
+        }
+    )
+
+
+def test_unknown_performance_profile():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", performance_profile="turbo")
+
+
+def test_unique_visitors():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", unique_visitors=True)
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+            "TableName": "counter-table",
+            "TimeToLiveSpecification": {
+                "AttributeName": "expires_at",
+                "Enabled": True
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Environment": {
+                "Variables": Match.object_like({"COUNTER_UNIQUE_VISITORS": "true"})
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([Match.object_like({
+                    "Action": Match.array_with(["dynamodb:PutItem", "dynamodb:DeleteItem"])
+                })])
+            }
+        }
+    )
+
+
+def test_unique_visitors_requires_lambda_integration():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack",
+            counter_integration="direct",
+            unique_visitors=True
+        )
+
+
+def test_counter_history():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", counter_history=True)
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+            "KeySchema": [
+                {"AttributeName": "series", "KeyType": "HASH"},
+                {"AttributeName": "bucket", "KeyType": "RANGE"},
+            ]
+        }
+    )
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_HISTORY_TABLE_NAME": Match.any_value(),
+                    "COUNTER_HISTORY_MAX_AGE": "60",
+                })
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([Match.object_like({
+                    "Action": ["dynamodb:UpdateItem", "dynamodb:Query"]
+                })])
+            }
+        }
+    )
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+            "HttpMethod": "GET",
+            "OperationName": "GetCounterHistory",
+            "ApiKeyRequired": True
+        }
+    )
+
+    assert backend_stack.counter_history_max_age.to_seconds() == 60
+
+
+def test_counter_history_disabled_by_default():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::DynamoDB::Table", 1)
+    assert backend_stack.counter_history_max_age is None
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"counter_integration": "direct"},
+    {"counter_shards": 4},
+])
+def test_counter_history_unsupported(kwargs):
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", counter_history=True, **kwargs)
+
+
+def test_lambda_cache_and_hit_buffering():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        lambda_cache_ttl=cdk.Duration.seconds(10),
+        hit_flush_threshold=25
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_CACHE_TTL": "10",
+                    "COUNTER_CACHE_SIZE": "1000",
+                    "COUNTER_BUFFER_HITS": "true",
+                    "COUNTER_FLUSH_THRESHOLD": "25",
+                })
+            }
+        }
+    )
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"hit_flush_threshold": 25},
+    {"hit_flush_threshold": -1, "lambda_cache_ttl": cdk.Duration.seconds(10)},
+    {"hit_flush_threshold": 25, "lambda_cache_ttl": cdk.Duration.seconds(10),
+     "counter_integration": "queue", "split_counter_endpoints": True},
+])
+def test_hit_buffering_unsupported(kwargs):
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", **kwargs)
+
+
+def test_rest_api_by_default():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::ApiGateway::RestApi", 1)
+    template.resource_count_is("AWS::ApiGatewayV2::Api", 0)
+    template.resource_count_is("AWS::SecretsManager::Secret", 0)
+    assert backend_stack.http_api is None
+
+
+def test_http_api():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        api_type="http",
+        split_counter_endpoints=True
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::ApiGateway::RestApi", 0)
+    template.resource_count_is("AWS::ApiGateway::UsagePlan", 0)
+    template.resource_count_is("AWS::ApiGateway::ApiKey", 0)
+    template.resource_count_is("Custom::AWS", 0)
+
+    template.has_resource_properties("AWS::ApiGatewayV2::Api", {
+            "ProtocolType": "HTTP",
+        }
+    )
+    template.has_resource_properties("AWS::ApiGatewayV2::Integration", {
+            "IntegrationType": "AWS_PROXY",
+            "PayloadFormatVersion": "2.0",
+        }
+    )
+    template.has_resource_properties("AWS::ApiGatewayV2::Stage", {
+            "StageName": "$default",
+            "AutoDeploy": True,
+            "DefaultRouteSettings": {
+                "ThrottlingRateLimit": 10,
+                "ThrottlingBurstLimit": 2,
+            },
+        }
+    )
+    for route_key in ("GET /counter", "POST /counter/hit"):
+        template.has_resource_properties("AWS::ApiGatewayV2::Route", {
+                "RouteKey": route_key,
+            }
+        )
+
+    template.has_resource_properties("AWS::SecretsManager::Secret", {
+            "GenerateSecretString": Match.object_like({
+                "ExcludePunctuation": True,
+                "PasswordLength": 32,
+            })
+        }
+    )
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_ORIGIN_SECRET_ID": Match.any_value(),
+                })
+            }
+        }
+    )
+    template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([
+                    Match.object_like({
+                        "Action": Match.array_with(["secretsmanager:GetSecretValue"]),
+                    })
+                ])
+            }
+        }
+    )
+
+
+def test_http_api_from_context():
+    app = cdk.App(context={"counter_api_type": "http"})
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    assert backend_stack.http_api is not None
+    assert backend_stack.rest_api is None
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"api_type": "websocket"},
+    {"api_type": "http", "counter_integration": "direct"},
+    {"api_type": "http", "counter_integration": "queue", "split_counter_endpoints": True},
+])
+def test_api_type_unsupported(kwargs):
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", **kwargs)
+
+
+def test_rest_api_key_origin_auth_by_default():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::ApiGateway::ApiKey", 1)
+    template.resource_count_is("AWS::ApiGateway::UsagePlan", 1)
+    # getApiKey runs in a singleton Lambda on every create and update
+    template.resource_count_is("Custom::AWS", 1)
+    assert backend_stack.api_key_value is not None
+    assert backend_stack.origin_secret is None
+
+
+def test_rest_api_secret_origin_auth():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        origin_auth="secret",
+        split_counter_endpoints=True,
+        counter_history=True
+    )
+    default_stack = ApiDdbLambdaStack(app, "DefaultStack",
+        split_counter_endpoints=True,
+        counter_history=True
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    template.resource_count_is("AWS::ApiGateway::RestApi", 1)
+    template.resource_count_is("AWS::ApiGateway::ApiKey", 0)
+    template.resource_count_is("AWS::ApiGateway::UsagePlan", 0)
+    template.resource_count_is("Custom::AWS", 0)
+    template.resource_count_is("AWS::SecretsManager::Secret", 1)
+
+    methods = template.find_resources("AWS::ApiGateway::Method")
+    assert len(methods) == 3
+    assert all(not method["Properties"].get("ApiKeyRequired") for method in methods.values())
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "index.lambda_handler",
+            "Environment": {
+                "Variables": Match.object_like({
+                    "COUNTER_ORIGIN_SECRET_ID": Match.any_value(),
+                })
+            }
+        }
+    )
+    # The stage still throttles every method
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+            "MethodSettings": Match.array_with([
+                Match.object_like({"ThrottlingRateLimit": 10, "ThrottlingBurstLimit": 2})
+            ])
+        }
+    )
+
+    resources = template.to_json()["Resources"]
+    default_resources = Template.from_stack(default_stack).to_json()["Resources"]
+    assert len(resources) < len(default_resources)
+    assert backend_stack.api_key is None
+    assert backend_stack.origin_secret is not None
+
+
+def test_origin_auth_from_context():
+    app = cdk.App(context={"counter_origin_auth": "secret"})
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    assert backend_stack.rest_api is not None
+    assert backend_stack.origin_secret is not None
+    assert backend_stack.api_key is None
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"origin_auth": "header"},
+    {"origin_auth": "api-key", "api_type": "http"},
+    {"origin_auth": "secret", "counter_integration": "direct"},
+    {"origin_auth": "secret", "counter_integration": "queue", "split_counter_endpoints": True},
+])
+def test_origin_auth_unsupported(kwargs):
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", **kwargs)
+
+
+@pytest.mark.parametrize("profile_name", sorted(TABLE_PROFILES))
+def test_table_profile(profile_name):
+    profile = TABLE_PROFILES[profile_name]
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack",
+        table_profile=profile_name,
+        counter_history=True
+    )
+
+    template = Template.from_stack(backend_stack)
+
+    def enabled_or_absent(enabled, value):
+        return value if enabled else Match.absent()
+
+    expected = {
+        # Provisioned is what CloudFormation assumes without a BillingMode
+        "BillingMode": Match.absent() if profile.provisioned else "PAY_PER_REQUEST",
+        "ProvisionedThroughput": enabled_or_absent(profile.provisioned, {
+            "ReadCapacityUnits": profile.min_read_capacity,
+            "WriteCapacityUnits": profile.min_write_capacity,
+        }),
+        "TableClass": enabled_or_absent(profile.table_class, profile.table_class and profile.table_class.value),
+        "ContributorInsightsSpecification": enabled_or_absent(profile.contributor_insights, {"Enabled": True}),
+        "DeletionProtectionEnabled": enabled_or_absent(profile.deletion_protection, True),
+        "PointInTimeRecoverySpecification": enabled_or_absent(profile.point_in_time_recovery, {
+            "PointInTimeRecoveryEnabled": True
+        }),
+    }
+
+    # The counter and history tables both follow the profile
+    tables = template.find_resources("AWS::DynamoDB::Table", {"Properties": expected})
+    assert len(tables) == 2
+
+    removal = "Retain" if profile.removal_policy == cdk.RemovalPolicy.RETAIN else "Delete"
+    for table in tables.values():
+        assert table["DeletionPolicy"] == removal
+
+    if profile.provisioned:
+        # Reads and writes of both tables
+        template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 4)
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+                "ScalableDimension": "dynamodb:table:WriteCapacityUnits",
+                "MinCapacity": profile.min_write_capacity,
+                "MaxCapacity": profile.max_write_capacity,
+            }
+        )
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+                "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+                    "TargetValue": profile.utilization_target,
+                    "PredefinedMetricSpecification": {
+                        "PredefinedMetricType": "DynamoDBWriteCapacityUtilization"
+                    },
+                })
+            }
+        )
+    else:
+        template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 0)
+
+
+def test_table_profile_from_context():
+    app = cdk.App(context={"table_profile": "production"})
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack")
+
+    Template.from_stack(backend_stack).has_resource_properties("AWS::DynamoDB::Table", {
+            "DeletionProtectionEnabled": True,
+        }
+    )
+
+
+def test_unknown_table_profile():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack", table_profile="huge")
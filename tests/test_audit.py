@@ -0,0 +1,331 @@
+import copy
+import json
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk.assertions import Template
+
+from resume_iac import audit
+from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack
+from resume_iac.audit import CACHING_DISABLED, AuditOptions, audit_templates
+from resume_iac.factory import create_app
+from resume_iac.s3_website__stack import S3WebsiteStack
+
+ENV = cdk.Environment(account="123456789012", region="us-east-1")
+
+
+def synth_templates(website=True, **api_kwargs):
+    """Stack name -> template of a counter API and, optionally, the website."""
+    app = create_app(offline=True)
+    stacks = [ApiDdbLambdaStack(app, "ApiGwDdbStack", env=ENV, **api_kwargs)]
+    api = stacks[0]
+
+    if website:
+        stacks.append(S3WebsiteStack(app, "S3WebsiteStack",
+            domain_name="example.com",
+            rest_api=api.rest_api,
+            api_key=api.api_key,
+            api_key_value=api.api_key_value,
+            counter_cache_ttl=api.counter_read_max_age,
+            counter_history_ttl=api.counter_history_max_age,
+            env=ENV
+        ))
+
+    # Every stack has to exist before the first one is synthesized
+    return {stack.stack_name: Template.from_stack(stack).to_json() for stack in stacks}
+
+
+@pytest.fixture(scope="module")
+def default_templates():
+    return synth_templates()
+
+
+@pytest.fixture(scope="module")
+def tuned_templates():
+    return synth_templates(split_counter_endpoints=True, performance_profile="low-latency")
+
+
+def findings_of(templates, rule, **options):
+    return audit_templates(templates, AuditOptions(**options), rules=[rule])
+
+
+def distribution_config(template):
+    [distribution] = audit.resources(template, "AWS::CloudFront::Distribution").values()
+    return distribution["Properties"]["DistributionConfig"]
+
+
+def test_caching_counter_reads_uncached_by_design(default_templates):
+    [finding] = findings_of(default_templates, "caching")
+
+    assert finding.severity == "info"
+    assert finding.stack == "S3WebsiteStack"
+
+
+def test_caching_split_endpoints_cache_reads(tuned_templates):
+    assert findings_of(tuned_templates, "caching") == []
+
+
+def test_caching_disabled_for_split_reads(tuned_templates):
+    templates = copy.deepcopy(tuned_templates)
+    config = distribution_config(templates["S3WebsiteStack"])
+    [read] = [b for b in config["CacheBehaviors"] if b["PathPattern"] == "/counter"]
+    read["CachePolicyId"] = CACHING_DISABLED
+
+    [finding] = findings_of(templates, "caching")
+
+    assert finding.severity == "error"
+    assert "/counter" in finding.message
+
+
+def test_caching_disabled_for_static_files(default_templates):
+    templates = copy.deepcopy(default_templates)
+    distribution_config(templates["S3WebsiteStack"])["DefaultCacheBehavior"]["CachePolicyId"] = CACHING_DISABLED
+
+    assert "error" in {finding.severity for finding in findings_of(templates, "caching")}
+
+
+def test_caching_legacy_forwarded_values(default_templates):
+    templates = copy.deepcopy(default_templates)
+    default_behavior = distribution_config(templates["S3WebsiteStack"])["DefaultCacheBehavior"]
+    del default_behavior["CachePolicyId"]
+    default_behavior["ForwardedValues"] = {"QueryString": True}
+
+    assert any("no cache policy" in finding.message
+               for finding in findings_of(templates, "caching"))
+
+
+def test_caching_wide_cache_key(tuned_templates):
+    templates = copy.deepcopy(tuned_templates)
+    [policy] = audit.resources(templates["S3WebsiteStack"], "AWS::CloudFront::CachePolicy").values()
+    key = policy["Properties"]["CachePolicyConfig"]["ParametersInCacheKeyAndForwardedToOrigin"]
+    key["CookiesConfig"] = {"CookieBehavior": "all"}
+
+    [finding] = findings_of(templates, "caching")
+
+    assert finding.severity == "warning"
+    assert "cookies" in finding.message
+
+
+def test_compression_enabled(default_templates, tuned_templates):
+    assert findings_of(default_templates, "compression") == []
+    assert findings_of(tuned_templates, "compression") == []
+
+
+def test_compression_off(default_templates):
+    templates = copy.deepcopy(default_templates)
+    distribution_config(templates["S3WebsiteStack"])["DefaultCacheBehavior"]["Compress"] = False
+
+    [finding] = findings_of(templates, "compression")
+
+    assert "behavior *" in finding.message
+
+
+def test_compression_missing_from_cache_key(tuned_templates):
+    templates = copy.deepcopy(tuned_templates)
+    [policy] = audit.resources(templates["S3WebsiteStack"], "AWS::CloudFront::CachePolicy").values()
+    key = policy["Properties"]["CachePolicyConfig"]["ParametersInCacheKeyAndForwardedToOrigin"]
+    key["EnableAcceptEncodingBrotli"] = False
+
+    [finding] = findings_of(templates, "compression")
+
+    assert "brotli" in finding.message
+
+
+def test_lambda_compute_defaults(default_templates):
+    findings = findings_of(default_templates, "lambda-compute")
+
+    assert {(finding.severity, finding.resource.startswith("CounterLambda")) for finding in findings} == {
+        ("warning", True), ("info", True),
+    }
+
+
+def test_lambda_compute_profile(tuned_templates):
+    # The low-latency profile sets the memory and runs on arm64
+    assert findings_of(tuned_templates, "lambda-compute") == []
+
+
+def test_throttling_within_limits(default_templates):
+    findings = findings_of(default_templates, "throttling", expected_rps=2)
+
+    assert findings == []
+
+
+def test_throttling_burst_below_expected_rate(default_templates):
+    findings = findings_of(default_templates, "throttling", expected_rps=5)
+
+    assert findings
+    assert {finding.severity for finding in findings} == {"warning"}
+
+
+def test_throttling_rate_below_expected_rate(default_templates):
+    findings = findings_of(default_templates, "throttling", expected_rps=50)
+
+    errors = [finding for finding in findings if finding.severity == "error"]
+    # The stage, the usage plan and its per-method limit all stop at 10/s
+    assert len(errors) == 3
+
+
+def test_throttling_http_api_and_concurrency():
+    templates = synth_templates(website=False, api_type="http", performance_profile="low-cost")
+
+    findings = findings_of(templates, "throttling", expected_rps=200, expected_latency_ms=100)
+
+    resource_types = {templates["ApiGwDdbStack"]["Resources"][finding.resource]["Type"]
+                      for finding in findings if finding.severity == "error"}
+    # 200 requests/s at 100 ms need 20 environments; low-cost reserves 10
+    assert resource_types == {"AWS::ApiGatewayV2::Stage", "AWS::Lambda::Function"}
+
+
+def test_hot_keys_single_counter_item(default_templates):
+    assert findings_of(default_templates, "hot-keys", expected_rps=100) == []
+
+    [finding] = findings_of(default_templates, "hot-keys", expected_rps=2000)
+
+    assert finding.severity == "error"
+    assert finding.resource.startswith("CounterTable")
+
+
+def test_hot_keys_sharded_counter():
+    templates = synth_templates(website=False, counter_shards=4)
+
+    [finding] = findings_of(templates, "hot-keys", expected_rps=2400)
+
+    # 600 writes/s per shard is over half a partition
+    assert finding.severity == "warning"
+
+
+def test_hot_keys_queue_batches_writes():
+    templates = synth_templates(website=False,
+        counter_integration="queue",
+        split_counter_endpoints=True
+    )
+
+    assert findings_of(templates, "hot-keys", expected_rps=5000) == []
+
+
+def reordered_functions(template, first):
+    """A copy of `template` with the `first` functions ahead of the rest."""
+    template = copy.deepcopy(template)
+    resources = template["Resources"]
+    template["Resources"] = {
+        **{logical_id: resources[logical_id] for logical_id in first},
+        **{logical_id: resource for logical_id, resource in resources.items()
+           if logical_id not in first},
+    }
+    return template
+
+
+@pytest.fixture(scope="module")
+def queue_templates():
+    # The counter Lambda only reads the table the queue consumer writes
+    return synth_templates(website=False,
+        counter_integration="queue",
+        split_counter_endpoints=True
+    )
+
+
+def test_hot_keys_reader_does_not_hide_writer(queue_templates):
+    template = queue_templates["ApiGwDdbStack"]
+    functions = audit.app_functions(template)
+    assert len(functions) == 2
+
+    for first in (list(functions), list(reversed(functions))):
+        templates = {"ApiGwDdbStack": reordered_functions(template, first)}
+        assert findings_of(templates, "hot-keys", expected_rps=5000) == []
+
+
+def test_hot_keys_hottest_writer():
+    templates = synth_templates(website=False, counter_shards=4)
+    template = templates["ApiGwDdbStack"]
+    [(function_id, function)] = [
+        (logical_id, function) for logical_id, function in audit.app_functions(template).items()
+        if function["Properties"]["Handler"] == "index.lambda_handler"
+    ]
+    # A second writer of the same table that doesn't shard
+    unsharded = copy.deepcopy(function)
+    unsharded["Properties"]["Environment"]["Variables"]["COUNTER_SHARDS"] = "1"
+    template["Resources"]["UnshardedWriter"] = unsharded
+
+    for first in ([function_id], ["UnshardedWriter"]):
+        templates = {"ApiGwDdbStack": reordered_functions(template, first)}
+        [finding] = findings_of(templates, "hot-keys", expected_rps=2000)
+        assert finding.severity == "error"
+
+
+def test_hot_keys_table_without_writer(default_templates):
+    templates = copy.deepcopy(default_templates)
+    resources = templates["ApiGwDdbStack"]["Resources"]
+    for logical_id in audit.app_functions(templates["ApiGwDdbStack"]):
+        del resources[logical_id]
+
+    assert findings_of(templates, "hot-keys", expected_rps=5000) == []
+
+
+def test_hot_keys_provisioned_capacity(default_templates):
+    templates = copy.deepcopy(default_templates)
+    [table] = audit.resources(templates["ApiGwDdbStack"], "AWS::DynamoDB::Table").values()
+    table["Properties"]["BillingMode"] = "PROVISIONED"
+    table["Properties"]["ProvisionedThroughput"] = {"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+
+    [finding] = findings_of(templates, "hot-keys", expected_rps=20)
+
+    assert "provisioned" in finding.message
+
+
+def test_logging_retention_set(default_templates):
+    assert findings_of(default_templates, "logging") == []
+
+
+def test_logging_without_retention(default_templates):
+    templates = copy.deepcopy(default_templates)
+    log_groups = audit.resources(templates["ApiGwDdbStack"], "AWS::Logs::LogGroup")
+    [log_group] = log_groups.values()
+    del log_group["Properties"]["RetentionInDays"]
+
+    [finding] = findings_of(templates, "logging")
+
+    assert finding.resource in log_groups
+
+
+def test_logging_function_without_log_group(default_templates):
+    templates = copy.deepcopy(default_templates)
+    resources = templates["ApiGwDdbStack"]["Resources"]
+    for logical_id in audit.resources(templates["ApiGwDdbStack"], "AWS::Logs::LogGroup"):
+        del resources[logical_id]
+
+    [finding] = findings_of(templates, "logging")
+
+    assert finding.resource.startswith("CounterLambda")
+
+
+def test_logging_long_retention_and_data_trace(default_templates):
+    templates = copy.deepcopy(default_templates)
+    stack = templates["ApiGwDdbStack"]
+    [log_group] = audit.resources(stack, "AWS::Logs::LogGroup").values()
+    log_group["Properties"]["RetentionInDays"] = 365
+    [stage] = audit.resources(stack, "AWS::ApiGateway::Stage").values()
+    stage["Properties"]["MethodSettings"][0]["DataTraceEnabled"] = True
+
+    findings = findings_of(templates, "logging", max_log_retention_days=30)
+
+    assert sorted(finding.severity for finding in findings) == ["info", "warning"]
+
+
+def test_findings_most_severe_first(default_templates):
+    findings = audit_templates(default_templates, AuditOptions(expected_rps=50))
+
+    severities = [audit.SEVERITIES.index(finding.severity) for finding in findings]
+    assert severities == sorted(severities, reverse=True)
+
+
+def test_audit_command(tmp_path, capsys):
+    output = tmp_path / "audit.json"
+
+    status = audit.main(["--expected-rps", "50", "--output", str(output)])
+
+    result = json.loads(output.read_text())
+    assert status == 1
+    assert result["stacks"] == ["ApiGwDdbStack", "S3WebsiteStack"]
+    assert result["options"]["expected_rps"] == 50
+    assert result["summary"]["error"] == len([f for f in result["findings"] if f["severity"] == "error"])
+    assert set(result["findings"][0]) == {"rule", "severity", "stack", "resource", "message"}
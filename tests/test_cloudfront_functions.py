@@ -0,0 +1,145 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from resume_iac.s3_website__stack import (
+    COUNTER_REQUEST_FUNCTION,
+    PRECOMPRESSED_ASSETS_FUNCTION,
+    render_function,
+)
+
+HARNESS = 'cloudfront_functions/harness.js'
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None,
+                                reason='the harness runs on node')
+
+
+def run_function(tmp_path, file_path, events, **values):
+    """Results of the rendered function for each event, from the node harness."""
+    code = tmp_path / 'function.js'
+    code.write_text(render_function(file_path, **values))
+
+    result = subprocess.run(['node', HARNESS, str(code)],
+        input=json.dumps(events),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout)
+
+
+def viewer_request(method='GET', uri='/counter', headers=None, querystring=None):
+    return {
+        'version': '1.0',
+        'context': {'eventType': 'viewer-request'},
+        'viewer': {'ip': '203.0.113.7'},
+        'request': {
+            'method': method,
+            'uri': uri,
+            'headers': {name: {'value': value} for name, value in (headers or {}).items()},
+            'querystring': {name: {'value': value} for name, value in (querystring or {}).items()},
+            'cookies': {},
+        },
+    }
+
+
+BROWSER = {'user-agent': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0'}
+
+
+@pytest.fixture
+def counter_function(tmp_path):
+    def run(events, split_endpoints=True):
+        return run_function(tmp_path, COUNTER_REQUEST_FUNCTION, events,
+            split_endpoints=str(split_endpoints).lower()
+        )
+    return run
+
+
+def test_page_views_reach_the_origin(counter_function):
+    hit = viewer_request('POST', '/counter/hit', headers=BROWSER)
+    [result] = counter_function([hit])
+
+    assert result == hit['request']
+
+
+@pytest.mark.parametrize('method, uri, allow', [
+    ('HEAD', '/counter', 'GET, OPTIONS'),
+    ('POST', '/counter', 'GET, OPTIONS'),
+    ('GET', '/counter/hit', 'POST, OPTIONS'),
+    ('DELETE', '/counter/hit', 'POST, OPTIONS'),
+])
+def test_other_methods_answered_at_edge(counter_function, method, uri, allow):
+    [result] = counter_function([viewer_request(method, uri, headers=BROWSER)])
+
+    assert result['statusCode'] == 405
+    assert result['headers']['allow'] == {'value': allow}
+    assert result['headers']['cache-control'] == {'value': 'no-store'}
+
+
+def test_preflight_answered_at_edge(counter_function):
+    [result] = counter_function([viewer_request('OPTIONS', '/counter/hit')])
+
+    assert result['statusCode'] == 204
+    assert 'access-control-allow-origin' not in result['headers']
+
+
+@pytest.mark.parametrize('headers', [
+    {'user-agent': 'Mozilla/5.0 (compatible; Googlebot/2.1)'},
+    {'user-agent': 'curl/8.5.0'},
+    {'user-agent': BROWSER['user-agent'], 'sec-purpose': 'prefetch;prerender'},
+    {'user-agent': BROWSER['user-agent'], 'purpose': 'prefetch'},
+])
+def test_bots_and_prefetches_not_counted(counter_function, headers):
+    [result] = counter_function([viewer_request('POST', '/counter/hit', headers=headers)])
+
+    assert result['statusCode'] == 204
+
+
+def test_bots_may_read(counter_function):
+    bot = {'user-agent': 'Mozilla/5.0 (compatible; bingbot/2.0)'}
+    [result] = counter_function([viewer_request('GET', '/counter', headers=bot)])
+
+    assert 'statusCode' not in result
+
+
+def test_counting_reads_filtered_without_split_endpoints(counter_function):
+    bot = viewer_request('GET', '/counter', headers={'user-agent': 'Googlebot'})
+    visit = viewer_request('GET', '/counter', headers=BROWSER, querystring={'ids': '3,1'})
+
+    bot_result, visit_result = counter_function([bot, visit], split_endpoints=False)
+
+    assert bot_result['statusCode'] == 204
+    # Counting requests are never cached, so the query string is left alone
+    assert visit_result['querystring'] == {'ids': {'value': '3,1'}}
+
+
+def test_read_cache_key_normalized(counter_function):
+    events = [
+        viewer_request(querystring={'ids': '10,2, 3,2', 'utm_source': 'mail'}),
+        viewer_request(querystring={'fbclid': 'abc'}),
+    ]
+
+    with_ids, without_ids = counter_function(events)
+
+    assert with_ids['querystring'] == {'ids': {'value': '2,3,10'}}
+    assert without_ids['querystring'] == {}
+
+
+def test_precompressed_assets(tmp_path):
+    events = [
+        viewer_request(uri='/css/site.0123456789.css', headers={'accept-encoding': 'gzip, deflate, br'}),
+        viewer_request(uri='/index.html', headers={'accept-encoding': 'gzip'}),
+        viewer_request(uri='/img/logo.0123456789.png', headers={'accept-encoding': 'br'}),
+        viewer_request(uri='/index.html'),
+    ]
+
+    results = run_function(tmp_path, PRECOMPRESSED_ASSETS_FUNCTION, events)
+
+    assert [result['uri'] for result in results] == [
+        '/css/site.0123456789.css.br',
+        '/index.html.gz',
+        '/img/logo.0123456789.png',
+        '/index.html',
+    ]
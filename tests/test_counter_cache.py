@@ -0,0 +1,192 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.harness import count_dynamodb_calls
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+READ_EVENT = {'httpMethod': 'GET', 'resource': '/counter', 'headers': {}}
+HIT_EVENT = {'httpMethod': 'POST', 'resource': '/counter/hit', 'headers': {}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cached_counter(counter_table, clock, monkeypatch):
+    monkeypatch.setattr(index, 'SPLIT_ENDPOINTS', True)
+    monkeypatch.setattr(index, 'CACHE_TTL', 5)
+    monkeypatch.setattr(index, '_read_cache', index.TTLCache(5, 100, clock=clock))
+    monkeypatch.setattr(index, '_pending_hits', {})
+    counter_table.put_item(Item={'id': 1, 'counter': 10})
+    yield counter_table
+
+
+@pytest.fixture
+def buffered_counter(cached_counter, monkeypatch):
+    monkeypatch.setattr(index, 'BUFFER_HITS', True)
+    monkeypatch.setattr(index, 'FLUSH_THRESHOLD', 3)
+    yield cached_counter
+
+
+def data(response):
+    return json.loads(response['body'])['data']
+
+
+def stored(table):
+    return table.get_item(Key={'id': 1})['Item']['counter']
+
+
+def test_cache_expiry(clock):
+    cache = index.TTLCache(5, 10, clock=clock)
+    cache.put(1, 10)
+
+    clock.now += 4.9
+    assert cache.get(1) == 10
+
+    clock.now += 0.1
+    assert cache.get(1) is None
+
+
+def test_cache_size_bound(clock):
+    cache = index.TTLCache(5, 2, clock=clock)
+    for counter_id in (1, 2, 3):
+        cache.put(counter_id, counter_id)
+
+    assert cache.get(1) is None
+    assert (cache.get(2), cache.get(3)) == (2, 3)
+
+
+def test_cache_disabled(clock):
+    cache = index.TTLCache(0, 10, clock=clock)
+    cache.put(1, 10)
+
+    assert cache.get(1) is None
+
+
+def test_cache_hit_ratio(cached_counter, clock):
+    with count_dynamodb_calls() as calls:
+        for _ in range(10):
+            assert data(lambda_handler(READ_EVENT, {})) == '10'
+
+    assert calls == {'GetItem': 1}
+    assert index._read_cache.hit_ratio == 0.9
+
+    # Expired: read again
+    clock.now += 5
+    cached_counter.put_item(Item={'id': 1, 'counter': 20})
+    assert data(lambda_handler(READ_EVENT, {})) == '20'
+
+
+def test_batch_read_uses_cache(cached_counter):
+    event = dict(READ_EVENT, queryStringParameters={'ids': '1,2'})
+    lambda_handler(event, {})
+
+    with count_dynamodb_calls() as calls:
+        assert data(lambda_handler(event, {})) == {'1': '10', '2': '0'}
+    assert not calls
+
+
+def test_buffered_hits_flush_on_threshold(buffered_counter):
+    with count_dynamodb_calls() as calls:
+        values = [data(lambda_handler(HIT_EVENT, {})) for _ in range(5)]
+
+    # The first hit primes the cache, the next two are buffered and the
+    # third buffered hit reaches the threshold
+    assert values == ['11', '12', '13', '14', '15']
+    assert calls == {'UpdateItem': 2}
+    assert stored(buffered_counter) == 14
+    assert index.pending_hits(1) == 1
+
+
+def test_buffered_hits_flush_on_expiry(buffered_counter, clock):
+    lambda_handler(HIT_EVENT, {})
+    lambda_handler(HIT_EVENT, {})
+    assert stored(buffered_counter) == 11
+
+    # Any request after the TTL writes the hits that are due
+    clock.now += 5
+    with count_dynamodb_calls() as calls:
+        assert data(lambda_handler(READ_EVENT, {})) == '12'
+
+    assert calls == {'UpdateItem': 1}
+    assert stored(buffered_counter) == 12
+    assert not index._pending_hits
+
+
+def test_reads_include_buffered_hits(buffered_counter):
+    lambda_handler(HIT_EVENT, {})
+    lambda_handler(HIT_EVENT, {})
+
+    with count_dynamodb_calls() as calls:
+        assert data(lambda_handler(READ_EVENT, {})) == '12'
+    assert not calls
+
+
+def test_failed_flush_keeps_hits(buffered_counter, monkeypatch):
+    for _ in range(3):
+        lambda_handler(HIT_EVENT, {})
+    add_hits = index.add_hits
+
+    def fail(counter_id, hits=1):
+        raise RuntimeError('write failed')
+
+    # The fourth hit reaches the threshold, but the write fails
+    monkeypatch.setattr(index, 'add_hits', fail)
+    assert lambda_handler(HIT_EVENT, {})['statusCode'] == 500
+    assert index.pending_hits(1) == 3
+
+    monkeypatch.setattr(index, 'add_hits', add_hits)
+    assert index.flush_hits(1) == 14
+    assert stored(buffered_counter) == 14
+
+
+def test_failed_background_flush_spares_cached_reads(buffered_counter, clock, monkeypatch):
+    # Hits are due before the cached value expires
+    monkeypatch.setattr(index, 'CACHE_TTL', 1)
+    lambda_handler(HIT_EVENT, {})
+    lambda_handler(HIT_EVENT, {})
+
+    def fail(counter_id, hits=1):
+        raise RuntimeError('write failed')
+
+    monkeypatch.setattr(index, 'add_hits', fail)
+    clock.now += 2
+    response = lambda_handler(READ_EVENT, {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'message': 'Success', 'data': '12'}
+    assert index.pending_hits(1) == 1
+
+
+def test_open_breaker_spares_cached_reads(buffered_counter, clock, monkeypatch):
+    monkeypatch.setattr(index, 'CACHE_TTL', 1)
+    lambda_handler(HIT_EVENT, {})
+    lambda_handler(HIT_EVENT, {})
+
+    breaker = index.CircuitBreaker(1, 60)
+    breaker.record_failure()
+    monkeypatch.setattr(index, 'circuit_breaker', breaker)
+    clock.now += 2
+
+    with count_dynamodb_calls() as calls:
+        response = lambda_handler(READ_EVENT, {})
+
+    assert json.loads(response['body']) == {'message': 'Success', 'data': '12'}
+    assert not calls
+    assert index.pending_hits(1) == 1
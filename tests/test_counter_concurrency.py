@@ -0,0 +1,45 @@
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from benchmarks.harness import invoke_concurrently
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+INVOCATIONS = 300
+WORKERS = 32
+
+
+@pytest.fixture
+def concurrent_run(counter_table):
+    counter_table.put_item(Item={'id': 1, 'counter': 0})
+    responses, calls = invoke_concurrently(
+        lambda_handler, INVOCATIONS, WORKERS
+    )
+    yield counter_table, responses, calls
+
+
+def test_no_lost_increments(concurrent_run):
+    counter_table, responses, _ = concurrent_run
+
+    assert all(r['statusCode'] == 200 for r in responses)
+
+    item = counter_table.get_item(Key={'id': 1})['Item']
+    assert item['counter'] == INVOCATIONS
+
+
+def test_every_invocation_sees_a_distinct_value(concurrent_run):
+    _, responses, _ = concurrent_run
+
+    values = [int(json.loads(r['body'])['data']) for r in responses]
+    assert sorted(values) == list(range(1, INVOCATIONS + 1))
+
+
+def test_single_dynamodb_call_per_request(concurrent_run):
+    _, _, calls = concurrent_run
+
+    assert calls == Counter({'UpdateItem': INVOCATIONS})
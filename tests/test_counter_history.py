@@ -0,0 +1,160 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.harness import count_dynamodb_calls
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler, queue_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+HISTORY_TABLE_NAME = 'test-history-table'
+
+# 2024-05-01T00:00:00Z
+MAY_FIRST = 1714521600
+
+
+@pytest.fixture
+def history_table(counter_table, monkeypatch):
+    history = index.dynamodb.create_table(
+        TableName=HISTORY_TABLE_NAME,
+        KeySchema=[
+            {'AttributeName': 'series', 'KeyType': 'HASH'},
+            {'AttributeName': 'bucket', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'series', 'AttributeType': 'S'},
+            {'AttributeName': 'bucket', 'AttributeType': 'S'},
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    monkeypatch.setattr(index, 'HISTORY_TABLE_NAME', HISTORY_TABLE_NAME)
+    monkeypatch.setattr(index, 'history_table', history)
+    yield history
+
+
+@pytest.fixture
+def hourly_history(history_table):
+    # Ten hours of traffic on 2024-05-01, one more hit every hour
+    for hour in range(10):
+        history_table.put_item(Item={
+            'series': '1#hour', 'bucket': f'2024-05-01T{hour:02d}', 'counter': hour + 1
+        })
+    history_table.put_item(Item={'series': '1#day', 'bucket': '2024-05-01', 'counter': 55})
+    yield history_table
+
+
+def history_event(**parameters):
+    return {
+        'httpMethod': 'GET',
+        'resource': '/counter/history',
+        'headers': {},
+        'queryStringParameters': parameters or None,
+    }
+
+
+def history_page(response):
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])['data']
+
+
+def test_hit_rolls_up_into_buckets(history_table):
+    counter_table = index.table
+    counter_table.put_item(Item={'id': 1, 'counter': 10})
+
+    response = lambda_handler({}, {})
+
+    assert json.loads(response['body'])['data'] == '11'
+
+    hour, day = (bucket for _, bucket in index.history_buckets())
+    assert history_table.get_item(Key={'series': '1#hour', 'bucket': hour})['Item']['counter'] == 1
+    assert history_table.get_item(Key={'series': '1#day', 'bucket': day})['Item']['counter'] == 1
+
+
+def test_hit_is_one_transaction(history_table):
+    with count_dynamodb_calls() as calls:
+        lambda_handler({}, {})
+
+    assert calls['TransactWriteItems'] == 1
+    assert 'UpdateItem' not in calls
+
+
+def test_queued_batch_rolls_up(history_table):
+    queue_handler({'Records': [{}, {}, {}]}, {})
+
+    _, day = index.history_buckets()[1]
+    assert history_table.get_item(Key={'series': '1#day', 'bucket': day})['Item']['counter'] == 3
+    assert index.table.get_item(Key={'id': 1})['Item']['counter'] == 3
+
+
+def test_history_buckets():
+    assert index.history_buckets(MAY_FIRST + 13 * 3600 + 59) == [
+        ('hour', '2024-05-01T13'),
+        ('day', '2024-05-01'),
+    ]
+
+
+def test_history_range_is_paginated(hourly_history):
+    event = history_event(granularity='hour', **{'from': '2024-05-01T02', 'to': '2024-05-01T08'}, limit='3')
+
+    buckets = []
+    with count_dynamodb_calls() as calls:
+        while True:
+            page = history_page(lambda_handler(event, {}))
+            buckets += page['buckets']
+            if not page['next_token']:
+                break
+            event['queryStringParameters']['next_token'] = page['next_token']
+
+    assert buckets == [{'bucket': f'2024-05-01T{hour:02d}', 'hits': hour + 1}
+                       for hour in range(2, 9)]
+    assert set(calls) == {'Query'}
+
+
+def test_history_daily(hourly_history):
+    page = history_page(lambda_handler(history_event(
+        granularity='day', **{'from': '2024-04-01', 'to': '2024-05-31'}
+    ), {}))
+
+    assert page['buckets'] == [{'bucket': '2024-05-01', 'hits': 55}]
+    assert page['next_token'] is None
+
+
+def test_history_defaults_to_the_last_day(hourly_history):
+    page = index.read_history(1, history_event(), now=MAY_FIRST + 9 * 3600)
+
+    assert page['from'] == '2024-04-30T10'
+    assert page['to'] == '2024-05-01T09'
+    assert len(page['buckets']) == 10
+
+
+def test_history_is_cacheable(hourly_history):
+    response = lambda_handler(history_event(), {})
+
+    assert response['headers']['Cache-Control'] == f'public, max-age={index.HISTORY_MAX_AGE}'
+
+
+@pytest.mark.parametrize('parameters', [
+    {'granularity': 'minute'},
+    {'from': 'yesterday'},
+    # Unpadded dates would compare wrongly with the bucket keys
+    {'granularity': 'day', 'from': '2024-5-1', 'to': '2024-05-02'},
+    {'from': '2024-05-01T9', 'to': '2024-05-01T10'},
+    # DynamoDB rejects a BETWEEN whose lower bound is above the upper
+    {'from': '2024-05-01T09', 'to': '2024-05-01T02'},
+    {'limit': '0'},
+    {'limit': 'ten'},
+    {'next_token': 'not-a-token'},
+    {'next_token': index.encode_page_token({'series': '2#hour', 'bucket': '2024-05-01T00'})},
+])
+def test_history_bad_request(hourly_history, parameters):
+    response = lambda_handler(history_event(**parameters), {})
+
+    assert response['statusCode'] == 400
+
+
+def test_history_not_served_without_table(counter_table):
+    # Without a history table the request is an ordinary hit
+    assert not index.is_history_request(history_event())
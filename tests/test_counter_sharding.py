@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from benchmarks.harness import count_dynamodb_calls, invoke_concurrently
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+SHARDS = 8
+
+
+@pytest.fixture
+def sharded_counter(counter_table, monkeypatch):
+    monkeypatch.setattr(index, 'COUNTER_SHARDS', SHARDS)
+    monkeypatch.setattr(index, '_shard_total_cache', {})
+    yield counter_table
+
+
+def test_shard_keys():
+    assert index.shard_key(1, 0) == 1
+    assert index.shard_key(1, 3) == 1_000_003
+    assert index.shard_key(2, 3) == 2_000_003
+
+
+def test_sharded_total_exact_under_concurrency(sharded_counter):
+    responses, calls = invoke_concurrently(lambda_handler, 400, 32)
+
+    assert all(r['statusCode'] == 200 for r in responses)
+    assert calls['UpdateItem'] == 400
+    assert index.read_sharded_total(1, SHARDS) == 400
+
+    shard_items = sharded_counter.scan()['Items']
+    assert len(shard_items) > 1
+    assert sum(item['counter'] for item in shard_items) == 400
+
+
+def test_sharded_total_includes_unsharded_value(sharded_counter):
+    sharded_counter.put_item(Item={'id': 1, 'counter': 10})
+
+    assert index.increment_counter(1) == 11
+
+
+def test_sharded_total_is_cached(sharded_counter, monkeypatch):
+    monkeypatch.setattr(index, 'SHARD_CACHE_SECONDS', 60)
+
+    with count_dynamodb_calls() as calls:
+        first = index.increment_counter(1)
+        second = index.increment_counter(1)
+
+    assert (first, second) == (1, 2)
+    assert calls['BatchGetItem'] == 1
+    assert index.read_sharded_total(1, SHARDS) == 2
+
+
+def test_cached_sharded_total_includes_this_hit(sharded_counter, monkeypatch):
+    monkeypatch.setattr(index, 'SHARD_CACHE_SECONDS', 60)
+    assert index.read_counter(1) == 0
+
+    # Another environment's hit isn't seen until the cached total expires
+    sharded_counter.put_item(Item={'id': 1, 'counter': 5})
+    assert index.increment_counter(1) == 1
+    assert index.read_counter(1) == 1
+
+    monkeypatch.setattr(index, '_shard_total_cache', {})
+    assert index.read_counter(1) == 6
+
+
+def test_sharded_totals_cached_per_counter(sharded_counter, monkeypatch):
+    monkeypatch.setattr(index, 'SHARD_CACHE_SECONDS', 60)
+    sharded_counter.put_item(Item={'id': 2, 'counter': 10})
+
+    assert index.read_counter(1) == 0
+    assert index.read_counter(2) == 10
+    assert index.read_counter(1) == 0
+    assert index.increment_counter(2) == 11
@@ -0,0 +1,301 @@
+import asyncio
+import dataclasses
+import gzip
+import json
+import threading
+
+import pytest
+
+from benchmarks.emulator import EDGE_ADDRESS, EdgeCachePolicy, Emulator, EmulatorConfig, TokenBucket, cache_ttl
+from lambdas.counter_lambda import index
+from resume_iac.site_assets import build_site
+from tests.test_audit import synth_templates
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def default_config():
+    return EmulatorConfig.from_templates(synth_templates())
+
+
+@pytest.fixture(scope="module")
+def split_config():
+    return EmulatorConfig.from_templates(synth_templates(split_counter_endpoints=True))
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "index.html").write_text('<link rel="stylesheet" href="site.css">\n' * 50)
+    (tmp_path / "error.html").write_text("<p>Not here</p>")
+    (tmp_path / "site.css").write_text("body { color: black; }\n")
+    return {asset.key: asset for asset in build_site(str(tmp_path), encodings=())}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def emulator_for(assets, clock):
+    created = []
+
+    def create(config, handler=index.lambda_handler, **kwargs):
+        emulator = Emulator(config, assets, handler, clock=clock, **kwargs)
+        created.append(emulator)
+        return emulator
+
+    yield create
+    for emulator in created:
+        emulator.close()
+
+
+def request(emulator, method, target, headers=None, body=b""):
+    return asyncio.run(emulator.handle_request(method, target, headers or {}, body))
+
+
+def test_config_from_templates(default_config):
+    assert default_config.routes == {("/counter", "GET")}
+    assert default_config.stage_name == "prod"
+    assert default_config.stage_throttle == (10, 2)
+    assert default_config.plan_throttle == (10, 2)
+    assert default_config.method_throttles == {"/counter/GET": (10, 2)}
+    assert default_config.lambda_environment["COUNTER_TABLE_NAME"] == "benchmark-table"
+    assert [b.path_pattern for b in default_config.behaviors] == ["/counter", "*"]
+
+
+def test_config_needs_rest_api():
+    with pytest.raises(ValueError):
+        EmulatorConfig.from_templates(synth_templates(website=False, api_type="http"))
+
+
+def test_static_files_with_stack_headers(default_config, emulator_for):
+    emulator = emulator_for(default_config)
+
+    response = request(emulator, "GET", "/")
+
+    assert response.status == 200
+    assert response.headers["Cache-Control"] == "public, max-age=60, must-revalidate"
+    assert response.headers["X-Frame-Options"] == "DENY"
+    assert response.headers["Strict-Transport-Security"] == "max-age=15768000; includeSubDomains"
+    assert "default-src 'none'" in response.headers["Content-Security-Policy"]
+    assert b"stylesheet" in response.body
+
+
+def test_missing_object_gets_error_page(default_config, emulator_for):
+    response = request(emulator_for(default_config), "GET", "/nothing.html")
+
+    assert response.status == 403
+    assert response.body == b"<p>Not here</p>"
+
+
+def test_compressed_when_accepted(default_config, emulator_for):
+    response = request(emulator_for(default_config), "GET", "/index.html",
+                       {"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert b"stylesheet" in gzip.decompress(response.body)
+
+
+def test_counter_through_api(default_config, emulator_for, counter_table):
+    emulator = emulator_for(default_config)
+
+    response = request(emulator, "GET", "/counter", {"User-Agent": "pytest"})
+
+    assert response.status == 200
+    assert json.loads(response.body)["data"] == "1"
+    assert emulator.stats["invocations"] == 1
+
+
+def test_proxy_event(default_config, emulator_for):
+    events = []
+
+    def handler(event, context):
+        events.append(event)
+        return {"statusCode": 200, "body": "{}"}
+
+    request(emulator_for(default_config, handler), "GET", "/counter?ids=1,2&ids=3",
+            {"Host": "example.com", "User-Agent": "pytest"})
+
+    [event] = events
+    assert event["resource"] == "/counter"
+    assert event["httpMethod"] == "GET"
+    assert event["queryStringParameters"] == {"ids": "3"}
+    assert event["multiValueQueryStringParameters"] == {"ids": ["1,2", "3"]}
+    assert event["requestContext"]["stage"] == "prod"
+    assert event["headers"]["x-forwarded-for"] == f"127.0.0.1, {EDGE_ADDRESS}"
+    assert index.visitor_address(event) == "127.0.0.1"
+    assert "host" not in event["headers"]
+
+
+def test_stage_throttle(default_config, emulator_for, clock):
+    calls = []
+
+    def handler(event, context):
+        calls.append(event)
+        return {"statusCode": 200, "body": "{}"}
+
+    emulator = emulator_for(default_config, handler)
+
+    # A burst of 2, then 10 requests a second
+    statuses = [request(emulator, "GET", "/counter").status for _ in range(3)]
+    clock.now += 0.1
+    statuses.append(request(emulator, "GET", "/counter").status)
+
+    assert statuses == [200, 200, 429, 200]
+    assert len(calls) == 3
+    assert emulator.stats["throttled"] == 1
+
+
+def test_usage_plan_throttle(default_config, emulator_for):
+    config = dataclasses.replace(default_config, stage_throttle=None, plan_throttle=(1, 1))
+    emulator = emulator_for(config, lambda event, context: {"statusCode": 200, "body": "{}"})
+
+    assert [request(emulator, "GET", "/counter").status for _ in range(2)] == [200, 429]
+
+
+def test_method_not_allowed_at_edge(default_config, emulator_for):
+    response = request(emulator_for(default_config), "POST", "/counter")
+
+    assert response.status == 403
+    assert b"not configured to allow" in response.body
+
+
+def test_route_missing_from_api(default_config, emulator_for):
+    # CloudFront lets preflights through, but the API has no OPTIONS method
+    response = request(emulator_for(default_config), "OPTIONS", "/counter")
+
+    assert response.status == 403
+    assert json.loads(response.body) == {"message": "Missing Authentication Token"}
+
+
+def test_handler_failure_is_bad_gateway(default_config, emulator_for):
+    def handler(event, context):
+        raise RuntimeError("boom")
+
+    response = request(emulator_for(default_config, handler), "GET", "/counter")
+
+    assert response.status == 502
+
+
+def test_reserved_concurrency_throttles(default_config, emulator_for, clock):
+    entered, release = threading.Event(), threading.Event()
+
+    def handler(event, context):
+        entered.set()
+        release.wait(5)
+        return {"statusCode": 200, "body": "{}"}
+
+    emulator = emulator_for(default_config, handler, concurrency=1)
+
+    async def two_at_once():
+        first = asyncio.create_task(emulator.handle_request("GET", "/counter", {}, b""))
+        while not entered.is_set():
+            await asyncio.sleep(0.01)
+        # The only environment is busy, so the second request isn't queued
+        second = await emulator.handle_request("GET", "/counter", {}, b"")
+        release.set()
+        return await first, second
+
+    first, second = asyncio.run(two_at_once())
+
+    assert (first.status, second.status) == (200, 429)
+    assert emulator.stats["lambda_throttled"] == 1
+    assert emulator.stats["invocations"] == 1
+    # The slot is free again afterwards
+    clock.now += 1
+    assert request(emulator, "GET", "/counter").status == 200
+
+
+def test_edge_cache_serves_counter_reads(split_config, emulator_for, clock, counter_table, monkeypatch):
+    monkeypatch.setattr(index, "SPLIT_ENDPOINTS", True)
+    emulator = emulator_for(split_config, edge_cache=True)
+
+    def after(seconds, method, target):
+        # Spaced out to stay under the usage plan's burst of 2
+        clock.now += seconds
+        return request(emulator, method, target)
+
+    after(0, "POST", "/counter/hit")
+    first = after(0.5, "GET", "/counter")
+    second = after(0.5, "GET", "/counter")
+    other_ids = after(0.5, "GET", "/counter?ids=2")
+    expired = after(5, "GET", "/counter")
+
+    assert first.headers["X-Cache"] == "Miss from cloudfront"
+    assert second.headers["X-Cache"] == "Hit from cloudfront"
+    assert second.body == first.body
+    assert other_ids.headers["X-Cache"] == "Miss from cloudfront"
+    assert expired.headers["X-Cache"] == "Miss from cloudfront"
+    # The hit, two misses of /counter and the ?ids=2 miss
+    assert emulator.stats["invocations"] == 4
+
+
+def test_edge_cache_off_by_default(split_config, emulator_for, counter_table, monkeypatch):
+    monkeypatch.setattr(index, "SPLIT_ENDPOINTS", True)
+    emulator = emulator_for(split_config)
+
+    request(emulator, "GET", "/counter")
+    response = request(emulator, "GET", "/counter")
+
+    assert response.headers["X-Cache"] == "Miss from cloudfront"
+    assert emulator.stats["invocations"] == 2
+
+
+def test_cache_ttl():
+    policy = EdgeCachePolicy(min_ttl=0, default_ttl=60, max_ttl=300)
+
+    assert cache_ttl(policy, {}) == 60
+    assert cache_ttl(policy, {"Cache-Control": "public, max-age=5"}) == 5
+    assert cache_ttl(policy, {"cache-control": "max-age=3600"}) == 300
+    assert cache_ttl(policy, {"Cache-Control": "max-age=10, s-maxage=20"}) == 20
+    assert cache_ttl(policy, {"Cache-Control": "no-store"}) == 0
+
+
+def test_token_bucket_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+
+    assert bucket.allow()
+    assert not bucket.allow()
+    clock.now += 0.5
+    assert bucket.allow()
+
+
+def test_serves_http(default_config, assets):
+    [stylesheet] = [key for key in assets if key.endswith(".css")]
+    emulator = Emulator(default_config, assets, lambda event, context: {"statusCode": 200, "body": "{}"})
+
+    async def round_trip():
+        server = await emulator.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # Two requests on one keep-alive connection
+            for _ in range(2):
+                writer.write(f"GET /{stylesheet} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                await writer.drain()
+                status_line = await reader.readline()
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    headers[name.lower()] = value.strip()
+                body = await reader.readexactly(int(headers["content-length"]))
+            writer.close()
+            return status_line, headers, body
+
+    try:
+        status_line, headers, body = asyncio.run(round_trip())
+    finally:
+        emulator.close()
+
+    assert status_line.startswith(b"HTTP/1.1 200")
+    assert headers["connection"] == "keep-alive"
+    assert body == b"body { color: black; }\n"
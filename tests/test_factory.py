@@ -0,0 +1,115 @@
+import json
+
+import pytest
+from aws_cdk.assertions import Template
+
+from benchmarks import synth_time
+from resume_iac.factory import (
+    OFFLINE_ACCOUNT,
+    OFFLINE_HOSTED_ZONE_ID,
+    OFFLINE_REGION,
+    create_app,
+    create_stacks,
+    stack_environment,
+)
+
+DOMAIN_NAME = "example.com"
+
+
+@pytest.fixture
+def no_cdk_environment(monkeypatch):
+    monkeypatch.delenv("CDK_DEFAULT_ACCOUNT", raising=False)
+    monkeypatch.delenv("CDK_DEFAULT_REGION", raising=False)
+
+
+def test_select_api_only():
+    app = create_app(offline=True)
+    stacks = create_stacks(app, *stack_environment(app), DOMAIN_NAME, stacks=["api"])
+
+    assert stacks["website"] is None
+    assert [stack.stack_name for stack in app.node.children] == ["ApiGwDdbStack"]
+
+
+def test_select_from_context():
+    app = create_app(context={"stacks": "api"}, offline=True)
+    stacks = create_stacks(app, *stack_environment(app), DOMAIN_NAME)
+
+    assert stacks["website"] is None
+
+
+def test_unknown_stack_group():
+    app = create_app(offline=True)
+
+    with pytest.raises(ValueError):
+        create_stacks(app, *stack_environment(app), DOMAIN_NAME, stacks=["database"])
+
+
+def test_offline_needs_no_environment(no_cdk_environment):
+    app = create_app(offline=True)
+
+    assert stack_environment(app) == (OFFLINE_ACCOUNT, OFFLINE_REGION)
+
+
+def test_online_needs_environment(no_cdk_environment):
+    with pytest.raises(ValueError):
+        stack_environment(create_app())
+
+
+def test_hosted_zone_id_skips_lookup(tmp_path, no_cdk_environment):
+    # Not offline: an explicit environment, whatever the caller's shell has set
+    app = create_app(context={"hosted_zone_id": "Z123EXAMPLE"}, outdir=str(tmp_path))
+    stacks = create_stacks(app, OFFLINE_ACCOUNT, OFFLINE_REGION, DOMAIN_NAME)
+
+    template = Template.from_stack(stacks["website"])
+    template.has_resource_properties("AWS::Route53::RecordSet", {
+        "HostedZoneId": "Z123EXAMPLE",
+    })
+    # Nothing left for the CLI to look up and write to cdk.context.json
+    app.synth()
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert "missing" not in manifest
+
+
+def test_offline_imports_placeholder_zone():
+    app = create_app(offline=True)
+    stacks = create_stacks(app, *stack_environment(app), DOMAIN_NAME)
+
+    Template.from_stack(stacks["website"]).has_resource_properties("AWS::Route53::RecordSet", {
+        "HostedZoneId": OFFLINE_HOSTED_ZONE_ID,
+    })
+
+
+def test_context_file(tmp_path):
+    context_file = tmp_path / "cdk.context.json"
+    context_file.write_text(json.dumps({"stacks": ["api"], "counter_api_type": "http"}))
+
+    app = create_app(context_file=str(context_file), offline=True)
+    stacks = create_stacks(app, *stack_environment(app), DOMAIN_NAME)
+
+    [api] = stacks["api"]
+    assert api.http_api is not None
+    assert stacks["website"] is None
+
+
+def test_synth_from_another_directory(tmp_path, monkeypatch):
+    # Templates, functions and Lambda sources are found relative to the package
+    monkeypatch.chdir(tmp_path)
+    app = create_app(offline=True, outdir=str(tmp_path / "cdk.out"))
+    create_stacks(app, *stack_environment(app), DOMAIN_NAME)
+
+    assembly = app.synth()
+
+    assert sorted(stack.stack_name for stack in assembly.stacks) == ["ApiGwDdbStack", "S3WebsiteStack"]
+
+
+def test_synth_time_run():
+    result = synth_time.run(repeat=1, groups=["api"])
+
+    api = result["results"]["api"]
+    assert api["construct_ms"] > 0
+    assert api["synth_ms"] > 0
+    assert api["python_peak_kib"] > 0
+    assert set(api["template_bytes"]) == {"ApiGwDdbStack"}
+
+    assert json.loads(json.dumps(result)) == result
+    assert set(synth_time.compare(result, result)["api"].values()) == {0.0}
@@ -0,0 +1,141 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_secretsmanager
+
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+SECRET = 'cloudfront-only'
+
+
+def http_event(method, path, headers=None, query=None):
+    """An HTTP API payload format 2.0 event."""
+    event = {
+        'version': '2.0',
+        'routeKey': f'{method} {path}',
+        'rawPath': path,
+        'headers': headers or {},
+        'requestContext': {
+            'http': {'method': method, 'path': path, 'sourceIp': '203.0.113.7'},
+        },
+    }
+    if query:
+        event['queryStringParameters'] = query
+    return event
+
+
+@pytest.fixture
+def origin_secret(monkeypatch):
+    with mock_secretsmanager():
+        client = boto3.client('secretsmanager', region_name='us-east-1')
+        arn = client.create_secret(Name='origin-secret', SecretString=SECRET)['ARN']
+        monkeypatch.setattr(index, 'ORIGIN_SECRET_ID', arn)
+        monkeypatch.setattr(index, '_origin_secret', None)
+        yield arn
+
+
+def test_http_api_event_counts_a_hit(counter_table):
+    response = lambda_handler(http_event('GET', '/counter'), {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['data'] == '1'
+
+
+def test_http_api_split_endpoints(counter_table, monkeypatch):
+    monkeypatch.setattr(index, 'SPLIT_ENDPOINTS', True)
+
+    lambda_handler(http_event('POST', '/counter/hit'), {})
+    response = lambda_handler(http_event('GET', '/counter'), {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['data'] == '1'
+    assert counter_table.get_item(Key={'id': 1})['Item']['counter'] == 1
+
+
+def test_http_api_reads_query_string(counter_table):
+    response = lambda_handler(http_event('GET', '/counter', query={'ids': '2,3'}), {})
+
+    assert json.loads(response['body'])['data'] == {'2': '1', '3': '1'}
+
+
+def test_http_api_visitor_address():
+    assert index.visitor_address(http_event('GET', '/counter')) == '203.0.113.7'
+
+
+def test_http_api_visitor_address_from_cloudfront():
+    # CloudFront appends the viewer after what the viewer claimed
+    event = http_event('GET', '/counter', headers={'x-forwarded-for': '198.51.100.1, 203.0.113.9'})
+
+    assert index.visitor_address(event) == '203.0.113.9'
+
+
+def test_missing_origin_secret_is_forbidden(counter_table, origin_secret):
+    response = lambda_handler(http_event('GET', '/counter'), {})
+
+    assert response['statusCode'] == 403
+    assert 'Item' not in counter_table.get_item(Key={'id': 1})
+
+
+def test_wrong_origin_secret_is_forbidden(counter_table, origin_secret):
+    event = http_event('GET', '/counter', headers={'x-origin-secret': 'guess'})
+
+    assert lambda_handler(event, {})['statusCode'] == 403
+
+
+def test_origin_secret_accepted(counter_table, origin_secret):
+    event = http_event('GET', '/counter', headers={'X-Origin-Secret': SECRET})
+
+    response = lambda_handler(event, {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['data'] == '1'
+
+
+def test_origin_secret_fetched_once(counter_table, origin_secret, monkeypatch):
+    event = http_event('GET', '/counter', headers={'x-origin-secret': SECRET})
+    lambda_handler(event, {})
+
+    # Later requests in the same environment use the remembered value
+    monkeypatch.setattr(index, 'ORIGIN_SECRET_ID', 'arn:aws:secretsmanager:us-east-1:123456789012:secret:gone')
+
+    assert lambda_handler(event, {})['statusCode'] == 200
+
+
+def test_unreadable_origin_secret_is_an_error(counter_table, origin_secret, monkeypatch):
+    monkeypatch.setattr(index, 'ORIGIN_SECRET_ID', 'arn:aws:secretsmanager:us-east-1:123456789012:secret:gone')
+    event = http_event('GET', '/counter', headers={'x-origin-secret': SECRET})
+
+    assert lambda_handler(event, {})['statusCode'] == 500
+
+
+def rest_event(method, path, headers=None):
+    """A REST API proxy integration event."""
+    return {
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'headers': headers,
+        'requestContext': {'stage': 'prod', 'identity': {'sourceIp': '203.0.113.7'}},
+    }
+
+
+def test_rest_api_without_origin_secret_trusts_api_key(counter_table, monkeypatch):
+    # With the usage plan API key, API Gateway turns away other callers
+    monkeypatch.setattr(index, 'ORIGIN_SECRET_ID', None)
+
+    assert lambda_handler(rest_event('GET', '/counter'), {})['statusCode'] == 200
+
+
+def test_rest_api_checks_origin_secret(counter_table, origin_secret):
+    forbidden = lambda_handler(rest_event('GET', '/counter'), {})
+    accepted = lambda_handler(rest_event('GET', '/counter', {'X-Origin-Secret': SECRET}), {})
+
+    assert forbidden['statusCode'] == 403
+    assert accepted['statusCode'] == 200
+    assert json.loads(accepted['body'])['data'] == '1'
@@ -0,0 +1,151 @@
+import os
+import struct
+import sys
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk import aws_lambda as _lambda
+from aws_cdk.assertions import Annotations, Match, Template
+
+from resume_iac import lambda_bundling
+from resume_iac.lambda_bundling import (
+    LocalPythonBundling,
+    check_package_size,
+    copy_sources,
+    dependency_layer,
+    function_code,
+)
+
+HOST_RUNTIME = _lambda.Runtime(
+    f"python{sys.version_info.major}.{sys.version_info.minor}",
+    _lambda.RuntimeFamily.PYTHON
+)
+OTHER_RUNTIME = _lambda.Runtime("python2.7", _lambda.RuntimeFamily.PYTHON)
+
+
+@pytest.fixture
+def function_source(tmp_path):
+    source = tmp_path / "source"
+    (source / "tests").mkdir(parents=True)
+    (source / "__pycache__").mkdir()
+    (source / "boto3").mkdir()
+    (source / "index.py").write_text("def lambda_handler(event, context):\n    return 1\n")
+    (source / "helpers.py").write_text("VALUE = 1\n")
+    (source / "tests" / "test_index.py").write_text("")
+    (source / "__pycache__" / "index.cpython-39.pyc").write_bytes(b"stale")
+    (source / "boto3" / "__init__.py").write_text("")
+    (source / "requirements.txt").write_text("")
+    return source
+
+
+def bundled_files(path):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), path)
+        for root, _, files in os.walk(path) for name in files
+    )
+
+
+def test_copy_sources_strips_tests_caches_and_sdk(function_source, tmp_path):
+    output = tmp_path / "output"
+
+    copy_sources(str(function_source), str(output))
+
+    assert bundled_files(output) == ["helpers.py", "index.py"]
+
+
+def test_local_bundling_precompiles_for_matching_runtime(function_source, tmp_path):
+    output = tmp_path / "output"
+    output.mkdir()
+
+    bundler = LocalPythonBundling(str(function_source), HOST_RUNTIME)
+
+    assert bundler.try_bundle(str(output), None)
+    assert bundler.precompiled
+
+    pyc = output / "__pycache__" / f"index.{sys.implementation.cache_tag}.pyc"
+    assert pyc.exists()
+
+    # Unchecked hash-based bytecode: bit 0 set (hash based), bit 1 clear
+    flags, = struct.unpack("<I", pyc.read_bytes()[4:8])
+    assert flags == 0b01
+
+
+def test_local_bundling_defers_to_docker_for_other_runtimes(function_source, tmp_path, monkeypatch):
+    monkeypatch.setattr(lambda_bundling.shutil, "which", lambda name: "/usr/bin/docker")
+
+    bundler = LocalPythonBundling(str(function_source), OTHER_RUNTIME)
+
+    assert not bundler.try_bundle(str(tmp_path), None)
+
+
+def test_local_bundling_without_docker_ships_sources(function_source, tmp_path, monkeypatch):
+    monkeypatch.setattr(lambda_bundling.shutil, "which", lambda name: None)
+    output = tmp_path / "output"
+    output.mkdir()
+
+    bundler = LocalPythonBundling(str(function_source), OTHER_RUNTIME)
+
+    assert bundler.try_bundle(str(output), None)
+    assert not bundler.precompiled
+    assert bundled_files(output) == ["helpers.py", "index.py"]
+
+
+def synth_function(source, max_bytes=None):
+    app = cdk.App()
+    stack = cdk.Stack(app, "BundlingStack")
+
+    function = _lambda.Function(stack, "Function",
+        runtime=HOST_RUNTIME,
+        handler="index.lambda_handler",
+        code=function_code(str(source), HOST_RUNTIME)
+    )
+
+    if max_bytes is None:
+        size = check_package_size(function)
+    else:
+        size = check_package_size(function, max_bytes=max_bytes)
+
+    return stack, function, size
+
+
+def test_function_asset_is_slim_and_precompiled(function_source):
+    stack, function, size = synth_function(function_source)
+
+    stage = function.node.find_child("Code").node.find_child("Stage")
+    files = bundled_files(stage.absolute_staged_path)
+
+    assert "index.py" in files
+    assert f"__pycache__/index.{sys.implementation.cache_tag}.pyc" in files
+    assert not any(name.startswith(("tests", "boto3")) for name in files)
+    assert "requirements.txt" not in files
+    assert 0 < size < lambda_bundling.DEFAULT_MAX_PACKAGE_BYTES
+
+    Annotations.from_stack(stack).has_no_error("*", Match.any_value())
+
+
+def test_package_size_budget(function_source):
+    stack, _, _ = synth_function(function_source, max_bytes=10)
+
+    Annotations.from_stack(stack).has_error("*",
+        Match.string_like_regexp("over the 10 byte budget")
+    )
+
+
+def test_dependency_layer(tmp_path):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("")
+
+    app = cdk.App()
+    stack = cdk.Stack(app, "LayerStack")
+
+    dependency_layer(stack, "Dependencies",
+        requirements_file=str(requirements),
+        runtime=_lambda.Runtime.PYTHON_3_12,
+        architecture=_lambda.Architecture.ARM_64
+    )
+
+    Template.from_stack(stack).has_resource_properties("AWS::Lambda::LayerVersion", {
+            "CompatibleRuntimes": ["python3.12"],
+            "CompatibleArchitectures": ["arm64"],
+        }
+    )
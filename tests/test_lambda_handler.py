@@ -1,37 +1,10 @@
 import pytest
-from moto import mock_dynamodb
-import boto3
 import json
 import os
 
+from lambdas.counter_lambda import index
 from lambdas.counter_lambda.index import lambda_handler
-
-TABLE_NAME = 'test-table'
-
-@pytest.fixture
-def counter_table():
-    with mock_dynamodb():
-        resource = boto3.resource('dynamodb', region_name='us-east-1')
-        test_table =resource.create_table(
-            TableName=TABLE_NAME,
-            KeySchema=[
-                {
-                    'AttributeName': 'id', 
-                    'KeyType': 'HASH'
-                }
-            ],
-            AttributeDefinitions=[
-                {
-                    'AttributeName': 'id', 
-                    'AttributeType': 'N'
-                }
-            ],
-            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
-        )
-
-        # test_table.put_item(Item={'id': 1, 'counter': 0})
-        yield test_table
-
+from tests.conftest import TABLE_NAME
 
 os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
 
@@ -76,3 +49,50 @@ def test_lambda_handler_wrong_type(wrong_counter_value_type):
     response = lambda_handler(event, context)
     
     assert response['statusCode'] == 500
+
+def test_lambda_handler_reuses_client(counter_table_inital, monkeypatch):
+    # The DynamoDB resource is created once at import time; warm invocations
+    # must not build a new one.
+    def fail(*args, **kwargs):
+        raise AssertionError('boto3.resource called on the request path')
+
+    monkeypatch.setattr('boto3.resource', fail)
+
+    for expected in ('1', '2'):
+        response = lambda_handler({}, {})
+        assert json.loads(response['body'])['data'] == expected
+
+@pytest.fixture
+def split_endpoints(change_counter_value, monkeypatch):
+    monkeypatch.setattr(index, 'SPLIT_ENDPOINTS', True)
+    yield change_counter_value
+
+def test_lambda_handler_read_does_not_count(split_endpoints):
+    event = {'httpMethod': 'GET', 'resource': '/counter', 'headers': {}}
+
+    response = lambda_handler(event, {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'message': 'Success', 'data': '10'}
+    assert response['headers']['Cache-Control'] == f'public, max-age={index.READ_MAX_AGE}'
+    assert response['headers']['ETag']
+    assert split_endpoints.get_item(Key={'id': 1})['Item']['counter'] == 10
+
+def test_lambda_handler_read_not_modified(split_endpoints):
+    event = {'httpMethod': 'GET', 'resource': '/counter', 'headers': {}}
+    etag = lambda_handler(event, {})['headers']['ETag']
+
+    event['headers'] = {'If-None-Match': etag}
+    response = lambda_handler(event, {})
+
+    assert response['statusCode'] == 304
+    assert response['body'] == ''
+
+def test_lambda_handler_hit_counts(split_endpoints):
+    event = {'httpMethod': 'POST', 'resource': '/counter/hit', 'headers': {}}
+
+    response = lambda_handler(event, {})
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'message': 'Success', 'data': '11'}
+    assert response['headers']['Cache-Control'] == 'no-store'
@@ -0,0 +1,47 @@
+import json
+
+from benchmarks import load_test
+from benchmarks.harness import request_units
+
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert load_test.percentile(values, 0.50) == 50
+    assert load_test.percentile(values, 0.95) == 95
+    assert load_test.percentile(values, 0.99) == 99
+    assert load_test.percentile([7], 0.99) == 7
+    assert load_test.percentile([], 0.5) is None
+
+
+def test_request_units():
+    assert request_units('UpdateItem', {}) == 1.0
+    assert request_units('GetItem', {}) == 0.5
+    assert request_units('GetItem', {'ConsistentRead': True}) == 1.0
+    assert request_units('BatchGetItem', {'RequestItems': {'t': {'Keys': [1, 2, 3, 4]}}}) == 2.0
+    assert request_units('TransactWriteItems', {'TransactItems': [1, 2, 3]}) == 6.0
+
+
+def test_load_test_run():
+    result = load_test.run(requests=60, concurrency=4)
+
+    assert result['config']['backend'] == 'moto'
+    results = result['results']
+    assert results['requests'] == 60
+    assert results['error_rate'] == 0
+    assert results['dynamodb']['calls'] == {'UpdateItem': 60}
+    assert results['dynamodb']['write_units_per_request'] == 1.0
+    assert results['latency_ms']['p50'] <= results['latency_ms']['p99']
+
+    # Results must round-trip through JSON to be compared between runs
+    assert json.loads(json.dumps(result)) == result
+
+
+def test_load_test_compare(tmp_path):
+    baseline = load_test.run(requests=40, concurrency=4)
+    current = load_test.run(requests=40, concurrency=4, shards=4, read_ratio=0.5)
+
+    change = load_test.compare(baseline, current)
+
+    assert set(change) == {'throughput_rps', 'p50', 'p95', 'p99', 'calls_per_request'}
+    assert current['results']['dynamodb']['calls']['UpdateItem'] < 40
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+
+import pytest
+
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler, queue_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+
+class Context:
+    aws_request_id = 'test-request-id'
+
+
+def emf_records(output):
+    records = []
+    for line in output.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and '_aws' in record:
+            records.append(record)
+    return records
+
+
+@pytest.fixture
+def cold_container(counter_table, monkeypatch):
+    counter_table.put_item(Item={'id': 1, 'counter': 0})
+    monkeypatch.setattr(index, '_cold_start', True)
+    yield counter_table
+
+
+def test_emf_record(cold_container, capsys):
+    lambda_handler({}, Context())
+
+    record, = emf_records(capsys.readouterr().out)
+
+    directive, = record['_aws']['CloudWatchMetrics']
+    assert directive['Namespace'] == 'ResumeCounter'
+    assert directive['Dimensions'] == [['Operation']]
+    names = {metric['Name'] for metric in directive['Metrics']}
+    assert names == {'HandlerDuration', 'DynamoDBLatency', 'DynamoDBCalls',
+                     'ColdStart', 'Errors', 'Degraded'}
+
+    # Every metric named in the directive must be present on the record
+    for name in names:
+        assert isinstance(record[name], (int, float))
+
+    assert record['Operation'] == 'hit'
+    assert record['DynamoDBCalls'] == 1
+    assert 0 < record['DynamoDBLatency'] <= record['HandlerDuration']
+    assert record['Errors'] == 0
+    assert 'ErrorClass' not in record
+    assert record['RequestId'] == 'test-request-id'
+
+
+def test_emf_cold_start_flag(cold_container, capsys):
+    lambda_handler({}, Context())
+    lambda_handler({}, Context())
+
+    first, second = emf_records(capsys.readouterr().out)
+
+    assert first['ColdStart'] == 1
+    assert second['ColdStart'] == 0
+
+
+def test_emf_error_class(counter_table, capsys):
+    counter_table.put_item(Item={'id': 1, 'counter': 'test'})
+
+    response = lambda_handler({}, Context())
+
+    assert response['statusCode'] == 500
+    record, = emf_records(capsys.readouterr().out)
+    assert record['Errors'] == 1
+    assert record['ErrorClass'] == 'ValidationException'
+
+
+def test_emf_queue_operation(cold_container, capsys):
+    queue_handler({'Records': [{'body': 'a'}, {'body': 'b'}]}, Context())
+
+    record, = emf_records(capsys.readouterr().out)
+    assert record['Operation'] == 'queue'
+    assert record['DynamoDBCalls'] == 1
+
+
+def test_metrics_disabled(cold_container, capsys, monkeypatch):
+    monkeypatch.setattr(index, 'METRICS_ENABLED', False)
+
+    lambda_handler({}, Context())
+
+    assert emf_records(capsys.readouterr().out) == []
+
+
+def test_info_level_samples_request_logs(cold_container, caplog, monkeypatch):
+    monkeypatch.setattr(index, 'LOG_SAMPLE_RATE', 0.0)
+
+    with caplog.at_level(logging.INFO):
+        for _ in range(5):
+            lambda_handler({}, Context())
+
+    assert 'The counter value is now' not in caplog.text
+
+
+def test_debug_level_logs_every_request(cold_container, caplog):
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(5):
+            lambda_handler({}, Context())
+
+    assert caplog.text.count('The counter value is now') == 5
@@ -0,0 +1,139 @@
+import json
+import os
+from collections import OrderedDict
+
+import pytest
+
+from benchmarks.harness import count_dynamodb_calls
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler, queue_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+
+@pytest.fixture
+def counters(counter_table, monkeypatch):
+    monkeypatch.setattr(index, 'SPLIT_ENDPOINTS', True)
+    for counter_id, value in ((1, 10), (2, 20), (3, 30)):
+        counter_table.put_item(Item={'id': counter_id, 'counter': value})
+    yield counter_table
+
+
+def read_event(ids):
+    return {'httpMethod': 'GET', 'resource': '/counter', 'headers': {},
+            'queryStringParameters': {'ids': ids}}
+
+
+def hit_event(ids):
+    return {'httpMethod': 'POST', 'resource': '/counter/hit', 'headers': {},
+            'queryStringParameters': {'ids': ids}}
+
+
+def counter_data(response):
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])['data']
+
+
+def test_batch_read(counters):
+    with count_dynamodb_calls() as calls:
+        response = lambda_handler(read_event('3,1,4'), {})
+
+    assert counter_data(response) == {'1': '10', '3': '30', '4': '0'}
+    assert response['headers']['Cache-Control'] == f'public, max-age={index.READ_MAX_AGE}'
+    assert calls == {'BatchGetItem': 1}
+
+
+def test_batch_hit(counters):
+    with count_dynamodb_calls() as calls:
+        response = lambda_handler(hit_event('1,2,2,4'), {})
+
+    assert counter_data(response) == {'1': '11', '2': '21', '4': '1'}
+    assert calls == {'TransactWriteItems': 1, 'BatchGetItem': 1}
+    assert counters.get_item(Key={'id': 3})['Item']['counter'] == 30
+
+
+def test_large_batches_are_chunked(counters, monkeypatch):
+    monkeypatch.setattr(index, 'TRANSACT_MAX_ITEMS', 2)
+    monkeypatch.setattr(index, 'BATCH_GET_MAX_KEYS', 2)
+
+    with count_dynamodb_calls() as calls:
+        response = lambda_handler(hit_event('1,2,3,4,5'), {})
+
+    assert counter_data(response) == {'1': '11', '2': '21', '3': '31', '4': '1', '5': '1'}
+    assert calls == {'TransactWriteItems': 3, 'BatchGetItem': 3}
+
+
+def test_batch_read_sums_shards(counters, monkeypatch):
+    monkeypatch.setattr(index, 'COUNTER_SHARDS', 4)
+    counters.put_item(Item={'id': index.shard_key(2, 3), 'counter': 5})
+
+    assert counter_data(lambda_handler(read_event('1,2'), {})) == {'1': '10', '2': '25'}
+
+
+def test_batch_hit_with_unique_visitors(counters, monkeypatch):
+    monkeypatch.setattr(index, 'UNIQUE_VISITORS', True)
+    monkeypatch.setattr(index, '_seen_visitors', OrderedDict())
+    event = hit_event('1,2')
+    event['headers'] = {'X-Forwarded-For': '203.0.113.7', 'User-Agent': 'Mozilla/5.0'}
+
+    assert counter_data(lambda_handler(event, {})) == {'1': '11', '2': '21'}
+    assert counter_data(lambda_handler(event, {})) == {'1': '11', '2': '21'}
+
+    # A counter the visitor hasn't seen yet today still counts
+    event['queryStringParameters']['ids'] = '1,2,3'
+    assert counter_data(lambda_handler(event, {})) == {'1': '11', '2': '21', '3': '31'}
+
+
+def test_failed_chunk_releases_only_its_visits(counters, monkeypatch):
+    monkeypatch.setattr(index, 'UNIQUE_VISITORS', True)
+    monkeypatch.setattr(index, '_seen_visitors', OrderedDict())
+    monkeypatch.setattr(index, 'TRANSACT_MAX_ITEMS', 2)
+    counters.put_item(Item={'id': 3, 'counter': 'not a number'})
+    event = hit_event('1,2,3,4')
+    event['headers'] = {'X-Forwarded-For': '203.0.113.7', 'User-Agent': 'Mozilla/5.0'}
+
+    # Counters 1 and 2 commit in the first transaction, 3 and 4 fail in the second
+    assert lambda_handler(event, {})['statusCode'] == 500
+
+    def claimed(counter_id):
+        return 'Item' in counters.get_item(Key={'id': index.visitor_key(event, counter_id)})
+
+    assert [claimed(counter_id) for counter_id in (1, 2, 3, 4)] == [True, True, False, False]
+    assert counters.get_item(Key={'id': 1})['Item']['counter'] == 11
+
+
+@pytest.mark.parametrize('ids', [
+    ',',
+    'one,two',
+    '0',
+    str(index.MAX_COUNTER_ID + 1),
+    ','.join(str(i) for i in range(1, index.MAX_BATCH_COUNTERS + 2)),
+    '1' * 1000,
+])
+def test_batch_bad_request(counters, ids):
+    response = lambda_handler(read_event(ids), {})
+
+    assert response['statusCode'] == 400
+
+
+def queued_hit(message_id, ids=None):
+    record = {'messageId': message_id, 'body': f'request-{message_id}', 'messageAttributes': {}}
+    if ids is not None:
+        record['messageAttributes']['ids'] = {'stringValue': ids, 'dataType': 'String'}
+    return record
+
+
+def test_queued_hits_for_several_counters(counters):
+    event = {'Records': [
+        queued_hit('1'),
+        queued_hit('2', '2,3'),
+        queued_hit('3', '2'),
+        queued_hit('4', 'not-a-counter'),
+    ]}
+
+    with count_dynamodb_calls() as calls:
+        queue_handler(event, {})
+
+    assert calls == {'TransactWriteItems': 1}
+    assert [counters.get_item(Key={'id': i})['Item']['counter'] for i in (1, 2, 3)] == [11, 22, 31]
@@ -0,0 +1,232 @@
+import aws_cdk as cdk
+import pytest
+from aws_cdk.assertions import Template
+
+from resume_iac.factory import create_stacks
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack, ORIGIN_SECRET_NAME
+
+ACCOUNT = "123456789012"
+
+
+def multi_region_app(replica_regions="eu-west-1, ap-southeast-2"):
+    app = cdk.App(context={"counter_replica_regions": replica_regions})
+    return create_stacks(app, account=ACCOUNT, region="us-east-1", domain_name="example.com")
+
+
+def function_environment(template):
+    functions = template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"Handler": "index.lambda_handler"}
+    })
+    [function] = functions.values()
+    return function["Properties"]["Environment"]["Variables"]
+
+
+def test_single_region_by_default():
+    app = cdk.App()
+    stacks = create_stacks(app, account=ACCOUNT, region="us-east-1", domain_name="example.com")
+
+    [api] = stacks["api"]
+    assert api.rest_api is not None
+    Template.from_stack(api).resource_count_is("AWS::DynamoDB::Table", 1)
+
+
+def test_regional_stacks():
+    stacks = multi_region_app()
+
+    assert [(stack.stack_name, stack.region) for stack in stacks["api"]] == [
+        ("ApiGwDdbStack", "us-east-1"),
+        ("ApiGwDdbStack-eu-west-1", "eu-west-1"),
+        ("ApiGwDdbStack-ap-southeast-2", "ap-southeast-2"),
+    ]
+    primary = stacks["api"][0]
+    for replica in stacks["api"][1:]:
+        assert primary in replica.dependencies
+        assert replica in stacks["website"].dependencies
+
+
+def test_global_table_in_first_region():
+    primary, *replicas = multi_region_app()["api"]
+
+    template = Template.from_stack(primary)
+    template.resource_count_is("AWS::DynamoDB::Table", 0)
+    [table] = template.find_resources("AWS::DynamoDB::GlobalTable").values()
+    assert table["Properties"]["TableName"] == "counter-table"
+    assert table["Properties"]["BillingMode"] == "PAY_PER_REQUEST"
+    assert {replica["Region"] for replica in table["Properties"]["Replicas"]} == {
+        "us-east-1", "eu-west-1", "ap-southeast-2",
+    }
+    template.has_resource_properties("AWS::SecretsManager::Secret", {
+            "Name": ORIGIN_SECRET_NAME,
+            "ReplicaRegions": [{"Region": "eu-west-1"}, {"Region": "ap-southeast-2"}],
+        }
+    )
+
+    for replica in replicas:
+        replica_template = Template.from_stack(replica)
+        replica_template.resource_count_is("AWS::DynamoDB::GlobalTable", 0)
+        replica_template.resource_count_is("AWS::DynamoDB::Table", 0)
+        replica_template.resource_count_is("AWS::SecretsManager::Secret", 0)
+
+
+def test_each_region_writes_its_own_shards():
+    stacks = multi_region_app()
+
+    environments = [function_environment(Template.from_stack(stack)) for stack in stacks["api"]]
+
+    assert [(env["COUNTER_SHARDS"], env["COUNTER_WRITE_SHARDS"], env["COUNTER_SHARD_OFFSET"])
+            for env in environments] == [("3", "1", "0"), ("3", "1", "1"), ("3", "1", "2")]
+    assert {env["COUNTER_ORIGIN_SECRET_ID"] for env in environments} == {ORIGIN_SECRET_NAME}
+
+
+def test_latency_records():
+    for stack in multi_region_app()["api"]:
+        template = Template.from_stack(stack)
+
+        template.has_resource_properties("AWS::Route53::RecordSet", {
+                "Name": "counter.example.com.",
+                "Type": "A",
+                "Region": stack.region,
+                "SetIdentifier": stack.region,
+            }
+        )
+        template.has_resource_properties("AWS::ApiGatewayV2::DomainName", {
+                "DomainName": "counter.example.com",
+            }
+        )
+
+
+def test_website_routes_counter_to_closest_region():
+    website = multi_region_app()["website"]
+
+    distribution = Template.from_stack(website).find_resources("AWS::CloudFront::Distribution")
+    config = list(distribution.values())[0]["Properties"]["DistributionConfig"]
+    counter_origin = config["Origins"][1]
+
+    assert counter_origin["DomainName"] == "counter.example.com"
+    assert [h["HeaderName"] for h in counter_origin["OriginCustomHeaders"]] == ["x-origin-secret"]
+
+
+def test_context_list_value():
+    stacks = multi_region_app(replica_regions=["eu-west-1"])
+
+    assert [stack.region for stack in stacks["api"]] == ["us-east-1", "eu-west-1"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"api_type": "rest", "domain_name": "example.com"},
+    {"api_type": "http"},
+    {"api_type": "http", "domain_name": "example.com", "counter_history": True},
+])
+def test_counter_regions_unsupported(kwargs):
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack",
+            counter_regions=["us-east-1", "eu-west-1"],
+            env=cdk.Environment(account=ACCOUNT, region="us-east-1"),
+            **kwargs
+        )
+
+
+def test_counter_regions_need_stack_region():
+    app = cdk.App()
+
+    with pytest.raises(ValueError):
+        ApiDdbLambdaStack(app, "BackendStack",
+            api_type="http",
+            domain_name="example.com",
+            counter_regions=["us-east-1", "eu-west-1"],
+            env=cdk.Environment(account=ACCOUNT, region="eu-central-1")
+        )
+
+
+def test_regional_writes_stay_in_their_shards(counter_table, monkeypatch):
+    # The second of three regions, one shard each
+    monkeypatch.setattr(index, 'COUNTER_SHARDS', 3)
+    monkeypatch.setattr(index, 'WRITE_SHARDS', 1)
+    monkeypatch.setattr(index, 'SHARD_OFFSET', 1)
+    monkeypatch.setattr(index, 'SHARD_CACHE_SECONDS', 0)
+    counter_table.put_item(Item={'id': 1, 'counter': 10})
+    counter_table.put_item(Item={'id': index.shard_key(1, 2), 'counter': 5})
+
+    for _ in range(3):
+        response = lambda_handler({}, {})
+
+    assert response['statusCode'] == 200
+    assert counter_table.get_item(Key={'id': index.shard_key(1, 1)})['Item']['counter'] == 3
+    assert counter_table.get_item(Key={'id': 1})['Item']['counter'] == 10
+    # Reads add up the shards of every region
+    assert index.read_counter(1) == 18
+
+
+def test_global_table_profile():
+    app = cdk.App(context={
+        "counter_replica_regions": "eu-west-1",
+        "table_profile": "provisioned",
+    })
+    stacks = create_stacks(app, account=ACCOUNT, region="us-east-1", domain_name="example.com")
+
+    template = Template.from_stack(stacks["api"][0])
+
+    template.has_resource_properties("AWS::DynamoDB::GlobalTable", {
+            "BillingMode": "PROVISIONED",
+            "WriteProvisionedThroughputSettings": {
+                "WriteCapacityAutoScalingSettings": {
+                    "MinCapacity": 5,
+                    "MaxCapacity": 500,
+                    "TargetTrackingScalingPolicyConfiguration": {"TargetValue": 70},
+                }
+            },
+        }
+    )
+
+
+def migration_template(step):
+    app = cdk.App()
+    stack = ApiDdbLambdaStack(app, "ApiGwDdbStack", counter_table_migration=step,
+        env=cdk.Environment(account=ACCOUNT, region="us-east-1"))
+    return Template.from_stack(stack).to_json()["Resources"]
+
+
+def resources_of_type(resources, resource_type):
+    return {logical_id: resource for logical_id, resource in resources.items()
+            if resource["Type"] == resource_type}
+
+
+def test_counter_table_migration():
+    retained = migration_template("retain")
+    detached = migration_template("detach")
+    imported = migration_template("import")
+
+    [table] = resources_of_type(retained, "AWS::DynamoDB::Table").values()
+    assert table["DeletionPolicy"] == "Retain"
+
+    assert resources_of_type(detached, "AWS::DynamoDB::Table") == {}
+    assert resources_of_type(detached, "AWS::DynamoDB::GlobalTable") == {}
+    environment = function_environment(Template.from_json({"Resources": detached}))
+    assert environment["COUNTER_TABLE_NAME"] == "counter-table"
+
+    # The import only adds the global table, as cdk import requires...
+    [(logical_id, global_table)] = resources_of_type(imported, "AWS::DynamoDB::GlobalTable").items()
+    assert {key: imported[key] for key in detached} == detached
+    assert set(imported) - set(detached) == {logical_id}
+    assert global_table["DeletionPolicy"] == "Retain"
+    assert global_table["Properties"]["TableName"] == "counter-table"
+    assert [replica["Region"] for replica in global_table["Properties"]["Replicas"]] == ["us-east-1"]
+
+    # ...under the logical ID counter_regions then adds replicas to
+    primary = Template.from_stack(multi_region_app()["api"][0])
+    assert logical_id in primary.find_resources("AWS::DynamoDB::GlobalTable")
+
+
+@pytest.mark.parametrize("context", [
+    {"counter_table_migration": "rename"},
+    {"counter_table_migration": "import", "counter_replica_regions": "eu-west-1"},
+])
+def test_counter_table_migration_unsupported(context):
+    app = cdk.App(context=context)
+
+    with pytest.raises(ValueError):
+        create_stacks(app, account=ACCOUNT, region="us-east-1", domain_name="example.com")
@@ -0,0 +1,86 @@
+import os
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_sqs
+
+from benchmarks.harness import count_dynamodb_calls
+from lambdas.counter_lambda.index import queue_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+BATCH_SIZE = 100
+
+
+@pytest.fixture
+def hit_queue(counter_table):
+    with mock_sqs():
+        sqs = boto3.client('sqs', region_name='us-east-1')
+        queue_url = sqs.create_queue(QueueName='counter-hits')['QueueUrl']
+        yield sqs, queue_url
+
+
+def enqueue_hits(sqs, queue_url, hits):
+    # What the API Gateway SQS integration does for every POST /counter/hit
+    for request_id in range(hits):
+        sqs.send_message(QueueUrl=queue_url, MessageBody=f'request-{request_id}')
+
+
+def drain(sqs, queue_url, batch_size):
+    """Deliver the queue to queue_handler in batches, like the event source mapping."""
+    while True:
+        messages = []
+        while len(messages) < batch_size:
+            received = sqs.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(10, batch_size - len(messages))
+            ).get('Messages', [])
+            if not received:
+                break
+            messages.extend(received)
+
+        if not messages:
+            return
+
+        event = {'Records': [{
+            'messageId': message['MessageId'],
+            'receiptHandle': message['ReceiptHandle'],
+            'body': message['Body'],
+            'eventSource': 'aws:sqs',
+        } for message in messages]}
+
+        queue_handler(event, {})
+
+        for message in messages:
+            sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=message['ReceiptHandle'])
+
+
+def test_queued_hits_counted_once_per_batch(hit_queue, counter_table):
+    sqs, queue_url = hit_queue
+    counter_table.put_item(Item={'id': 1, 'counter': 10})
+
+    enqueue_hits(sqs, queue_url, 250)
+
+    with count_dynamodb_calls() as calls:
+        drain(sqs, queue_url, BATCH_SIZE)
+
+    assert counter_table.get_item(Key={'id': 1})['Item']['counter'] == 260
+    # 100 + 100 + 50 hits, one write each
+    assert calls == {'UpdateItem': 3}
+
+
+def test_empty_batch_does_not_write(counter_table):
+    with count_dynamodb_calls() as calls:
+        queue_handler({'Records': []}, {})
+
+    assert not calls
+
+
+def test_failed_batch_is_retried(counter_table):
+    counter_table.put_item(Item={'id': 1, 'counter': 'test'})
+
+    # Raising leaves the messages on the queue for redelivery
+    with pytest.raises(ClientError):
+        queue_handler({'Records': [{'messageId': '1', 'body': 'request-1'}]}, {})
@@ -0,0 +1,154 @@
+import json
+import os
+from collections import OrderedDict
+
+import pytest
+from botocore.exceptions import ReadTimeoutError
+from botocore.stub import Stubber
+
+from benchmarks.harness import count_dynamodb_calls
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+THROTTLED = 'ProvisionedThroughputExceededException'
+
+
+@pytest.fixture
+def counter(counter_table, monkeypatch):
+    monkeypatch.setattr(index, 'circuit_breaker',
+        index.CircuitBreaker(index.BREAKER_THRESHOLD, index.BREAKER_COOLDOWN_SECONDS)
+    )
+    monkeypatch.setattr(index, '_last_known_values', OrderedDict())
+    counter_table.put_item(Item={'id': 1, 'counter': 10})
+    yield counter_table
+
+
+@pytest.fixture
+def stubber():
+    stubber = Stubber(index.dynamodb.meta.client)
+    yield stubber
+    stubber.deactivate()
+
+
+def fail_next_calls(stubber, operation, *codes):
+    """Fail the next DynamoDB calls with the given error codes."""
+    for code in codes:
+        stubber.add_client_error(operation, service_error_code=code, http_status_code=400)
+    stubber.activate()
+
+
+def body(response):
+    return json.loads(response['body'])
+
+
+def test_client_retries_and_timeouts():
+    config = index.dynamodb.meta.client.meta.config
+
+    assert config.retries == {'mode': 'adaptive', 'total_max_attempts': index.DYNAMODB_MAX_ATTEMPTS}
+    assert config.connect_timeout == index.DYNAMODB_CONNECT_TIMEOUT
+    assert config.read_timeout == index.DYNAMODB_READ_TIMEOUT
+
+
+def test_retries_and_timeouts_fit_the_function_timeout():
+    attempts = index.DYNAMODB_MAX_ATTEMPTS
+    worst_case = (attempts * (index.DYNAMODB_CONNECT_TIMEOUT + index.DYNAMODB_READ_TIMEOUT)
+                  + sum(2 ** n for n in range(attempts - 1)))
+
+    assert index.FUNCTION_TIMEOUT == 3
+    assert worst_case <= index.FUNCTION_TIMEOUT - index.FUNCTION_TIMEOUT_HEADROOM
+
+
+def test_throttled_hit_serves_last_known_value(counter, stubber, capsys):
+    assert body(lambda_handler({}, {}))['data'] == '11'
+
+    fail_next_calls(stubber, 'update_item', THROTTLED)
+    response = lambda_handler({}, {})
+
+    assert response['statusCode'] == 200
+    assert body(response) == {'message': 'Success', 'data': '11', 'stale': True}
+    assert response['headers']['Cache-Control'] == 'no-store'
+
+    record = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert record['Degraded'] == 1
+    assert record['ErrorClass'] == THROTTLED
+
+
+def test_throttled_batch_read_serves_last_known_values(counter, stubber, monkeypatch):
+    monkeypatch.setattr(index, 'SPLIT_ENDPOINTS', True)
+    event = {'httpMethod': 'GET', 'resource': '/counter', 'headers': {},
+             'queryStringParameters': {'ids': '1,2'}}
+    lambda_handler(event, {})
+
+    fail_next_calls(stubber, 'batch_get_item', 'ThrottlingException')
+
+    assert body(lambda_handler(event, {})) == {
+        'message': 'Success', 'data': {'1': '10', '2': '0'}, 'stale': True
+    }
+
+
+def test_throttled_without_known_value(counter, stubber):
+    fail_next_calls(stubber, 'update_item', THROTTLED)
+
+    response = lambda_handler({}, {})
+
+    assert response['statusCode'] == 503
+    assert response['headers']['Retry-After'] == str(int(index.BREAKER_COOLDOWN_SECONDS))
+
+
+def test_stale_value_expires(counter, stubber, monkeypatch):
+    lambda_handler({}, {})
+    monkeypatch.setattr(index, 'STALE_MAX_AGE', -1)
+
+    fail_next_calls(stubber, 'update_item', THROTTLED)
+
+    assert lambda_handler({}, {})['statusCode'] == 503
+
+
+def test_permanent_errors_are_not_masked(counter):
+    lambda_handler({}, {})
+    counter.put_item(Item={'id': 1, 'counter': 'test'})
+
+    assert lambda_handler({}, {})['statusCode'] == 500
+
+
+def test_circuit_breaker_opens_and_recovers(counter, stubber, monkeypatch):
+    lambda_handler({}, {})
+
+    fail_next_calls(stubber, 'update_item', *[THROTTLED] * index.BREAKER_THRESHOLD)
+    for _ in range(index.BREAKER_THRESHOLD):
+        assert body(lambda_handler({}, {}))['stale']
+
+    # Open: DynamoDB isn't called at all
+    with count_dynamodb_calls() as calls:
+        assert body(lambda_handler({}, {}))['stale']
+    assert not calls
+
+    # After the cooldown a successful call closes the breaker
+    stubber.deactivate()
+    monkeypatch.setattr(index.circuit_breaker, 'cooldown', 0)
+    response = lambda_handler({}, {})
+    assert body(response) == {'message': 'Success', 'data': '12'}
+    assert index.circuit_breaker.opened_at is None
+
+
+def test_circuit_breaker_reopens_on_failed_trial():
+    breaker = index.CircuitBreaker(threshold=2, cooldown=0)
+
+    breaker.record_failure()
+    assert breaker.opened_at is None
+    breaker.record_failure()
+    assert breaker.opened_at is not None
+
+    # A failed call after the cooldown opens it again straight away
+    breaker.cooldown = 60
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_timeouts_are_transient():
+    assert index.is_transient_error(ReadTimeoutError(endpoint_url='https://dynamodb'))
+    assert index.is_transient_error(index.CircuitOpenError())
+    assert not index.is_transient_error(ValueError())
@@ -0,0 +1,303 @@
+import json
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk import Duration
+from aws_cdk.assertions import Match, Template
+
+from resume_iac.apigw_ddb_lambda_stack import ApiDdbLambdaStack
+from resume_iac.s3_website__stack import S3WebsiteStack
+from resume_iac.profiles import CLOUDFRONT_PROFILES
+
+ENV = cdk.Environment(account="123456789012", region="us-east-1")
+
+
+def synth_website(**kwargs):
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", env=ENV)
+
+    website_stack = S3WebsiteStack(app, "WebsiteStack",
+        domain_name="example.com",
+        rest_api=backend_stack.rest_api,
+        api_key=backend_stack.api_key,
+        api_key_value=backend_stack.api_key_value,
+        env=ENV,
+        **kwargs
+    )
+
+    return Template.from_stack(website_stack)
+
+
+def cache_behavior(template, path_pattern):
+    distribution = template.find_resources("AWS::CloudFront::Distribution")
+    config = list(distribution.values())[0]["Properties"]["DistributionConfig"]
+    for behavior in config.get("CacheBehaviors", []):
+        if behavior["PathPattern"] == path_pattern:
+            return behavior
+    return None
+
+
+def test_counter_not_cached_by_default():
+    template = synth_website()
+
+    template.resource_count_is("AWS::CloudFront::CachePolicy", 0)
+    assert cache_behavior(template, "/counter") is not None
+    assert cache_behavior(template, "/counter/hit") is None
+
+
+def test_counter_reads_cached():
+    template = synth_website(counter_cache_ttl=Duration.seconds(5))
+
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+            "CachePolicyConfig": Match.object_like({
+                "DefaultTTL": 5,
+                "MaxTTL": 5,
+                "MinTTL": 0,
+            })
+        }
+    )
+
+    # Multi-counter reads are cached per list of counters
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+            "CachePolicyConfig": Match.object_like({
+                "ParametersInCacheKeyAndForwardedToOrigin": Match.object_like({
+                    "QueryStringsConfig": {
+                        "QueryStringBehavior": "whitelist",
+                        "QueryStrings": ["ids"]
+                    }
+                })
+            })
+        }
+    )
+
+    read = cache_behavior(template, "/counter")
+    # OPTIONS only reaches the counter request function
+    assert read["AllowedMethods"] == ["GET", "HEAD", "OPTIONS"]
+    assert "Ref" in read["CachePolicyId"]
+
+    hit = cache_behavior(template, "/counter/hit")
+    assert "POST" in hit["AllowedMethods"]
+    # Managed CachingDisabled policy
+    assert hit["CachePolicyId"] == "4135ea2d-6df8-44a3-9df3-4b5a84be39ad"
+
+
+def test_counter_history_cached_per_range():
+    template = synth_website(counter_history_ttl=Duration.seconds(60))
+
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+            "CachePolicyConfig": Match.object_like({
+                "DefaultTTL": 60,
+                "ParametersInCacheKeyAndForwardedToOrigin": Match.object_like({
+                    "QueryStringsConfig": {
+                        "QueryStringBehavior": "whitelist",
+                        "QueryStrings": ["granularity", "from", "to", "limit", "next_token"]
+                    }
+                })
+            })
+        }
+    )
+
+    history = cache_behavior(template, "/counter/history")
+    assert history["AllowedMethods"] == ["GET", "HEAD"]
+
+
+def test_counter_history_not_routed_by_default():
+    template = synth_website()
+
+    assert cache_behavior(template, "/counter/history") is None
+
+
+def test_counter_behind_http_api():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", api_type="http", env=ENV)
+
+    website_stack = S3WebsiteStack(app, "WebsiteStack",
+        domain_name="example.com",
+        http_api=backend_stack.http_api,
+        origin_secret=backend_stack.origin_secret,
+        env=ENV
+    )
+
+    template = Template.from_stack(website_stack)
+
+    distribution = template.find_resources("AWS::CloudFront::Distribution")
+    config = list(distribution.values())[0]["Properties"]["DistributionConfig"]
+    counter_origin = config["Origins"][1]
+
+    assert "CustomOriginConfig" in counter_origin
+    assert "OriginPath" not in counter_origin
+    headers = {h["HeaderName"]: h["HeaderValue"] for h in counter_origin["OriginCustomHeaders"]}
+    assert set(headers) == {"x-origin-secret"}
+    assert "x-api-key" not in headers
+    assert cache_behavior(template, "/counter") is not None
+
+
+def test_counter_behind_rest_api_with_api_key():
+    counter_origin = distribution_config(synth_website())["Origins"][1]
+
+    headers = {h["HeaderName"]: h["HeaderValue"] for h in counter_origin["OriginCustomHeaders"]}
+    assert "x-api-key" in headers
+    assert "x-origin-secret" not in headers
+
+
+def test_counter_behind_rest_api_with_origin_secret():
+    app = cdk.App()
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", origin_auth="secret", env=ENV)
+
+    website_stack = S3WebsiteStack(app, "WebsiteStack",
+        domain_name="example.com",
+        rest_api=backend_stack.rest_api,
+        origin_secret=backend_stack.origin_secret,
+        env=ENV
+    )
+
+    template = Template.from_stack(website_stack)
+
+    counter_origin = distribution_config(template)["Origins"][1]
+
+    assert counter_origin["OriginPath"] == "/prod"
+    headers = {h["HeaderName"]: h["HeaderValue"] for h in counter_origin["OriginCustomHeaders"]}
+    assert set(headers) == {"x-origin-secret"}
+    assert "secretsmanager" in json.dumps(headers["x-origin-secret"])
+
+
+def test_precompressed_assets_function():
+    template = synth_website(precompressed_assets=True)
+
+    template.has_resource_properties("AWS::CloudFront::Function", {
+            "FunctionConfig": Match.object_like({"Runtime": "cloudfront-js-2.0"}),
+            "FunctionCode": Match.string_like_regexp("accept-encoding"),
+        }
+    )
+
+    distribution = template.find_resources("AWS::CloudFront::Distribution")
+    config = list(distribution.values())[0]["Properties"]["DistributionConfig"]
+    [association] = config["DefaultCacheBehavior"]["FunctionAssociations"]
+    assert association["EventType"] == "viewer-request"
+
+
+def test_precompressed_assets_off_by_default():
+    template = synth_website()
+
+    config = distribution_config(template)
+    assert "FunctionAssociations" not in config["DefaultCacheBehavior"]
+    template.has_output("WebsiteBucketName", {})
+
+
+def distribution_config(template):
+    distribution = template.find_resources("AWS::CloudFront::Distribution")
+    return list(distribution.values())[0]["Properties"]["DistributionConfig"]
+
+
+def test_default_performance_profile():
+    config = distribution_config(synth_website())
+
+    assert config["PriceClass"] == "PriceClass_100"
+    assert config["HttpVersion"] == "http2"
+    assert "OriginShield" not in config["Origins"][0]
+    assert config["DefaultCacheBehavior"]["Compress"] is True
+    # CACHING_OPTIMIZED
+    assert config["DefaultCacheBehavior"]["CachePolicyId"] == "658327ea-f89d-4fab-a63d-7e88639e58f6"
+    assert {r["ErrorCachingMinTTL"] for r in config["CustomErrorResponses"]} == {10}
+
+
+@pytest.mark.parametrize("profile_name, price_class, shield", [
+    ("low-cost", "PriceClass_100", False),
+    ("balanced", "PriceClass_200", False),
+    ("low-latency", "PriceClass_All", True),
+])
+def test_performance_profiles(profile_name, price_class, shield):
+    profile = CLOUDFRONT_PROFILES[profile_name]
+
+    template = synth_website(performance_profile=profile_name)
+    config = distribution_config(template)
+
+    assert config["PriceClass"] == price_class
+    assert config["HttpVersion"] == "http2and3"
+    assert all(behavior["Compress"] for behavior in config["CacheBehaviors"])
+    assert {r["ErrorCachingMinTTL"] for r in config["CustomErrorResponses"]} == {
+        profile.error_caching_ttl.to_seconds()
+    }
+
+    if shield:
+        assert config["Origins"][0]["OriginShield"] == {
+            "Enabled": True, "OriginShieldRegion": "us-east-1",
+        }
+        # Counter hits are never cached, so a shield would only add a hop
+        assert "OriginShield" not in config["Origins"][1]
+    else:
+        assert "OriginShield" not in config["Origins"][0]
+
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+            "CachePolicyConfig": Match.object_like({
+                "DefaultTTL": profile.static_default_ttl.to_seconds(),
+                "MaxTTL": profile.static_max_ttl.to_seconds(),
+                "MinTTL": 0,
+                "ParametersInCacheKeyAndForwardedToOrigin": {
+                    "CookiesConfig": {"CookieBehavior": "none"},
+                    "HeadersConfig": {"HeaderBehavior": "none"},
+                    "QueryStringsConfig": {"QueryStringBehavior": "none"},
+                    "EnableAcceptEncodingGzip": True,
+                    "EnableAcceptEncodingBrotli": True,
+                },
+            })
+        }
+    )
+
+
+def test_performance_profile_from_context():
+    app = cdk.App(context={"performance_profile": "low-latency"})
+
+    backend_stack = ApiDdbLambdaStack(app, "BackendStack", env=ENV)
+    website_stack = S3WebsiteStack(app, "WebsiteStack",
+        domain_name="example.com",
+        rest_api=backend_stack.rest_api,
+        api_key=backend_stack.api_key,
+        api_key_value=backend_stack.api_key_value,
+        origin_shield_region="eu-west-1",
+        env=ENV
+    )
+
+    config = distribution_config(Template.from_stack(website_stack))
+
+    assert config["PriceClass"] == "PriceClass_All"
+    assert config["Origins"][0]["OriginShield"]["OriginShieldRegion"] == "eu-west-1"
+
+
+def test_unknown_performance_profile():
+    with pytest.raises(ValueError):
+        synth_website(performance_profile="turbo")
+
+
+def test_counter_request_function():
+    template = synth_website(counter_cache_ttl=Duration.seconds(5))
+
+    template.resource_count_is("AWS::CloudFront::Function", 1)
+    template.has_resource_properties("AWS::CloudFront::Function", {
+            "FunctionConfig": Match.object_like({"Runtime": "cloudfront-js-2.0"}),
+            "FunctionCode": Match.string_like_regexp("var SPLIT_ENDPOINTS = true;"),
+        }
+    )
+
+    for path_pattern in ("/counter", "/counter/hit"):
+        [association] = cache_behavior(template, path_pattern)["FunctionAssociations"]
+        assert association["EventType"] == "viewer-request"
+
+
+def test_counter_request_function_counting_reads():
+    template = synth_website()
+
+    template.has_resource_properties("AWS::CloudFront::Function", {
+            "FunctionCode": Match.string_like_regexp("var SPLIT_ENDPOINTS = false;"),
+        }
+    )
+
+
+def test_counter_request_function_disabled():
+    template = synth_website(counter_request_function=False)
+
+    template.resource_count_is("AWS::CloudFront::Function", 0)
+    assert "FunctionAssociations" not in cache_behavior(template, "/counter")
@@ -0,0 +1,225 @@
+import gzip
+
+import boto3
+import pytest
+from moto import mock_s3
+
+from resume_iac import site_assets
+from resume_iac.site_assets import (
+    HASHED_CACHE_CONTROL,
+    UNHASHED_CACHE_CONTROL,
+    build_site,
+    deploy_site,
+)
+
+BUCKET = 'website-bucket'
+
+# brotli isn't needed to test everything else
+GZIP_ONLY = ('gzip',)
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'index.html').write_text(
+        '<link rel="stylesheet" href="css/site.css">\n'
+        '<img src="/img/logo.png">\n'
+        '<script src="counter.js?v=1"></script>\n'
+        '<a href="https://example.com/css/site.css">elsewhere</a>\n'
+    )
+    (tmp_path / 'css' / 'site.css').write_text(
+        'body { background: url("../img/logo.png"); }\n' * 20
+    )
+    (tmp_path / 'img' / 'logo.png').write_bytes(b'\x89PNG fake image')
+    (tmp_path / 'counter.js').write_text('fetch("/counter");\n')
+    (tmp_path / 'robots.txt').write_text('User-agent: *\n')
+    (tmp_path / '.DS_Store').write_bytes(b'junk')
+    return tmp_path
+
+
+@pytest.fixture
+def bucket():
+    with mock_s3():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def assets_by_key(assets):
+    return {asset.key: asset for asset in assets}
+
+
+def hashed_key(assets, prefix, extension):
+    [key] = [key for key in assets
+             if key.startswith(prefix) and key.endswith(extension) and key != prefix + extension]
+    return key
+
+
+def test_assets_are_fingerprinted(site):
+    assets = assets_by_key(build_site(str(site), GZIP_ONLY))
+
+    css = hashed_key(assets, 'css/site.', '.css')
+    logo = hashed_key(assets, 'img/logo.', '.png')
+
+    assert 'css/site.css' not in assets
+    assert assets[css].cache_control == HASHED_CACHE_CONTROL
+    assert assets[logo].cache_control == HASHED_CACHE_CONTROL
+    assert assets['index.html'].cache_control == UNHASHED_CACHE_CONTROL
+    assert assets['robots.txt'].cache_control == UNHASHED_CACHE_CONTROL
+    assert '.DS_Store' not in assets
+
+
+def test_references_are_rewritten(site):
+    assets = assets_by_key(build_site(str(site), GZIP_ONLY))
+
+    css = hashed_key(assets, 'css/site.', '.css')
+    logo = hashed_key(assets, 'img/logo.', '.png')
+    script = hashed_key(assets, 'counter.', '.js')
+    page = assets['index.html'].body.decode()
+
+    assert f'href="{css}"' in page
+    assert f'src="/{logo}"' in page
+    assert f'src="{script}?v=1"' in page
+    assert 'href="https://example.com/css/site.css"' in page
+    assert f'url("../{logo}")' in assets[css].body.decode()
+
+
+def test_srcset_candidates_are_rewritten(site):
+    (site / 'img' / 'logo@2x.png').write_bytes(b'\x89PNG larger image')
+    (site / 'gallery.html').write_text(
+        '<img src="img/logo.png"\n'
+        '     srcset="img/logo.png 1x,\n             /img/logo@2x.png 2x, https://cdn.example.com/a.png 3x">\n'
+        "<link rel=preload as=image imagesrcset='img/logo@2x.png 640w'>\n"
+    )
+
+    assets = assets_by_key(build_site(str(site), GZIP_ONLY))
+
+    logo = hashed_key(assets, 'img/logo.', '.png')
+    large = hashed_key(assets, 'img/logo@2x.', '.png')
+    page = assets['gallery.html'].body.decode()
+    assert f'srcset="{logo} 1x, /{large} 2x, https://cdn.example.com/a.png 3x"' in page
+    assert f"imagesrcset='{large} 640w'" in page
+    assert f'src="{logo}"' in page
+
+
+def test_hash_follows_linked_content(site):
+    before = assets_by_key(build_site(str(site), GZIP_ONLY))
+    (site / 'img' / 'logo.png').write_bytes(b'\x89PNG new image')
+    after = assets_by_key(build_site(str(site), GZIP_ONLY))
+
+    # The stylesheet links to the logo, so its name changes with it
+    assert hashed_key(before, 'css/site.', '.css') != hashed_key(after, 'css/site.', '.css')
+    assert hashed_key(before, 'counter.', '.js') == hashed_key(after, 'counter.', '.js')
+
+
+def test_imported_stylesheets_are_fingerprinted_first(site):
+    # a.css sorts before the stylesheets it imports
+    (site / 'css' / 'a.css').write_text('@import "b.css";\n@import url(/css/c.css);\n')
+    (site / 'css' / 'b.css').write_text('@import "c.css";\n')
+    (site / 'css' / 'c.css').write_text('p { color: red; }\n')
+
+    before = assets_by_key(build_site(str(site), GZIP_ONLY))
+    b = hashed_key(before, 'css/b.', '.css')
+    c = hashed_key(before, 'css/c.', '.css')
+    a = hashed_key(before, 'css/a.', '.css')
+    assert before[a].body.decode() == f'@import "{b.split("/")[1]}";\n@import url(/{c});\n'
+    assert before[b].body.decode() == f'@import "{c.split("/")[1]}";\n'
+
+    (site / 'css' / 'c.css').write_text('p { color: blue; }\n')
+    after = assets_by_key(build_site(str(site), GZIP_ONLY))
+
+    # The change to c.css renames everything that imports it, directly or not
+    assert hashed_key(after, 'css/a.', '.css') != a
+    assert hashed_key(after, 'css/b.', '.css') != b
+
+
+def test_stylesheet_import_cycle(site):
+    (site / 'css' / 'a.css').write_text('@import "b.css";\n')
+    (site / 'css' / 'b.css').write_text('@import url("a.css");\n')
+
+    with pytest.raises(ValueError, match='css/a.css -> css/b.css -> css/a.css'):
+        build_site(str(site), GZIP_ONLY)
+
+
+def test_text_assets_are_precompressed(site):
+    assets = assets_by_key(build_site(str(site), GZIP_ONLY))
+    css = hashed_key(assets, 'css/site.', '.css')
+
+    variant = assets[css + '.gz']
+    assert variant.content_encoding == 'gzip'
+    assert variant.content_type == assets[css].content_type
+    assert variant.cache_control == HASHED_CACHE_CONTROL
+    assert gzip.decompress(variant.body) == assets[css].body
+    assert len(variant.body) < len(assets[css].body)
+    assert not any(key.startswith('img/') and key.endswith('.gz') for key in assets)
+
+
+def test_builds_are_reproducible(site):
+    first = build_site(str(site), GZIP_ONLY)
+    second = build_site(str(site), GZIP_ONLY)
+
+    assert [(a.key, a.md5) for a in first] == [(a.key, a.md5) for a in second]
+
+
+def test_brotli_variants(site):
+    brotli = pytest.importorskip('brotli')
+
+    assets = assets_by_key(build_site(str(site)))
+
+    assert brotli.decompress(assets['index.html.br'].body) == assets['index.html'].body
+    assert assets['index.html.br'].content_encoding == 'br'
+
+
+def test_brotli_required_for_br_variants(site, monkeypatch):
+    monkeypatch.setattr(site_assets, 'brotli', None)
+
+    with pytest.raises(RuntimeError):
+        build_site(str(site))
+
+
+def test_deploy_uploads_with_headers(site, bucket):
+    result = deploy_site(str(site), BUCKET, s3_client=bucket, encodings=GZIP_ONLY)
+
+    assert result['unchanged'] == []
+    assert 'index.html' in result['uploaded']
+
+    css = hashed_key(result['uploaded'], 'css/site.', '.css')
+    head = bucket.head_object(Bucket=BUCKET, Key=css + '.gz')
+    # moto keeps the aws-chunked transfer encoding S3 itself strips
+    assert head['ContentEncoding'].split(',')[0] == 'gzip'
+    assert head['CacheControl'] == HASHED_CACHE_CONTROL
+    assert head['ContentType'].startswith('text/css')
+
+    page = bucket.head_object(Bucket=BUCKET, Key='index.html')
+    assert page['CacheControl'] == UNHASHED_CACHE_CONTROL
+    assert 'gzip' not in page.get('ContentEncoding', '')
+
+
+def test_deploy_uploads_only_changes(site, bucket):
+    deploy_site(str(site), BUCKET, s3_client=bucket, encodings=GZIP_ONLY)
+
+    assert deploy_site(str(site), BUCKET, s3_client=bucket, encodings=GZIP_ONLY)['uploaded'] == []
+
+    (site / 'counter.js').write_text('fetch("/counter/hit", {method: "POST"});\n')
+    result = deploy_site(str(site), BUCKET, s3_client=bucket, encodings=GZIP_ONLY)
+
+    script = hashed_key(result['uploaded'], 'counter.', '.js')
+    assert result['uploaded'] == sorted([
+        'index.html', 'index.html.gz', script, script + '.gz',
+    ])
+
+
+def test_pages_uploaded_last(site, bucket, monkeypatch):
+    order = []
+    upload_asset = site_assets.upload_asset
+
+    def recording_upload(s3_client, bucket_name, asset):
+        order.append(asset.key)
+        return upload_asset(s3_client, bucket_name, asset)
+
+    monkeypatch.setattr(site_assets, 'upload_asset', recording_upload)
+
+    deploy_site(str(site), BUCKET, s3_client=bucket, max_workers=1, encodings=GZIP_ONLY)
+
+    assert order[-2:] == ['index.html', 'index.html.gz']
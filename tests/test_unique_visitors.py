@@ -0,0 +1,131 @@
+import json
+import os
+from collections import Counter, OrderedDict
+
+import pytest
+
+from benchmarks.harness import count_dynamodb_calls, invoke_concurrently
+from lambdas.counter_lambda import index
+from lambdas.counter_lambda.index import lambda_handler
+from tests.conftest import TABLE_NAME
+
+os.environ['COUNTER_TABLE_NAME'] = TABLE_NAME
+
+INVOCATIONS = 100
+WORKERS = 16
+
+
+def visit(address='203.0.113.7', user_agent='Mozilla/5.0', spoofed=None):
+    # What the viewer sent, the viewer as CloudFront saw it, then our edge
+    forwarded = ', '.join(filter(None, [spoofed, address, '130.176.0.1']))
+    return {
+        'headers': {
+            'X-Forwarded-For': forwarded,
+            'User-Agent': user_agent,
+        },
+        'requestContext': {'identity': {'sourceIp': '130.176.0.1'}},
+    }
+
+
+@pytest.fixture
+def unique_counter(counter_table, monkeypatch):
+    monkeypatch.setattr(index, 'UNIQUE_VISITORS', True)
+    monkeypatch.setattr(index, '_seen_visitors', OrderedDict())
+    counter_table.put_item(Item={'id': 1, 'counter': 0})
+    yield counter_table
+
+
+def counter_value(response):
+    return json.loads(response['body'])['data']
+
+
+def test_repeat_visit_is_not_counted(unique_counter):
+    assert counter_value(lambda_handler(visit(), {})) == '1'
+    assert counter_value(lambda_handler(visit(), {})) == '1'
+
+    assert unique_counter.get_item(Key={'id': 1})['Item']['counter'] == 1
+
+
+def test_spoofed_forwarded_for_is_not_a_new_visitor(unique_counter):
+    for spoofed in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+        lambda_handler(visit(spoofed=spoofed), {})
+
+    assert unique_counter.get_item(Key={'id': 1})['Item']['counter'] == 1
+
+
+def test_distinct_visitors_are_counted(unique_counter):
+    lambda_handler(visit(), {})
+    lambda_handler(visit(address='198.51.100.1'), {})
+    lambda_handler(visit(user_agent='curl/8.0'), {})
+
+    assert unique_counter.get_item(Key={'id': 1})['Item']['counter'] == 3
+
+
+def test_dedup_item_expires(unique_counter):
+    lambda_handler(visit(), {})
+
+    item = unique_counter.get_item(Key={'id': index.visitor_key(visit())})['Item']
+    assert 0 < item['expires_at'] - int(index.time.time()) <= index.VISITOR_TTL_SECONDS
+
+
+def test_visitor_key():
+    key = index.visitor_key(visit(), now=0)
+
+    assert key > index.VISITOR_KEY_OFFSET
+    assert len(str(key)) <= 38
+    # The edge address in sourceIp and the proxies after the viewer don't matter
+    assert key == index.visitor_key({
+        'headers': {'x-forwarded-for': '203.0.113.7', 'user-agent': 'Mozilla/5.0'}
+    }, now=0)
+    # The same visitor counts again the next day
+    assert key != index.visitor_key(visit(), now=24 * 3600)
+
+
+def test_repeat_visit_in_warm_environment_skips_the_put(unique_counter):
+    lambda_handler(visit(), {})
+
+    with count_dynamodb_calls() as calls:
+        response = lambda_handler(visit(), {})
+
+    assert counter_value(response) == '1'
+    assert calls == Counter({'GetItem': 1})
+
+
+def test_concurrent_duplicates_count_once(unique_counter):
+    responses, calls = invoke_concurrently(
+        lambda_handler, INVOCATIONS, WORKERS, event=visit()
+    )
+
+    assert all(r['statusCode'] == 200 for r in responses)
+    assert unique_counter.get_item(Key={'id': 1})['Item']['counter'] == 1
+    assert calls['UpdateItem'] == 1
+
+
+def test_failed_hit_releases_the_visit(unique_counter):
+    unique_counter.put_item(Item={'id': 1, 'counter': 'test'})
+
+    assert lambda_handler(visit(), {})['statusCode'] == 500
+    assert 'Item' not in unique_counter.get_item(Key={'id': index.visitor_key(visit())})
+
+    unique_counter.put_item(Item={'id': 1, 'counter': 0})
+
+    assert counter_value(lambda_handler(visit(), {})) == '1'
+
+
+def test_failed_buffered_hit_releases_the_visit(unique_counter, monkeypatch):
+    monkeypatch.setattr(index, 'BUFFER_HITS', True)
+    monkeypatch.setattr(index, 'CACHE_TTL', 5)
+    monkeypatch.setattr(index, '_read_cache', index.TTLCache(5, 100))
+    monkeypatch.setattr(index, '_pending_hits', {})
+    unique_counter.put_item(Item={'id': 1, 'counter': 'test'})
+
+    # Nothing is cached yet, so the hit is flushed right away and fails
+    assert lambda_handler(visit(), {})['statusCode'] == 500
+    assert 'Item' not in unique_counter.get_item(Key={'id': index.visitor_key(visit())})
+    # The hit isn't left buffered either, or the retry would count it twice
+    assert index._pending_hits == {}
+
+    unique_counter.put_item(Item={'id': 1, 'counter': 0})
+
+    assert counter_value(lambda_handler(visit(), {})) == '1'
+    assert unique_counter.get_item(Key={'id': 1})['Item']['counter'] == 1